@@ -23,11 +23,18 @@ setup(
         ],
         'test': [
             'paramiko==2.6.0'
+        ],
+        'zstd': [
+            'zstandard'
+        ],
+        'parquet': [
+            'pyarrow'
         ]
     },
     entry_points="""
     [console_scripts]
     tap-sftp=tap_sftp:main
+    tap-sftp-measure-profiles=tap_sftp.measure_profiles:main
     """,
     packages=["tap_sftp"],
     package_data = {
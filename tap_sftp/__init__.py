@@ -5,6 +5,8 @@ import singer
 from singer import metadata
 from singer import utils
 from singer_encodings.utils import is_valid_encoding
+from tap_sftp import client
+from tap_sftp import helper
 from tap_sftp.discover import discover_streams
 from tap_sftp.sync import sync_stream
 from tap_sftp.stats import STATS
@@ -31,6 +33,14 @@ def stream_is_selected(mdata):
 
 def do_sync(config, catalog, state):
     LOGGER.info('Starting sync.')
+    helper.configure_writer(config)
+
+    # walk the prefixes shared by several selected tables once instead of once per table
+    conn = client.get_connection(config)
+    selected_streams = {stream.tap_stream_id for stream in catalog.streams
+                        if stream_is_selected(metadata.to_map(stream.metadata))}
+    conn.plan_listings([table_spec for table_spec in json.loads(config['tables'])
+                        if table_spec['table_name'] in selected_streams])
 
     for stream in catalog.streams:
         stream_name = stream.tap_stream_id
@@ -40,19 +50,24 @@ def do_sync(config, catalog, state):
             LOGGER.info("%s: Skipping - not selected", stream_name)
             continue
 
-        singer.write_state(state)
+        helper.write_state(state)
         key_properties = metadata.get(metadata.to_map(stream.metadata), (), "table-key-properties")
-        singer.write_schema(stream_name, stream.schema.to_dict(), key_properties)
+        helper.write_schema(stream_name, stream.schema.to_dict(), key_properties)
 
         LOGGER.info("%s: Starting sync", stream_name)
-        counter_value = sync_stream(config, state, stream)
+        counter_value = sync_stream(config, state, stream, conn)
         LOGGER.info("%s: Completed sync (%s rows)", stream_name, counter_value)
 
+    # write out the buffered records before the summary
+    helper.close_writer()
+
     headers = [['table_name',
                 'search prefix',
                 'search pattern',
                 'file path',
                 'row count',
+                'filtered row count',
+                'skipped as unchanged',
                 'last_modified']]
 
     rows = []
@@ -66,6 +81,8 @@ def do_sync(config, catalog, state):
                          table_data['search_pattern'],
                          filepath,
                          file_data['row_count'],
+                         file_data.get('filtered_row_count', 0),
+                         file_data.get('skipped', False),
                          file_data['last_modified']])
 
     LOGGER.info("\n**** Sync Summary:")
@@ -78,10 +95,16 @@ def do_sync(config, catalog, state):
 def main():
     args = utils.parse_args(REQUIRED_CONFIG_KEYS)
 
-    if args.discover:
-        do_discover(args.config)
-    elif args.catalog or args.properties:
-        do_sync(args.config, args.catalog, args.state)
+    try:
+        if args.discover:
+            do_discover(args.config)
+        elif args.catalog or args.properties:
+            do_sync(args.config, args.catalog, args.state)
+    finally:
+        # write out the records still buffered, even if the sync failed
+        helper.close_writer()
+        # close the run's SSH sessions deterministically instead of waiting on garbage collection
+        client.close_connections()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,141 @@
+import gzip
+import json
+import os
+import uuid
+import simplejson
+import singer
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+LOGGER = singer.get_logger()
+
+# records written to a batch file before it is closed and announced
+DEFAULT_BATCH_SIZE = 100000
+DEFAULT_COMPRESSION = "gzip"
+COMPRESSION_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+
+# records are written to batch files as they are written in RECORD messages
+ENCODER = simplejson.JSONEncoder(use_decimal=True, ensure_ascii=False)
+
+
+def get_batch_config(config):
+    """ Returns the "batch_config" of the config, which may be given as a JSON string like "tables". """
+    batch_config = config.get('batch_config')
+    if isinstance(batch_config, str):
+        batch_config = json.loads(batch_config) if batch_config.strip() else None
+    return batch_config or None
+
+
+def get_root_directory(root):
+    if root.startswith("file://"):
+        root = root[len("file://"):]
+    return os.path.abspath(os.path.expanduser(root))
+
+
+class BatchFile():
+    """ A compressed JSON Lines file the records of a stream are written to. """
+    def __init__(self, path, compression):
+        self.path = path
+        self.records = 0
+        if compression == "gzip":
+            self.file = gzip.open(path, "wb", compresslevel=6)
+        elif compression == "zstd":
+            self.raw_file = open(path, "wb")
+            self.file = zstandard.ZstdCompressor().stream_writer(self.raw_file)
+        else:
+            self.file = open(path, "wb")
+
+    def write(self, record):
+        self.file.write((ENCODER.encode(record) + "\n").encode("utf-8"))
+        self.records += 1
+
+    def close(self):
+        self.file.close()
+        if hasattr(self, "raw_file"):
+            self.raw_file.close()
+
+
+class BatchMessageWriter():
+    """
+    Writes the records of RECORD messages to local compressed JSON Lines files of at
+    most "batch_size" records instead of writing the messages, and writes a BATCH
+    message listing each file once it is closed. Other messages are written by "writer".
+
+    Open batch files are closed and announced before a STATE message, so a bookmark
+    still follows the records it covers.
+    """
+    def __init__(self, writer, batch_config):
+        encoding = batch_config.get("encoding") or {}
+        storage = batch_config.get("storage") or {}
+
+        if (encoding.get("format") or "jsonl") != "jsonl":
+            raise Exception("Unsupported batch format - {}. Only 'jsonl' batches are supported"
+                            .format(encoding.get("format")))
+        self.compression = encoding.get("compression") or DEFAULT_COMPRESSION
+        if self.compression not in COMPRESSION_EXTENSIONS:
+            raise Exception("Unsupported batch compression - {}. Enter one of: {}"
+                            .format(self.compression, ", ".join(COMPRESSION_EXTENSIONS)))
+        if self.compression == "zstd" and zstandard is None:
+            raise Exception("Batches compressed with 'zstd' require the 'zstandard' package, "
+                            "install 'tap-sftp[zstd]' or use 'gzip'")
+
+        self.writer = writer
+        self.root = get_root_directory(storage.get("root") or ".")
+        self.prefix = storage.get("prefix") or ""
+        # if value is 0, "0", "" or None then use the default batch size
+        self.batch_size = int(batch_config.get("batch_size") or DEFAULT_BATCH_SIZE)
+        os.makedirs(self.root, exist_ok=True)
+        # stream -> open BatchFile
+        self.batch_files = {}
+
+    def write(self, message_dict, ensure_ascii=True):
+        if message_dict.get("type") != "RECORD":
+            self.writer.write(message_dict, ensure_ascii)
+            return
+
+        stream = message_dict["stream"]
+        batch_file = self.batch_files.get(stream)
+        if batch_file is None:
+            filename = "{}{}-{}.jsonl{}".format(self.prefix, stream, uuid.uuid4().hex,
+                                                COMPRESSION_EXTENSIONS[self.compression])
+            batch_file = self.batch_files[stream] = BatchFile(os.path.join(self.root, filename), self.compression)
+
+        batch_file.write(message_dict["record"])
+        if batch_file.records >= self.batch_size:
+            self.finish_batch(stream)
+
+    def finish_batch(self, stream):
+        batch_file = self.batch_files.pop(stream)
+        batch_file.close()
+        LOGGER.info("Wrote batch of %s records for stream '%s' to %s", batch_file.records, stream, batch_file.path)
+        self.writer.write({"type": "BATCH",
+                           "stream": stream,
+                           "encoding": {"format": "jsonl", "compression": self.compression},
+                           "manifest": ["file://" + batch_file.path]})
+
+    def finish_batches(self):
+        for stream in list(self.batch_files):
+            self.finish_batch(stream)
+
+    def write_line(self, line):
+        self.finish_batches()
+        self.writer.write_line(line)
+
+    def write_state(self, value):
+        self.finish_batches()
+        self.writer.write_state(value)
+
+    def write_schema(self, stream_name, schema, key_properties, bookmark_properties=None, stream_alias=None):
+        self.finish_batches()
+        self.writer.write_schema(stream_name, schema, key_properties, bookmark_properties, stream_alias)
+
+    def flush(self):
+        self.finish_batches()
+        self.writer.flush()
+
+    def close(self):
+        self.finish_batches()
+        self.writer.close()
@@ -1,3 +1,5 @@
+import collections
+import contextlib
 import io
 import os
 import socket
@@ -10,21 +12,68 @@ import stat
 import time
 import gzip
 import zipfile
+import threading
+from concurrent import futures
 from datetime import datetime
 from paramiko.ssh_exception import AuthenticationException, SSHException
+from tap_sftp import pattern
+from tap_sftp import profiles
+from tap_sftp import reader
+from tap_sftp import remote_exec
+from tap_sftp.listing_cache import ListingCache
 
 # set default timeout to 300 seconds
 REQUEST_TIMEOUT = 300
+# number of directory listings kept in flight while walking a search prefix
+DEFAULT_LISTING_CONCURRENCY = 1
+# SFTP channels open at once on a connection, including the main one. This is
+# the default of OpenSSH's 'MaxSessions'
+DEFAULT_MAX_CHANNELS = 10
+# files smaller than this are not worth splitting into concurrently downloaded segments
+DEFAULT_SEGMENT_MIN_SIZE = 64 * 1024 * 1024
+# 'sftp' walks the directories beneath a search prefix, 'exec' lists them with a single
+# 'find' run on the server, falling back to the walk where the command cannot be run
+LISTING_BACKENDS = ('sftp', 'exec')
+# 'sftp' reads files over SFTP, 'exec' streams the files not compressed already through a
+# compression command run on the server, falling back to SFTP where the command cannot be run
+READ_BACKENDS = ('sftp', 'exec')
 
 LOGGER = singer.get_logger()
 
+# compact listing entry, "last_modified" is the file's mtime as an epoch
+FileEntry = collections.namedtuple("FileEntry", ["filepath", "size", "last_modified"])
+
+def to_file_dict(entry):
+    """ Converts a FileEntry to the file dict {"filepath": "...", "last_modified": "..."} used for syncing. """
+    return {"filepath": entry.filepath,
+            "last_modified": datetime.utcfromtimestamp(entry.last_modified).replace(tzinfo=pytz.UTC)}
+
 class SFTPConnection():
-    def __init__(self, host, username, password=None, private_key_file=None, port=None, timeout=REQUEST_TIMEOUT):
+    def __init__(self, host, username, password=None, private_key_file=None, port=None, timeout=REQUEST_TIMEOUT,
+                 listing_concurrency=None, listing_cache_path=None, listing_cache_max_age=None, max_channels=None,
+                 read_ahead_window=None, read_block_size=None, download_segments=None, segment_min_size=None,
+                 segment_spool_dir=None, segment_spool_limit=None, listing_backend=None, read_backend=None,
+                 exec_compression=None, transport_profile=None, transport_compression=None):
+        # set ahead of the settings checked below, 'close' is called on a connection failing them too
+        self.__active_connection = False
+        # with the 'auto' compression policy, the connection the compressed files are read over
+        self.uncompressed_connection = None
+        # pool of the SFTP channels opened next to the main one, handed out by 'channel'
+        self.__channels = []
+        self.__idle_channels = []
+        self.__channel_count = 0
+        self.__channels_available = threading.Condition()
+        self.__local = threading.local()
+        # held while the connection or a channel lost by a read is replaced
+        self.__restore_lock = threading.Lock()
+
         self.host = host
         self.username = username
         self.password = password
         self.port = int(port)or 22
-        self.__active_connection = False
+        # SFTP channels open at once, the main one and those of the pool
+        self.max_channels = int(max_channels or DEFAULT_MAX_CHANNELS)
+        self.__key_rejected = False
         self.key = None
         if private_key_file:
             key_path = os.path.expanduser(private_key_file)
@@ -38,6 +87,48 @@ class SFTPConnection():
             # set the default timeout of 300 seconds
             self.request_timeout = REQUEST_TIMEOUT
 
+        # if value is 0, "0", "" or None then walk the directories one at a time
+        self.listing_concurrency = int(listing_concurrency or DEFAULT_LISTING_CONCURRENCY)
+
+        self.listing_cache = None
+        if listing_cache_path:
+            self.listing_cache = ListingCache(listing_cache_path,
+                                              "{}@{}:{}".format(self.username, self.host, self.port),
+                                              max_age=listing_cache_max_age)
+
+        # (search_prefix, search_pattern) -> (number of files listed, matching entries)
+        self.planned_listings = {}
+
+        # if value is 0, "0", "" or None then use the defaults, a window of 1 turns read-ahead off
+        self.read_ahead_window = int(read_ahead_window or reader.DEFAULT_READ_AHEAD_WINDOW)
+        self.read_block_size = int(read_block_size or reader.DEFAULT_READ_BLOCK_SIZE)
+
+        # if value is 0, "0", "" or None then download each file as a single segment
+        self.download_segments = int(download_segments or 1)
+        self.segment_min_size = int(segment_min_size or DEFAULT_SEGMENT_MIN_SIZE)
+        self.segment_spool_dir = segment_spool_dir or None
+        self.segment_spool_limit = int(segment_spool_limit or reader.DEFAULT_SEGMENT_SPOOL_LIMIT)
+
+        self.listing_backend = listing_backend or 'sftp'
+        if self.listing_backend not in LISTING_BACKENDS:
+            raise Exception("Unsupported listing backend: {}, expected one of {}"
+                            .format(self.listing_backend, ", ".join(LISTING_BACKENDS)))
+        self.read_backend = read_backend or 'sftp'
+        if self.read_backend not in READ_BACKENDS:
+            raise Exception("Unsupported read backend: {}, expected one of {}"
+                            .format(self.read_backend, ", ".join(READ_BACKENDS)))
+        self.exec_compression = exec_compression or remote_exec.DEFAULT_COMPRESSION
+        if self.exec_compression not in remote_exec.COMPRESS_COMMANDS:
+            raise Exception("Unsupported exec compression: {}, expected one of {}"
+                            .format(self.exec_compression, ", ".join(remote_exec.COMPRESS_COMMANDS)))
+        if self.exec_compression == 'zstd' and remote_exec.zstandard is None:
+            raise Exception("Reading files compressed with 'zstd' requires the 'zstandard' package, "
+                            "install 'tap-sftp[zstd]' or use 'gzip'")
+        # set once the server refused to run a command, every command falls back to SFTP then
+        self.__exec_denied = False
+
+        self.profile = profiles.get_profile(transport_profile, transport_compression)
+
     def handle_backoff(details):
         LOGGER.warn("SSH Connection closed unexpectedly. Waiting {wait} seconds and retrying...".format(**details))
 
@@ -51,25 +142,43 @@ class SFTPConnection():
                           factor=2)
     def __try_connect(self):
         if not self.__active_connection:
+            # skip the private key once the server rejected it, saving a handshake on reconnects
+            pkey = None if self.__key_rejected else self.key
             try:
-                self.transport = paramiko.Transport((self.host, self.port))
-                self.transport.use_compression(True)
-                self.transport.connect(username = self.username, password = self.password, hostkey = None, pkey = self.key)
-                self.sftp = paramiko.SFTPClient.from_transport(self.transport)
+                self.__connect_transport(pkey)
             except (AuthenticationException, SSHException) as ex:
                 self.transport.close()
-                self.transport = paramiko.Transport((self.host, self.port))
-                self.transport.use_compression(True)
-                self.transport.connect(username= self.username, password = self.password, hostkey = None, pkey = None)
-                self.sftp = paramiko.SFTPClient.from_transport(self.transport)
+                if pkey is None and isinstance(ex, AuthenticationException):
+                    # retrying would only repeat the same password authentication
+                    raise
+                if pkey is not None and isinstance(ex, AuthenticationException):
+                    self.__key_rejected = True
+                self.__connect_transport(None)
             self.__active_connection = True
             # get 'socket' to set the timeout
-            socket = self.sftp.get_channel()
+            socket = self.__sftp.get_channel()
             # set request timeout
             socket.settimeout(self.request_timeout)
 
+    def __connect_transport(self, pkey):
+        self.transport = paramiko.Transport((self.host, self.port),
+                                            default_window_size=self.profile["window_size"],
+                                            default_max_packet_size=self.profile["max_packet_size"])
+        self.transport.use_compression(self.profile["compression"] != 'never')
+        profiles.set_preferred_algorithms(self.transport, self.profile)
+        self.transport.connect(username = self.username, password = self.password, hostkey = None, pkey = pkey)
+        self.sftp = paramiko.SFTPClient.from_transport(self.transport)
+
+    def holds_channel(self):
+        """ Returns whether the current thread holds a channel of the pool, which it works over. """
+        return getattr(self.__local, 'sftp', None) is not None
+
     @property
     def sftp(self):
+        # a thread holding a channel of the pool works over that channel
+        channel = getattr(self.__local, 'sftp', None)
+        if channel is not None:
+            return channel
         self.__try_connect()
         return self.__sftp
 
@@ -85,13 +194,26 @@ class SFTPConnection():
         """ Clean up the socket when this class gets garbage collected. """
         self.close()
 
-    def __exit__(self):
+    def __exit__(self, exc_type, exc_value, traceback):
         """ Clean up the socket when this class gets garbage collected. """
         self.close()
 
     def close(self):
+        self.__disconnect()
+        if self.uncompressed_connection is not None:
+            self.uncompressed_connection.close()
+
+    def __disconnect(self):
+        with self.__channels_available:
+            channels = self.__channels
+            self.__channels = []
+            self.__idle_channels = []
+            self.__channel_count = 0
+        for sftp in channels:
+            sftp.close()
+
         if self.__active_connection:
-            self.sftp.close()
+            self.__sftp.close()
             self.transport.close()
             self.__active_connection = False
 
@@ -106,19 +228,126 @@ class SFTPConnection():
                           max_time=60,
                           interval=10,
                           jitter=None)
-    def get_files_by_prefix(self, prefix):
+    def get_files_by_prefix(self, prefix, directory_filter=None):
         """
         Accesses the underlying file system and gets all files that match "prefix", in this case, a directory path.
+        Subdirectories for which "directory_filter" returns False are not descended into.
 
         Returns a list of filepaths from the root.
         """
-        files = []
+        return [to_file_dict(entry) for entry in self.iter_files_by_prefix(prefix, directory_filter)]
 
+    def iter_files_by_prefix(self, prefix, directory_filter=None):
+        """
+        Walks the directory tree beneath "prefix" and yields a FileEntry for every
+        non-empty file as soon as its directory has been listed.
+        """
         if prefix is None or prefix == '':
             prefix = '.'
 
+        if self.listing_backend == 'exec':
+            listed = yield from self.iter_files_over_exec(prefix, directory_filter)
+            if listed:
+                return
+
+        entries, directories = self.list_directory(self.sftp, prefix, directory_filter)
+        yield from entries
+
+        if self.listing_concurrency > 1:
+            yield from self.walk_directories_concurrently(directories, directory_filter)
+        else:
+            # depth first, keeping only the directories still to be listed in memory
+            directories.reverse()
+            while directories:
+                entries, subdirectories = self.list_directory(self.sftp, directories.pop(), directory_filter)
+                yield from entries
+                directories += reversed(subdirectories)
+
+        if self.listing_cache is not None:
+            self.listing_cache.save()
+
+    def iter_files_over_exec(self, prefix, directory_filter=None):
+        """
+        Lists the files beneath "prefix" with a single 'find' run on the server, yielding a
+        FileEntry for every non-empty file as its part of the output is received. Files
+        beneath the directories rejected by "directory_filter" are left out.
+
+        Returns False, having yielded nothing, when the listing has to be walked over SFTP instead.
+        """
+        command = remote_exec.get_listing_command(prefix)
+        channel = self.open_exec_channel(command)
+        if channel is None:
+            return False
+
+        # directory -> whether its files are listed, a directory is listed if its parent is
+        listed_directories = {prefix: True}
+        def is_listed(directory):
+            if directory not in listed_directories:
+                parent = directory.rsplit('/', 1)[0]
+                listed_directories[directory] = is_listed(parent) and directory_filter(directory)
+            return listed_directories[directory]
+
+        yielded = False
         try:
-            result = self.sftp.listdir_attr(prefix)
+            for path, size, last_modified in remote_exec.iter_listing(
+                    remote_exec.iter_output(channel, command, self.request_timeout)):
+                filepath = prefix + '/' + path
+                if directory_filter is not None and not is_listed(filepath.rsplit('/', 1)[0]):
+                    continue
+                yielded = True
+                yield FileEntry(filepath, size, last_modified)
+        except remote_exec.CommandError as ex:
+            if yielded:
+                raise Exception("Listing '{}' failed: {}".format(prefix, ex)) from ex
+            # e.g. the prefix does not exist, which the walk reports, or 'find' does not support '-printf'
+            LOGGER.warning("Unable to list '%s' on the server, listing it over SFTP: %s", prefix, ex)
+            return False
+        finally:
+            channel.close()
+
+        return True
+
+    def open_exec_channel(self, command):
+        """
+        Runs "command" on the server in a session of its own, next to the SFTP channels.
+
+        Returns the paramiko Channel connected to the command's output, or None when the
+        server has no session to spare or refuses to run commands.
+        """
+        if self.__exec_denied:
+            return None
+
+        # accessing 'sftp' makes sure the transport is connected before opening a session on it
+        self.sftp # pylint: disable=pointless-statement
+        try:
+            channel = self.transport.open_session(timeout=self.request_timeout)
+        except SSHException as ex:
+            # e.g. OpenSSH's 'MaxSessions' is reached
+            LOGGER.warning("Unable to open a session to run '%s': %s", command, ex)
+            return None
+
+        channel.settimeout(self.request_timeout)
+        try:
+            channel.exec_command(command)
+        except SSHException as ex:
+            channel.close()
+            LOGGER.warning("The server refused to run '%s', using SFTP only: %s", command, ex)
+            self.__exec_denied = True
+            return None
+        return channel
+
+    def list_directory(self, sftp, prefix, directory_filter=None):
+        """
+        Lists a single directory over the given SFTP channel.
+
+        Returns a tuple of (file entries, directories) found directly beneath "prefix",
+        leaving out the directories rejected by "directory_filter".
+        """
+        entries = []
+        directories = []
+
+        try:
+            result, is_cached = self.get_directory_entries(sftp, prefix)
         except FileNotFoundError as e:
             raise Exception("Directory '{}' does not exist".format(prefix)) from e
 
@@ -127,7 +356,14 @@ class SFTPConnection():
         for file_attr in result:
             # NB: This only looks at the immediate level beneath the prefix directory
             if is_directory(file_attr):
-                files += self.get_files_by_prefix(prefix + '/' + file_attr.filename)
+                directory = prefix + '/' + file_attr.filename
+                if directory_filter is None or directory_filter(directory):
+                    directories.append(directory)
+                    if self.listing_cache is not None and not is_cached:
+                        # a fresh listing holds the subdirectory's current mtime, saving a 'stat' on it
+                        self.listing_cache.observe(directory, file_attr.st_mtime)
+                else:
+                    LOGGER.debug("Skipping directory %s as no file beneath it can match the search pattern", directory)
             else:
                 if is_empty(file_attr):
                     continue
@@ -140,46 +376,325 @@ class SFTPConnection():
 
                 # NB: SFTP specifies path characters to be '/'
                 #     https://tools.ietf.org/html/draft-ietf-secsh-filexfer-13#section-6
-                files.append({"filepath": prefix + '/' + file_attr.filename,
-                              "last_modified": datetime.utcfromtimestamp(last_modified).replace(tzinfo=pytz.UTC)})
+                entries.append(FileEntry(prefix + '/' + file_attr.filename, file_attr.st_size, last_modified))
+
+        return entries, directories
+
+    def get_directory_entries(self, sftp, prefix):
+        """
+        Returns a tuple of (attributes of the entries of "prefix", is_cached), taking the
+        entries from the listing cache if the directory's mtime did not change since it was last listed.
+        """
+        if self.listing_cache is None:
+            return sftp.listdir_attr(prefix), False
+
+        mtime = self.listing_cache.get_observed_mtime(prefix)
+        if mtime is None:
+            mtime = sftp.stat(prefix).st_mtime
+
+        cached = self.listing_cache.get(prefix, mtime)
+        if cached is not None:
+            return cached, True
 
-        return files
+        result = sftp.listdir_attr(prefix)
+        self.listing_cache.put(prefix, mtime, result)
+        return result, False
+
+    def open_channel(self):
+        """ Opens an additional SFTP channel over the existing transport. """
+        # accessing 'sftp' makes sure the transport is connected before opening a channel on it, the
+        # connection may be first used by several threads at once, e.g. the uncompressed connection
+        with self.__restore_lock:
+            self.sftp # pylint: disable=pointless-statement
+        sftp = paramiko.SFTPClient.from_transport(self.transport)
+        sftp.get_channel().settimeout(self.request_timeout)
+        return sftp
+
+    def restore_channel(self):
+        """
+        Replaces the calling thread's SFTP channel if it was closed, reconnecting first if
+        the connection was lost. A replaced channel of the pool takes the lost one's place.
+        """
+        with self.__restore_lock:
+            if self.__active_connection and not self.transport.is_active():
+                LOGGER.warning("SSH connection lost, reconnecting...")
+                # reads over the uncompressed connection are left to it
+                self.__disconnect()
+            self.__try_connect()
+
+            channel = getattr(self.__local, 'sftp', None)
+            if channel is None:
+                if self.__sftp.get_channel().closed:
+                    self.sftp = paramiko.SFTPClient.from_transport(self.transport)
+                    self.sftp.get_channel().settimeout(self.request_timeout)
+            elif channel.get_channel().closed:
+                sftp = paramiko.SFTPClient.from_transport(self.transport)
+                sftp.get_channel().settimeout(self.request_timeout)
+                with self.__channels_available:
+                    if channel in self.__channels:
+                        self.__channels.remove(channel)
+                    else:
+                        # the pool was emptied by the reconnect
+                        self.__channel_count += 1
+                    self.__channels.append(sftp)
+                self.__local.sftp = sftp
+
+    def reopen_file(self, filepath):
+        """ Opens the file again after a read of it failed with the connection or the channel.
+        -> returns the SFTPFile """
+        self.restore_channel()
+        return self.sftp.open(filepath, 'rb')
+
+    @property
+    def pooled_channels(self):
+        """ Number of channels of the pool, the main channel counting towards "max_channels". """
+        return max(self.max_channels - 1, 1)
+
+    @contextlib.contextmanager
+    def channel(self):
+        """
+        Checks out an SFTP channel of the pool for the calling thread, opening one over the
+        existing transport when none is idle and fewer than "max_channels" are open, or else
+        waiting for one to be released. While checked out, "sftp" returns this channel in
+        the calling thread, as paramiko's SFTPClient is not safe to share between threads.
+        """
+        sftp = None
+        with self.__channels_available:
+            while sftp is None:
+                if self.__idle_channels:
+                    sftp = self.__idle_channels.pop()
+                    if sftp.get_channel().closed:
+                        # drop the channels the server closed
+                        self.__channels.remove(sftp)
+                        self.__channel_count -= 1
+                        sftp = None
+                elif self.__channel_count < self.pooled_channels:
+                    # reserve the slot, the channel is opened outside of the lock
+                    self.__channel_count += 1
+                    break
+                else:
+                    self.__channels_available.wait()
 
+        if sftp is None:
+            try:
+                sftp = self.open_channel()
+            except BaseException:
+                with self.__channels_available:
+                    self.__channel_count -= 1
+                    self.__channels_available.notify()
+                raise
+            with self.__channels_available:
+                self.__channels.append(sftp)
+
+        previous = getattr(self.__local, 'sftp', None)
+        previous_releases = getattr(self.__local, 'releases', None)
+        self.__local.sftp = sftp
+        # channels of the uncompressed connection checked out meanwhile, released along with this one
+        self.__local.releases = contextlib.ExitStack()
+        try:
+            yield sftp
+        finally:
+            self.__local.releases.close()
+            self.__local.releases = previous_releases
+            # the channel may have been replaced by 'restore_channel'
+            sftp = self.__local.sftp
+            self.__local.sftp = previous
+            with self.__channels_available:
+                if sftp in self.__channels:
+                    self.__idle_channels.append(sftp)
+                self.__channels_available.notify()
+
+    def walk_directories_concurrently(self, directories, directory_filter=None):
+        """
+        Walks the trees beneath "directories" keeping up to "listing_concurrency"
+        directory listings in flight, each worker on a channel of the pool.
+
+        Yields a FileEntry for every file, in the order the listings complete.
+        """
+        def list_directory(prefix):
+            with self.channel() as sftp:
+                return self.list_directory(sftp, prefix, directory_filter)
+
+        with futures.ThreadPoolExecutor(max_workers=self.listing_concurrency) as executor:
+            pending = {executor.submit(list_directory, directory) for directory in directories}
+            try:
+                while pending:
+                    done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                    for future in done:
+                        entries, subdirectories = future.result()
+                        pending |= {executor.submit(list_directory, directory) for directory in subdirectories}
+                        yield from entries
+            except BaseException:
+                # also reached when the caller stops iterating early
+                for future in pending:
+                    future.cancel()
+                raise
+
+    def plan_listings(self, table_specs):
+        """
+        Walks every "search_prefix" shared by several tables once, keeping the files
+        matching each table's "search_pattern" for the following calls to "get_files".
+        """
+        patterns_by_prefix = {}
+        for table_spec in table_specs:
+            patterns_by_prefix.setdefault(table_spec['search_prefix'], set()).add(table_spec['search_pattern'])
+
+        for prefix, search_patterns in patterns_by_prefix.items():
+            # a prefix searched by a single pattern gains nothing from a shared walk
+            if len(search_patterns) > 1:
+                self.plan_listing(prefix, sorted(search_patterns))
+
+    @backoff.on_exception(backoff.constant,
+                          (socket.timeout),
+                          max_time=60,
+                          interval=10,
+                          jitter=None)
+    def plan_listing(self, prefix, search_patterns):
+        matchers = [(search_pattern, re.compile(search_pattern)) for search_pattern in search_patterns]
+        combined_matcher = pattern.get_combined_matcher(search_patterns)
+        matching_entries = {search_pattern: [] for search_pattern in search_patterns}
+        listed = 0
+
+        for entry in self.iter_files_by_prefix(prefix, pattern.get_combined_directory_filter(search_patterns)):
+            listed += 1
+            # most files usually match none of the patterns, reject them with a single search
+            if combined_matcher is not None and not combined_matcher.search(entry.filepath):
+                continue
+            for search_pattern, matcher in matchers:
+                if matcher.search(entry.filepath):
+                    matching_entries[search_pattern].append(entry)
+
+        LOGGER.info('Listed %s files in "%s" once for %s search patterns', listed, prefix, len(search_patterns))
+        for search_pattern, entries in matching_entries.items():
+            self.planned_listings[(prefix, search_pattern)] = (listed, entries)
+
+    def iter_files(self, prefix, search_pattern, modified_since=None, counts=None):
+        """
+        Yields a FileEntry for every file beneath "prefix" matching "search_pattern" and,
+        if given, modified after "modified_since". The number of files listed and matching
+        the pattern are accumulated in the optional "counts" dict.
+        """
+        matcher = re.compile(search_pattern)
+        modified_since_epoch = modified_since.timestamp() if modified_since is not None else None
+        if counts is None:
+            counts = {}
+        counts.setdefault('listed', 0)
+        counts.setdefault('matching', 0)
+
+        planned_listing = self.planned_listings.get((prefix, search_pattern))
+        if planned_listing is not None:
+            listed, entries = planned_listing
+            counts['listed'] += listed
+        else:
+            # only descend into the directories the search pattern can match files in
+            entries = self.iter_files_by_prefix(prefix, pattern.get_directory_filter(search_pattern))
+
+        for entry in entries:
+            if planned_listing is None:
+                counts['listed'] += 1
+                if not matcher.search(entry.filepath):
+                    continue
+
+            counts['matching'] += 1
+            LOGGER.info("Found file: %s", entry.filepath)
+
+            if modified_since_epoch is not None and entry.last_modified <= modified_since_epoch:
+                continue
+            yield entry
+
+    @backoff.on_exception(backoff.constant,
+                          (socket.timeout),
+                          max_time=60,
+                          interval=10,
+                          jitter=None)
     def get_files(self, prefix, search_pattern, modified_since=None):
-        files = self.get_files_by_prefix(prefix)
-        if files:
-            LOGGER.info('Found %s files in "%s"', len(files), prefix)
+        counts = {}
+        # only the files left after filtering are held in memory for sorting
+        entries = list(self.iter_files(prefix, search_pattern, modified_since, counts))
+
+        if counts['listed']:
+            LOGGER.info('Found %s files in "%s"', counts['listed'], prefix)
         else:
             LOGGER.warning('Found no files on specified SFTP server at "%s"', prefix)
 
-        matching_files = self.get_files_matching_pattern(files, search_pattern)
-
-        if matching_files:
-            LOGGER.info('Found %s files in "%s" matching "%s"', len(matching_files), prefix, search_pattern)
+        if counts['matching']:
+            LOGGER.info('Found %s files in "%s" matching "%s"', counts['matching'], prefix, search_pattern)
         else:
             LOGGER.warning('Found no files on specified SFTP server at "%s" matching "%s"', prefix, search_pattern)
 
-        for f in matching_files:
-            LOGGER.info("Found file: %s", f['filepath'])
-
-        if modified_since is not None:
-            matching_files = [f for f in matching_files if f["last_modified"] > modified_since]
-
-        # sort files in increasing order of "last_modified"
-        sorted_files = sorted(matching_files, key = lambda x: (x['last_modified']).timestamp())
-        return sorted_files
+        # sort files in increasing order of "last_modified", breaking ties on the
+        # path as the concurrent walk does not list directories in a fixed order
+        entries.sort(key=lambda entry: (entry.last_modified, entry.filepath))
+        return [to_file_dict(entry) for entry in entries]
 
     # retry 5 times for timeout error
     @backoff.on_exception(backoff.expo,
                         (socket.timeout),
                         max_tries=5,
                         factor=2)
-    def get_file_handle(self, f):
+    def get_file_handle(self, f, offset=0):
         """ Takes a file dict {"filepath": "...", "last_modified": "..."}
-        -> returns a handle to the file.
+        -> returns a handle to the file, reading from byte "offset" if given.
         -> raises error with appropriate logger message """
+        if self.uncompressed_connection is not None and f["filepath"].lower().endswith(profiles.COMPRESSED_EXTENSIONS):
+            return self.open_over_uncompressed_connection(f, offset)
+
+        # resumed reads start from an offset the compressed output cannot be started at
+        if self.read_backend == 'exec' and not offset and not f["filepath"].lower().endswith(profiles.COMPRESSED_EXTENSIONS):
+            file_handle = self.open_over_exec(f)
+            if file_handle is not None:
+                return file_handle
+        return self.open_over_sftp(f, offset)
+
+    def open_over_uncompressed_connection(self, f, offset=0):
+        """ Opens a file compressed already over the uncompressed connection. A thread reading over
+        a channel of its own reads over one of the uncompressed connection too, until it releases its own. """
+        conn = self.uncompressed_connection
+        releases = getattr(self.__local, 'releases', None)
+        if releases is not None and not conn.holds_channel():
+            releases.enter_context(conn.channel())
+        return conn.get_file_handle(f, offset)
+
+    def open_over_exec(self, f):
+        """
+        Streams the file through the output of a compression command run on the server,
+        decompressed as it is received. A command failing, e.g. as the file cannot be read,
+        and a lost connection continue the read over SFTP from the first byte not yet read.
+
+        Returns a buffered file object, or None when the file has to be read over SFTP.
+        """
+        command = remote_exec.get_compress_command(self.exec_compression, f["filepath"])
+        channel = self.open_exec_channel(command)
+        if channel is None:
+            return None
+
+        def resume(offset, ex):
+            if isinstance(ex, remote_exec.CommandError) and ex.status == remote_exec.COMMAND_NOT_FOUND:
+                LOGGER.warning("'%s' is not installed on the server, reading files over SFTP only",
+                               self.exec_compression)
+                self.read_backend = 'sftp'
+            else:
+                LOGGER.warning("Reading %s on the server failed at byte %s, continuing over SFTP: %s",
+                               f["filepath"], offset, ex)
+            if reader.is_transient(ex):
+                self.restore_channel()
+            return self.open_over_sftp(f, offset)
+
+        file_handle = io.BufferedReader(remote_exec.DecompressingFile(channel, command, self.exec_compression,
+                                                                      self.request_timeout, resume),
+                                        buffer_size=self.read_block_size)
+        try:
+            # waits for the first output, so the files that cannot be read are reported as they are opened
+            file_handle.peek(1)
+        except BaseException:
+            file_handle.close()
+            raise
+        return file_handle
+
+    def open_over_sftp(self, f, offset=0):
+        """ Opens the file over SFTP, reading ahead or downloading it in segments as configured. """
         try:
-            return self.sftp.open(f["filepath"], 'rb')
+            file_handle = self.sftp.open(f["filepath"], 'rb')
         except OSError as e:
             if "Permission denied" in str(e):
                 LOGGER.warn("Skipping %s file because you do not have enough permissions.", f["filepath"])
@@ -187,15 +702,86 @@ class SFTPConnection():
                 LOGGER.warn("Skipping %s file because it is unable to be read.", f["filepath"])
             raise
 
+        # zip archives are read from their end and seeked around, they are better served by plain reads
+        if f["filepath"].endswith('.zip'):
+            return file_handle
+
+        # segments are downloaded over pooled channels, a thread already holding one
+        # would compete with its own segments for the pool, so it reads the file itself
+        if self.download_segments > 1 and not self.holds_channel():
+            size = file_handle.stat().st_size
+            if size - offset >= self.segment_min_size:
+                file_handle.close()
+                # a segment waiting for the reader holds its channel, a segment waiting for a channel
+                # held by those after it would never be downloaded
+                segments = min(self.download_segments, self.pooled_channels)
+                LOGGER.info("Downloading %s in %s segments", f["filepath"], segments)
+                return reader.open_segmented(self, f["filepath"], size, segments,
+                                             self.read_block_size, self.read_ahead_window, self.segment_spool_dir,
+                                             offset, self.segment_spool_limit)
+
+        if self.read_ahead_window > 1:
+            return reader.open_read_ahead(file_handle, self.read_block_size, self.read_ahead_window, offset,
+                                          reopen=lambda: self.reopen_file(f["filepath"]))
+        if offset:
+            file_handle.seek(offset)
+        return file_handle
+
     def get_files_matching_pattern(self, files, pattern):
         """ Takes a file dict {"filepath": "...", "last_modified": "..."} and a regex pattern string, and returns files matching that pattern. """
         matcher = re.compile(pattern)
         return [f for f in files if matcher.search(f["filepath"])]
 
+# connection settings of the config, connections with the same settings are shared by 'get_connection'
+CONNECTION_CONFIG_KEYS = ['host', 'username', 'password', 'private_key_file', 'port', 'request_timeout',
+                          'listing_concurrency', 'listing_cache_path', 'listing_cache_max_age', 'max_sftp_channels',
+                          'read_ahead_window', 'read_block_size', 'download_segments', 'segment_min_size',
+                          'segment_spool_dir', 'segment_spool_limit', 'listing_backend', 'read_backend', 'exec_compression',
+                          'transport_profile', 'transport_compression']
+
+# process-wide connections, keyed by their connection settings
+CONNECTIONS = {}
+
 def connection(config):
-    return SFTPConnection(config['host'],
+    conn = SFTPConnection(config['host'],
                           config['username'],
                           password=config.get('password'),
                           private_key_file=config.get('private_key_file'),
                           port=config.get('port'),
-                          timeout=config.get('request_timeout'))
+                          timeout=config.get('request_timeout'),
+                          listing_concurrency=config.get('listing_concurrency'),
+                          listing_cache_path=config.get('listing_cache_path'),
+                          listing_cache_max_age=config.get('listing_cache_max_age'),
+                          max_channels=config.get('max_sftp_channels'),
+                          read_ahead_window=config.get('read_ahead_window'),
+                          read_block_size=config.get('read_block_size'),
+                          download_segments=config.get('download_segments'),
+                          segment_min_size=config.get('segment_min_size'),
+                          segment_spool_dir=config.get('segment_spool_dir'),
+                          segment_spool_limit=config.get('segment_spool_limit'),
+                          listing_backend=config.get('listing_backend'),
+                          read_backend=config.get('read_backend'),
+                          exec_compression=config.get('exec_compression'),
+                          transport_profile=config.get('transport_profile'),
+                          transport_compression=config.get('transport_compression'))
+    if conn.profile["compression"] == 'auto':
+        # only connected once a compressed file is read, it never lists directories
+        conn.uncompressed_connection = connection({**config, 'transport_compression': 'never',
+                                                   'listing_cache_path': None})
+    return conn
+
+def get_connection(config):
+    """
+    Returns the connection shared by the whole run for the config's connection settings,
+    so discovery, listing and every stream reuse a single authenticated transport.
+    """
+    key = tuple(str(config.get(config_key)) for config_key in CONNECTION_CONFIG_KEYS)
+    if key not in CONNECTIONS:
+        CONNECTIONS[key] = connection(config)
+    return CONNECTIONS[key]
+
+def close_connections():
+    """ Closes the connections opened by "get_connection" along with their channels. """
+    while CONNECTIONS:
+        _, conn = CONNECTIONS.popitem()
+        conn.close()
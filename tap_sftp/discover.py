@@ -12,10 +12,12 @@ LOGGER= singer.get_logger()
 def discover_streams(config, encoding_format):
     streams = []
 
-    conn = client.connection(config)
+    conn = client.get_connection(config)
     prefix = format(config.get("user_dir", "./"))
 
     tables = json.loads(config['tables'])
+    # walk the prefixes shared by several tables once instead of once per table
+    conn.plan_listings(tables)
     for table_spec in tables:
         schema, stream_md = get_schema(conn, table_spec, encoding_format)
 
@@ -0,0 +1,67 @@
+import hashlib
+import singer
+
+LOGGER = singer.get_logger()
+
+# bytes read from each of the sampled ranges of a file
+SAMPLE_SIZE = 64 * 1024
+# ranges sampled from a file, the first and the last included, smaller files are read whole
+SAMPLES = 16
+# fingerprints of synced files kept in the state of a table, the oldest are dropped first. The
+# state is written after every file, so this bounds what each STATE message carries
+MAX_FINGERPRINTS = 256
+# hex digits of the digest kept as the fingerprint, 64 bits make a collision between the
+# fingerprints kept unlikely while keeping each to 16 characters of the state
+FINGERPRINT_SIZE = 16
+
+
+def get_sample_ranges(size):
+    """ Returns the (offset, length) ranges of a file of "size" bytes its fingerprint is computed from. """
+    if size <= SAMPLE_SIZE * SAMPLES:
+        return [(0, size)] if size else []
+    step = (size - SAMPLE_SIZE) // (SAMPLES - 1)
+    return [(index * step, SAMPLE_SIZE) for index in range(SAMPLES - 1)] + [(size - SAMPLE_SIZE, SAMPLE_SIZE)]
+
+
+def get_fingerprint(sftp, filepath):
+    """ Returns the fingerprint of the file's content: the truncated SHA-256 of its size and of
+    sampled ranges of it, read with a single round of pipelined requests. """
+    with sftp.open(filepath, 'rb') as sftp_file:
+        size = sftp_file.stat().st_size
+        digest = hashlib.sha256(str(size).encode())
+        for data in sftp_file.readv(get_sample_ranges(size)):
+            digest.update(data)
+    return digest.hexdigest()[:FINGERPRINT_SIZE]
+
+
+class FileFingerprints():
+    """
+    Fingerprints of the content of the files synced for a table, kept in its state as
+    "file_fingerprints", the most recently synced last. A file re-uploaded with the same
+    content, under the same or another name, has a fingerprint already synced and is skipped.
+
+    Fingerprints are computed from the size and sampled ranges of a file, so a change
+    keeping the size of a file that is larger than the ranges sampled may go unnoticed.
+
+    example = {
+        'file_fingerprints': ['3f2a9c0d4e5b6a71', '9b1e04c2d7f3a856']
+    }
+    """
+    def __init__(self, state, table_name):
+        self.state = state
+        self.table_name = table_name
+        self.fingerprints = list(singer.get_bookmark(state, table_name, 'file_fingerprints') or [])
+
+    def get_fingerprint(self, conn, f):
+        return get_fingerprint(conn.sftp, f["filepath"])
+
+    def is_synced(self, fingerprint):
+        return fingerprint in self.fingerprints
+
+    def add(self, fingerprint):
+        """ Remembers the fingerprint of a synced file, in the state written next. """
+        if fingerprint in self.fingerprints:
+            self.fingerprints.remove(fingerprint)
+        self.fingerprints.append(fingerprint)
+        del self.fingerprints[:-MAX_FINGERPRINTS]
+        singer.write_bookmark(self.state, self.table_name, 'file_fingerprints', self.fingerprints)
@@ -1,22 +1,296 @@
+import queue
 import simplejson as json
+import singer
 import sys
-from singer import RecordMessage
+import threading
+import time
+from singer import RecordMessage, StateMessage
+from tap_sftp import batch
+from tap_sftp import parquet
+
+LOGGER = singer.get_logger()
+
+# characters of messages buffered before they are written to stdout
+DEFAULT_BUFFER_SIZE = 64 * 1024
+# seconds a message is held in the buffer at most
+DEFAULT_BUFFER_AGE = 1.0
+# messages handed to the writer thread at once
+QUEUE_BATCH_SIZE = 256
+
+# encoders reused for every message, by value of "ensure_ascii"
+ENCODERS = {ensure_ascii: json.JSONEncoder(use_decimal=True, ensure_ascii=ensure_ascii)
+            for ensure_ascii in (True, False)}
 
 
 def format_message(message,ensure_ascii=True):
     return json.dumps(message.asdict(), use_decimal=True, ensure_ascii=ensure_ascii)
 
 
+def serialize(message_dict, ensure_ascii=True):
+    """ Serializes a message dict to the same JSON as 'format_message'. """
+    return ENCODERS[ensure_ascii].encode(message_dict)
+
+
+class MessageWriter():
+    """
+    Buffers serialized messages and writes them to stdout once "buffer_size" characters
+    are buffered or the oldest message is "buffer_age" seconds old, instead of writing
+    and flushing every message. A thread started with the first message flushes the
+    messages that reached that age while the sync is busy reading the next ones.
+    "serializer" turns a message dict and the value of "ensure_ascii" into a line of JSON.
+    """
+    def __init__(self, buffer_size=None, buffer_age=None, serializer=serialize):
+        # if value is 0, "0", "" or None then use the defaults
+        self.buffer_size = int(buffer_size or DEFAULT_BUFFER_SIZE)
+        self.buffer_age = float(buffer_age or DEFAULT_BUFFER_AGE)
+        self.serializer = serializer
+        self.lines = []
+        self.size = 0
+        self.buffered_at = None
+        # held while the buffer is changed or written, as the flusher thread writes it too
+        self.lock = threading.RLock()
+        self.closed = threading.Event()
+        self.flusher = None
+
+    def write(self, message_dict, ensure_ascii=True):
+        line = self.serializer(message_dict, ensure_ascii)
+        with self.lock:
+            if not self.lines:
+                self.buffered_at = time.monotonic()
+            self.lines.append(line)
+            self.size += len(line) + 1
+
+            if self.size >= self.buffer_size or time.monotonic() - self.buffered_at >= self.buffer_age:
+                self.flush()
+            elif self.flusher is None:
+                self.flusher = threading.Thread(target=self.flush_by_age, daemon=True)
+                self.flusher.start()
+
+    def flush_by_age(self):
+        """ Flushes the buffer whenever its oldest message gets "buffer_age" seconds old, until closed. """
+        timeout = self.buffer_age
+        while not self.closed.wait(timeout):
+            with self.lock:
+                age = time.monotonic() - self.buffered_at if self.lines else 0
+                if age >= self.buffer_age:
+                    self.flush()
+                    age = 0
+            timeout = self.buffer_age - age
+
+    def write_line(self, line):
+        """ Writes an already serialized message and flushes it with the messages before it. """
+        with self.lock:
+            self.lines.append(line)
+            self.flush()
+
+    def write_state(self, value):
+        with self.lock:
+            self.flush()
+            singer.write_state(value)
+
+    def write_schema(self, stream_name, schema, key_properties, bookmark_properties=None, stream_alias=None):
+        with self.lock:
+            self.flush()
+            singer.write_schema(stream_name, schema, key_properties, bookmark_properties, stream_alias)
+
+    def flush(self):
+        with self.lock:
+            if self.lines:
+                self.lines.append('')
+                sys.stdout.write('\n'.join(self.lines))
+                self.lines = []
+                self.size = 0
+            sys.stdout.flush()
+
+    def close(self):
+        self.closed.set()
+        self.flush()
+
+
+class ThreadedMessageWriter():
+    """
+    Hands messages to "writer" running in a thread of its own through a queue of at most
+    "queue_size" batches, so stdout is written while the sync downloads and parses the
+    next records. Batches are handed over once full or "buffer_age" seconds old, by a thread
+    of its own while the sync is busy reading the next ones, and by every state message and
+    flush. The time
+    the sync waited for room in the queue and the time the writer thread waited for
+    messages tell which side is the bottleneck.
+    """
+    def __init__(self, queue_size, writer, buffer_age=None):
+        self.writer = writer
+        self.buffer_age = float(buffer_age or DEFAULT_BUFFER_AGE)
+        self.queue = queue.Queue(queue_size)
+        self.pending = []
+        self.pending_since = None
+        self.error = None
+        # seconds the sync waited on a full queue and the writer thread on an empty one
+        self.producer_wait = 0.0
+        self.consumer_wait = 0.0
+        # held while the pending batch is changed or handed over, as the flusher thread hands it over too
+        self.lock = threading.RLock()
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.flusher = threading.Thread(target=self.hand_over_by_age, daemon=True)
+        self.flusher.start()
+
+    def run(self):
+        while True:
+            started = time.monotonic()
+            items = self.queue.get()
+            self.consumer_wait += time.monotonic() - started
+            if items is None:
+                return
+            try:
+                for item in items:
+                    if isinstance(item, threading.Event):
+                        if self.error is None:
+                            self.writer.flush()
+                        item.set()
+                    elif self.error is not None:
+                        # keep draining the queue, the sync raises the error on its next write
+                        continue
+                    elif isinstance(item, str):
+                        self.writer.write_line(item)
+                    else:
+                        self.writer.write(*item)
+            except Exception as ex: # pylint: disable=broad-except
+                self.error = ex
+
+    def hand_over_by_age(self):
+        """ Hands the pending batch over whenever its oldest message gets "buffer_age" seconds old, until closed. """
+        timeout = self.buffer_age
+        while not self.closed.wait(timeout):
+            with self.lock:
+                age = time.monotonic() - self.pending_since if self.pending else 0
+                if age >= self.buffer_age:
+                    self.hand_over()
+                    age = 0
+            timeout = self.buffer_age - age
+
+    def put(self, item):
+        if self.error is not None:
+            raise self.error
+        with self.lock:
+            if not self.pending:
+                self.pending_since = time.monotonic()
+            self.pending.append(item)
+            if len(self.pending) >= QUEUE_BATCH_SIZE or time.monotonic() - self.pending_since >= self.buffer_age:
+                self.hand_over()
+
+    def hand_over(self):
+        with self.lock:
+            if self.pending:
+                started = time.monotonic()
+                self.queue.put(self.pending)
+                self.producer_wait += time.monotonic() - started
+                self.pending = []
+
+    def write(self, message_dict, ensure_ascii=True):
+        self.put((message_dict, ensure_ascii))
+
+    def write_state(self, value):
+        # serialized right away, the state keeps changing while it waits in the queue
+        with self.lock:
+            self.put(format_message(StateMessage(value=value)))
+            self.hand_over()
+
+    def write_schema(self, stream_name, schema, key_properties, bookmark_properties=None, stream_alias=None):
+        # the writer thread is idle once flushed, the schema is written by the syncing thread
+        self.flush()
+        self.writer.write_schema(stream_name, schema, key_properties, bookmark_properties, stream_alias)
+
+    def flush(self):
+        """ Waits for the messages written so far to be written to stdout. """
+        flushed = threading.Event()
+        with self.lock:
+            self.put(flushed)
+            self.hand_over()
+        flushed.wait()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.closed.set()
+        if self.thread.is_alive():
+            try:
+                self.flush()
+            finally:
+                self.queue.put(None)
+                self.thread.join()
+            LOGGER.info("Output writer: the sync waited %.1f seconds for the output, the writer waited "
+                        "%.1f seconds for records. The %s is the bottleneck.",
+                        self.producer_wait, self.consumer_wait,
+                        "output" if self.producer_wait > self.consumer_wait else "sync")
+
+
+WRITER = MessageWriter()
+
+
+def configure_writer(config):
+    """ Replaces the writer with one buffering, batching or writing Parquet files and writing from
+    a thread as set in the config. """
+    global WRITER
+    WRITER.close()
+    writer = MessageWriter(buffer_size=config.get('output_buffer_size'),
+                           buffer_age=config.get('output_buffer_age'))
+
+    batch_config = batch.get_batch_config(config)
+    output_format = config.get('output_format') or 'singer'
+    if output_format == 'parquet':
+        if batch_config:
+            raise Exception("The 'batch_config' cannot be used with the 'parquet' output format")
+        writer = parquet.ParquetMessageWriter(writer, directory=config.get('parquet_dir'),
+                                              row_group_size=config.get('parquet_row_group_size'),
+                                              file_size=config.get('parquet_file_size'))
+    elif output_format != 'singer':
+        raise Exception("Unsupported output format - {}. Enter one of: singer, parquet".format(output_format))
+    elif batch_config:
+        writer = batch.BatchMessageWriter(writer, batch_config)
+
+    # if value is 0, "0", "" or None then write the messages in the syncing thread
+    queue_size = int(config.get('writer_queue_size') or 0)
+    if queue_size > 0:
+        writer = ThreadedMessageWriter(queue_size, writer, buffer_age=config.get('output_buffer_age'))
+    WRITER = writer
+
+
+def close_writer():
+    """ Writes out the buffered messages and stops the writer thread, if any. """
+    global WRITER
+    WRITER.close()
+    WRITER = MessageWriter()
+
+
 def write_message(message, ensure_ascii=True):
-    sys.stdout.write(format_message(message, ensure_ascii=ensure_ascii) + '\n')
-    sys.stdout.flush()
+    WRITER.write(message.asdict(), ensure_ascii=ensure_ascii)
 
 
 def write_record(stream_name, record, stream_alias=None, time_extracted=None, ensure_ascii=True):
     """
     Write a single record for the given stream.
-    
+
+    """
+    if time_extracted is None:
+        # the dict 'RecordMessage.asdict' returns, without the message object
+        message_dict = {'type': 'RECORD', 'stream': stream_alias or stream_name, 'record': record}
+    else:
+        message_dict = RecordMessage(stream=(stream_alias or stream_name),
+                                     record=record,
+                                     time_extracted=time_extracted).asdict()
+    WRITER.write(message_dict, ensure_ascii=ensure_ascii)
+
+
+def write_state(value):
+    """
+    Write a state message once the records before it are written.
+    """
+    WRITER.write_state(value)
+
+
+def write_schema(stream_name, schema, key_properties, bookmark_properties=None, stream_alias=None):
+    """
+    Write a schema message once the records before it are written.
     """
-    write_message(RecordMessage(stream=(stream_alias or stream_name),
-                                record=record,
-                                time_extracted=time_extracted), ensure_ascii=ensure_ascii)
+    WRITER.write_schema(stream_name, schema, key_properties, bookmark_properties, stream_alias)
@@ -0,0 +1,114 @@
+import collections
+import json
+import os
+import time
+import singer
+
+LOGGER = singer.get_logger()
+
+# re-list directories whose cached listing is older than a day, bounding how long a listing
+# is served without looking at the directory's entries
+DEFAULT_MAX_AGE = 86400
+MANIFEST_VERSION = 1
+
+CachedAttributes = collections.namedtuple("CachedAttributes", ["filename", "st_mode", "st_size", "st_mtime"])
+
+class ListingCache():
+    """
+    On-disk manifest of directory listings keyed by the directory's mtime.
+
+    A listing taken within the same second as a change of the directory may have missed
+    entries while its mtime stays the same, and the server's clock cannot be compared with
+    ours. So a listing is only "confirmed", and served from the cache, once the directory
+    was listed again at the same mtime. "listed_at" is our own clock, for "max_age" only.
+
+    Rewriting a file in place changes the file's mtime but not its directory's, so the cached
+    listing keeps serving the file's old mtime and the rewrite goes unseen. If the table's
+    bookmark moves past the new mtime meanwhile, as newer files elsewhere are synced, the
+    rewritten file is never synced, not even once "max_age" re-lists its directory. The
+    cache, only used when a "listing_cache_path" is set, suits directories whose files are
+    added but never rewritten in place.
+
+    example = {
+        'version': 1,
+        'server': 'username@host:22',
+        'directories': {
+            '<directory path>': {
+                'mtime': 1538614800,
+                'listed_at': 1538625600,
+                'confirmed': True,
+                'entries': [['file_1.csv', 33188, 1024, 1538614800], ...]
+            }
+        }
+    }
+    """
+    def __init__(self, path, server, max_age=None):
+        self.path = os.path.expanduser(path)
+        self.server = server
+        self.max_age = float(max_age) if max_age not in (None, "") else DEFAULT_MAX_AGE
+        self.directories = {}
+        self.observed_mtimes = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as manifest_file:
+                manifest = json.load(manifest_file)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            LOGGER.warning("Ignoring unreadable listing cache %s", self.path)
+            return
+
+        if manifest.get('version') != MANIFEST_VERSION or manifest.get('server') != self.server:
+            LOGGER.info("Ignoring listing cache %s as it was written for another server", self.path)
+            return
+        self.directories = manifest['directories']
+
+    def save(self):
+        if not self.dirty:
+            return
+        manifest = {'version': MANIFEST_VERSION,
+                    'server': self.server,
+                    'directories': self.directories}
+        # write to a temporary file and swap it in so a crash never leaves a truncated manifest
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+        self.dirty = False
+
+    def observe(self, directory, mtime):
+        """ Records the mtime of a directory seen in a fresh listing of its parent. """
+        self.observed_mtimes[directory] = mtime
+
+    def get_observed_mtime(self, directory):
+        return self.observed_mtimes.pop(directory, None)
+
+    def get(self, directory, mtime):
+        """ Returns the cached entries of "directory" if it has not changed since it was listed, else None. """
+        cached = self.directories.get(directory)
+        if cached is None or mtime is None or cached['mtime'] != mtime:
+            return None
+
+        if not cached.get('confirmed'):
+            return None
+
+        if time.time() - cached['listed_at'] > self.max_age:
+            return None
+
+        return [CachedAttributes(*entry) for entry in cached['entries']]
+
+    def put(self, directory, mtime, result):
+        if mtime is None:
+            return
+        previous = self.directories.get(directory)
+        self.directories[directory] = {
+            'mtime': mtime,
+            'listed_at': int(time.time()),
+            # an earlier listing saw the same mtime, so the directory did not change since this one
+            'confirmed': previous is not None and previous['mtime'] == mtime,
+            'entries': [[a.filename, a.st_mode, a.st_size, a.st_mtime] for a in result]
+        }
+        self.dirty = True
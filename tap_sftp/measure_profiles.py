@@ -0,0 +1,89 @@
+"""
+Measures how fast files are read from a server over each transport profile, to pick the
+"transport_profile" of the config, e.g.
+
+    tap-sftp-measure-profiles --config config.json --file /exports/orders.csv --file /exports/orders.csv.gz
+
+Files compressed already are best measured along with uncompressed ones, as the 'auto'
+compression policy reads them over a second connection.
+"""
+import argparse
+import json
+import time
+import singer
+from tap_sftp import client
+from tap_sftp import profiles
+
+LOGGER = singer.get_logger()
+
+DEFAULT_RUNS = 3
+# bytes read from a file handle at once
+READ_SIZE = 1024 * 1024
+# settings of the config overriding the profile's compression or reading the files other than
+# over SFTP, left out so the reads measured differ by their profile only
+OVERRIDING_CONFIG_KEYS = ('transport_compression', 'read_backend', 'exec_compression')
+
+
+def read_files(conn, filepaths):
+    """ Reads the files through the connection's file handles.
+    -> returns the number of bytes read """
+    size = 0
+    for filepath in filepaths:
+        file_handle = conn.get_file_handle({"filepath": filepath})
+        try:
+            for data in iter(lambda: file_handle.read(READ_SIZE), b""):
+                size += len(data)
+        finally:
+            file_handle.close()
+    return size
+
+
+def measure(config, transport_profile, filepaths, runs=DEFAULT_RUNS):
+    """ Reads the files "runs" times over a connection with the transport profile.
+    -> returns (seconds to connect, bytes read, seconds of the fastest read) """
+    config = {key: value for key, value in config.items() if key not in OVERRIDING_CONFIG_KEYS}
+    conn = client.connection({**config, "transport_profile": transport_profile})
+    try:
+        started = time.monotonic()
+        conn.sftp # pylint: disable=pointless-statement
+        connect_time = time.monotonic() - started
+
+        read_times = []
+        for _ in range(runs):
+            started = time.monotonic()
+            size = read_files(conn, filepaths)
+            read_times.append(time.monotonic() - started)
+        return connect_time, size, min(read_times)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the transport profiles against a server.")
+    parser.add_argument("--config", required=True, help="Config file of the tap, with the connection settings")
+    parser.add_argument("--file", action="append", required=True, dest="files",
+                        help="Path of a file on the server to read, may be repeated")
+    parser.add_argument("--profile", action="append", dest="profiles", choices=list(profiles.PROFILES),
+                        help="Transport profile to measure, may be repeated, all of them by default")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS,
+                        help="Times the files are read over each profile, the fastest counts")
+    args = parser.parse_args()
+
+    with open(args.config) as config_file:
+        config = json.load(config_file)
+
+    results = []
+    for transport_profile in args.profiles or list(profiles.PROFILES):
+        LOGGER.info("Measuring transport profile '%s'", transport_profile)
+        connect_time, size, read_time = measure(config, transport_profile, args.files, args.runs)
+        results.append((size / read_time / 1024 / 1024, transport_profile, connect_time, read_time))
+
+    results.sort(reverse=True)
+    print("{:<10} {:>10} {:>10} {:>10}".format("profile", "MiB/s", "read (s)", "connect (s)"))
+    for throughput, transport_profile, connect_time, read_time in results:
+        print("{:<10} {:>10.1f} {:>10.2f} {:>10.2f}".format(transport_profile, throughput, read_time, connect_time))
+    print("Fastest profile: {}".format(results[0][1]))
+
+
+if __name__ == "__main__":
+    main()
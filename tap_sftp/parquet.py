@@ -0,0 +1,240 @@
+import copy
+import functools
+import os
+import uuid
+import simplejson
+import singer
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+LOGGER = singer.get_logger()
+
+# records of a stream written to a Parquet file as a row group
+DEFAULT_ROW_GROUP_SIZE = 100000
+# records of a stream written to a Parquet file before it is closed and the next one started
+DEFAULT_FILE_SIZE = 1000000
+# suffix of the string column holding the values of a typed column that are not of its type
+FALLBACK_SUFFIX = "__string"
+# errors of values that are not of the Arrow type of their column
+CONVERSION_ERRORS = (pyarrow.ArrowException, TypeError, ValueError, OverflowError) if pyarrow else ()
+
+
+def get_arrow_type(schema):
+    """ Returns the Arrow type of the values of a column with the JSON "schema", the narrowest
+    of its types other than "string", as discovered columns have a "string" fallback. """
+    if "anyOf" in schema:
+        types = []
+        for sub_schema in schema["anyOf"]:
+            if sub_schema.get("format") == "date-time":
+                return pyarrow.string()
+            sub_types = sub_schema.get("type") or []
+            types += sub_types if isinstance(sub_types, list) else [sub_types]
+    else:
+        types = schema.get("type") or []
+        types = types if isinstance(types, list) else [types]
+
+    # date-times are written as the normalized strings of RECORD messages
+    if schema.get("format") == "date-time":
+        return pyarrow.string()
+    if "array" in types and isinstance(schema.get("items"), dict):
+        return pyarrow.list_(get_arrow_type(schema["items"]))
+    if "number" in types:
+        return pyarrow.float64()
+    if "integer" in types:
+        return pyarrow.int64()
+    if "boolean" in types:
+        return pyarrow.bool_()
+    return pyarrow.string()
+
+
+def get_arrow_schema(properties):
+    """ Returns the Arrow schema of the files of a stream with the JSON schema "properties". """
+    return pyarrow.schema([pyarrow.field(name, get_arrow_type(schema)) for name, schema in properties.items()])
+
+
+def stringify(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return simplejson.dumps(value, use_decimal=True, ensure_ascii=False)
+    return str(value)
+
+
+def convert_column(values, arrow_type):
+    """ Returns the values as an Arrow array of "arrow_type", and the values that are not of that
+    type, like those a "string" fallback kept, as strings in their rows, or None if all are. """
+    if arrow_type == pyarrow.string():
+        return pyarrow.array([stringify(value) for value in values], type=arrow_type), None
+    try:
+        return pyarrow.array(values, type=arrow_type), None
+    except CONVERSION_ERRORS:
+        pass
+
+    typed, fallback = [], []
+    for value in values:
+        try:
+            pyarrow.scalar(value, type=arrow_type)
+        except CONVERSION_ERRORS:
+            typed.append(None)
+            fallback.append(stringify(value))
+        else:
+            typed.append(value)
+            fallback.append(None)
+    return pyarrow.array(typed, type=arrow_type), fallback
+
+
+class ParquetFile():
+    """ A Parquet file of the records of a stream, written a row group at a time. """
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self.writer = pyarrow.parquet.ParquetWriter(path, schema)
+        self.records = 0
+
+    def write_row_group(self, table):
+        self.writer.write_table(table, row_group_size=table.num_rows)
+        self.records += table.num_rows
+
+    def close(self):
+        self.writer.close()
+
+
+class ParquetMessageWriter():
+    """
+    Writes the records of RECORD messages to local Parquet files under "directory" instead of
+    writing the messages, so the records are never serialized to JSON. A stream's records are
+    written in row groups of "row_group_size" records to a file closed once it holds
+    "file_size" records. The columns are those of the stream's SCHEMA message, typed from it.
+    The values of a column that are not of its type are written to a string column named
+    after it with FALLBACK_SUFFIX, added once such a value is written, and are null in the
+    typed column. Other messages are written by "writer".
+
+    A Parquet file can only be read once closed, so a STATE message is held until the files
+    of the records before it are closed, as a bookmark must not cover records that could be
+    lost. Only the last one held is written, as each holds the whole state.
+    """
+    def __init__(self, writer, directory=None, row_group_size=None, file_size=None):
+        if pyarrow is None:
+            raise Exception("Writing Parquet files requires the 'pyarrow' package, install 'tap-sftp[parquet]'")
+
+        self.writer = writer
+        self.directory = os.path.abspath(os.path.expanduser(directory or "."))
+        # if value is 0, "0", "" or None then use the defaults
+        self.row_group_size = int(row_group_size or DEFAULT_ROW_GROUP_SIZE)
+        self.file_size = int(file_size or DEFAULT_FILE_SIZE)
+        os.makedirs(self.directory, exist_ok=True)
+        # stream -> Arrow schema of its files
+        self.schemas = {}
+        # stream -> records not yet written
+        self.records = {}
+        # stream -> open ParquetFile
+        self.files = {}
+        # function writing the last STATE message held
+        self.pending_state = None
+
+    def write(self, message_dict, ensure_ascii=True):
+        if message_dict.get("type") != "RECORD":
+            self.writer.write(message_dict, ensure_ascii)
+            return
+
+        stream = message_dict["stream"]
+        records = self.records.setdefault(stream, [])
+        records.append(message_dict["record"])
+        if len(records) >= self.row_group_size:
+            self.write_row_group(stream)
+
+    def get_schema(self, stream):
+        schema = self.schemas.get(stream)
+        if schema is None:
+            schema = self.schemas[stream] = pyarrow.schema([])
+        names = set(schema.names)
+        unknown = {name for record in self.records[stream] for name in record if name not in names}
+        if unknown:
+            # records are transformed to the schema, columns missing from it are written as strings
+            LOGGER.warning("Stream '%s' has columns that are not in its schema: %s, writing them as strings.",
+                           stream, ", ".join(sorted(unknown)))
+            for name in sorted(unknown):
+                schema = schema.append(pyarrow.field(name, pyarrow.string()))
+            self.schemas[stream] = schema
+        return schema
+
+    def get_table(self, stream, schema, records):
+        """ Returns the records as an Arrow table, with the string columns of the values that are
+        not of the type of their column added to the schema. """
+        columns = {}
+        for field in schema:
+            if field.name in columns:
+                continue
+            columns[field.name], fallback = convert_column([record.get(field.name) for record in records], field.type)
+            if fallback is not None:
+                name = field.name + FALLBACK_SUFFIX
+                if name not in schema.names:
+                    LOGGER.warning("Stream '%s' has values of column '%s' that are not of type %s, writing them "
+                                   "to the string column '%s'.", stream, field.name, field.type, name)
+                    schema = schema.append(pyarrow.field(name, pyarrow.string()))
+                columns[name] = pyarrow.array(fallback, type=pyarrow.string())
+        self.schemas[stream] = schema
+        return pyarrow.Table.from_arrays([columns[field.name] for field in schema], schema=schema)
+
+    def write_row_group(self, stream):
+        table = self.get_table(stream, self.get_schema(stream), self.records.pop(stream))
+        schema = table.schema
+        parquet_file = self.files.get(stream)
+        if parquet_file is not None and not parquet_file.schema.equals(schema):
+            # the columns of a file are fixed once it is opened
+            self.close_file(stream)
+            parquet_file = None
+        if parquet_file is None:
+            path = os.path.join(self.directory, "{}-{}.parquet".format(stream, uuid.uuid4().hex))
+            parquet_file = self.files[stream] = ParquetFile(path, schema)
+
+        parquet_file.write_row_group(table)
+        if parquet_file.records >= self.file_size:
+            self.close_file(stream)
+            self.write_pending_state()
+
+    def close_file(self, stream):
+        parquet_file = self.files.pop(stream)
+        parquet_file.close()
+        LOGGER.info("Wrote %s records for stream '%s' to %s", parquet_file.records, stream, parquet_file.path)
+
+    def write_pending_state(self):
+        """ Writes the STATE message held once no records before it are left to write out. """
+        if self.pending_state is not None and not self.files and not self.records:
+            self.pending_state()
+            self.pending_state = None
+
+    def write_files(self):
+        """ Writes out the records and closes the files, then writes the STATE message held. """
+        for stream in list(self.records):
+            self.write_row_group(stream)
+        for stream in list(self.files):
+            self.close_file(stream)
+        self.write_pending_state()
+
+    def write_line(self, line):
+        # serialized STATE messages handed over by the writer thread
+        self.pending_state = functools.partial(self.writer.write_line, line)
+        self.write_pending_state()
+
+    def write_state(self, value):
+        # the state keeps changing while it is held
+        self.pending_state = functools.partial(self.writer.write_state, copy.deepcopy(value))
+        self.write_pending_state()
+
+    def write_schema(self, stream_name, schema, key_properties, bookmark_properties=None, stream_alias=None):
+        self.write_files()
+        self.schemas[stream_alias or stream_name] = get_arrow_schema(schema.get("properties") or {})
+        self.writer.write_schema(stream_name, schema, key_properties, bookmark_properties, stream_alias)
+
+    def flush(self):
+        self.write_files()
+        self.writer.flush()
+
+    def close(self):
+        self.write_files()
+        self.writer.close()
@@ -0,0 +1,186 @@
+import re
+
+QUANTIFIERS = ('*', '+', '?', '{')
+# escapes spanning a fixed number of characters after their letter
+HEX_ESCAPE_SIZES = {'x': 2, 'u': 4, 'U': 8}
+OCTAL_DIGITS = '01234567'
+
+def get_escape_end(pattern, position):
+    """
+    Returns the end of the escape sequence starting at "position": octal escapes and
+    group references span their digits, '\\x', '\\u' and '\\U' their hex digits and
+    '\\N{...}' the name in braces, the other escapes one character.
+    """
+    end = position + 2
+    char = pattern[position + 1]
+    if char in HEX_ESCAPE_SIZES:
+        return end + HEX_ESCAPE_SIZES[char]
+    if char == 'N' and pattern[end:end + 1] == '{':
+        closing = pattern.find('}', end)
+        if closing == -1:
+            raise re.error("missing }")
+        return closing + 1
+    if char == '0':
+        # up to two more octal digits
+        while end < min(position + 4, len(pattern)) and pattern[end] in OCTAL_DIGITS:
+            end += 1
+    elif char.isdigit():
+        # three octal digits are a character, else one or two digits a group reference
+        if char in OCTAL_DIGITS and len(pattern) >= position + 4 and \
+           all(digit in OCTAL_DIGITS for digit in pattern[position + 2:position + 4]):
+            return position + 4
+        if pattern[end:end + 1].isdigit():
+            end += 1
+    return end
+
+def tokenize(pattern):
+    """
+    Splits a regex pattern into tokens: escape sequences, character classes
+    and single characters. Raises 're.error' for an unterminated class or escape.
+    """
+    tokens = []
+    position = 0
+    while position < len(pattern):
+        char = pattern[position]
+        if char == '\\':
+            if position + 1 >= len(pattern):
+                raise re.error("bad escape (end of pattern)")
+            end = get_escape_end(pattern, position)
+        elif char == '[':
+            end = position + 1
+            if pattern[end:end + 1] == '^':
+                end += 1
+            # a ']' right after the opening bracket is a literal
+            if pattern[end:end + 1] == ']':
+                end += 1
+            while end < len(pattern) and pattern[end] != ']':
+                end += 2 if pattern[end] == '\\' else 1
+            if end >= len(pattern):
+                raise re.error("unterminated character set")
+            end += 1
+        elif char == '(' and pattern[position:position + 2] == '(?':
+            end = position + 2
+        else:
+            end = position + 1
+        tokens.append(pattern[position:end])
+        position = end
+    return tokens
+
+def can_match_separator(token):
+    """ Returns True if the single token may match the '/' path separator. """
+    if token in ('(', '(?', ')') or token in QUANTIFIERS:
+        return False
+    return re.fullmatch(token, '/') is not None
+
+def get_anchored_segments(search_pattern):
+    """
+    Returns the compiled regexes of the leading path segments of a pattern anchored
+    at the start with '^' or '\\A', e.g. ['', 'exports', '20(23|24)'] for
+    '^/exports/20(23|24)/.*\\.csv'. The analysis stops at the first segment
+    that may match a '/' as it can span any number of directories.
+
+    Unanchored patterns can match at any depth, so they yield no segments.
+    """
+    try:
+        tokens = tokenize(search_pattern)
+    except re.error:
+        return []
+
+    if tokens[:1] == ['^'] or tokens[:1] == ['\\A']:
+        tokens = tokens[1:]
+    else:
+        return []
+
+    # a top level alternation makes the anchor apply to the first branch only
+    depth = 0
+    for token in tokens:
+        if token in ('(', '(?'):
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif token == '|' and depth == 0:
+            return []
+
+    segments = []
+    segment = []
+    depth = 0
+    for index, token in enumerate(tokens):
+        if token in ('/', '\\/') and depth == 0:
+            # an optional or repeated separator does not end the segment
+            if tokens[index + 1:index + 2] and tokens[index + 1][0] in QUANTIFIERS:
+                break
+            segments.append(''.join(segment))
+            segment = []
+            continue
+
+        if token == '(?':
+            # only non-capturing groups, no lookarounds, inline flags or named groups
+            if tokens[index + 1:index + 2] != [':']:
+                break
+            depth += 1
+        elif token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+
+        try:
+            if can_match_separator(token) or token in ('/', '\\/'):
+                break
+        except re.error:
+            # e.g. back references, which can't be resolved within a segment
+            break
+        segment.append(token)
+
+    compiled = []
+    for segment_pattern in segments:
+        try:
+            compiled.append(re.compile(segment_pattern))
+        except re.error:
+            break
+    return compiled
+
+def get_directory_filter(search_pattern):
+    """
+    Returns a function telling whether a directory may contain files matching
+    "search_pattern", or None if every directory has to be walked.
+    """
+    matchers = get_anchored_segments(search_pattern)
+    if not matchers:
+        return None
+
+    def may_contain_matches(directory):
+        # zip stops at the shorter of the two, anything deeper than the
+        # anchored segments is not constrained
+        for name, matcher in zip(directory.split('/'), matchers):
+            if not matcher.fullmatch(name):
+                return False
+        return True
+
+    return may_contain_matches
+
+def get_combined_directory_filter(search_patterns):
+    """
+    Returns a function telling whether a directory may contain files matching
+    any of "search_patterns", or None if every directory has to be walked.
+    """
+    directory_filters = [get_directory_filter(search_pattern) for search_pattern in search_patterns]
+    if not directory_filters or None in directory_filters:
+        return None
+
+    def may_contain_matches(directory):
+        return any(directory_filter(directory) for directory_filter in directory_filters)
+
+    return may_contain_matches
+
+def get_combined_matcher(search_patterns):
+    """
+    Returns a single compiled regex matching wherever any of "search_patterns"
+    matches, used to reject most files with one search. Returns None if the
+    patterns can't be combined, e.g. because of back references or inline flags.
+    """
+    if any(re.search(r'\\[1-9]|\(\?P=', search_pattern) for search_pattern in search_patterns):
+        return None
+    try:
+        return re.compile('|'.join('(?:{})'.format(search_pattern) for search_pattern in search_patterns))
+    except re.error:
+        return None
@@ -0,0 +1,83 @@
+import json
+from paramiko import common
+
+# 'always' compresses the whole connection, 'never' none of it, and 'auto' compresses it but
+# reads the files compressed already over a second, uncompressed connection
+COMPRESSION_POLICIES = ('always', 'never', 'auto')
+
+# payloads compressed already, which only cost CPU to compress again
+COMPRESSED_EXTENSIONS = ('.gz', '.zip', '.zst', '.bz2', '.xz')
+
+# settings of a connection's SSH transport: the ciphers and MACs to prefer, ahead of the rest
+# of paramiko's, the window and largest packet of its channels, and its compression policy
+DEFAULT_PROFILE = {
+    "ciphers": (),
+    "macs": (),
+    "window_size": common.DEFAULT_WINDOW_SIZE,
+    "max_packet_size": common.DEFAULT_MAX_PACKET_SIZE,
+    "compression": "always",
+}
+
+# paramiko offers neither AES-GCM nor chacha20-poly1305, AES-128 in counter mode is the
+# cheapest of its ciphers with or without AES instructions, and encrypt-then-MAC the
+# cheapest of its MACs to check
+FAST_CIPHERS = ("aes128-ctr",)
+FAST_MACS = ("hmac-sha2-256-etm@openssh.com",)
+
+PROFILES = {
+    # paramiko's algorithms and window, compressing everything, as connections always did
+    "default": {},
+    # compresses only the files not compressed already
+    "balanced": {"compression": "auto"},
+    # no compression, for networks fast enough that compressing costs more time than it saves
+    "lan": {"ciphers": FAST_CIPHERS, "macs": FAST_MACS, "compression": "never"},
+    # a larger window and packets keep more data in flight on links with a high latency
+    "wan": {"ciphers": FAST_CIPHERS, "macs": FAST_MACS, "window_size": 32 * 1024 * 1024,
+            "max_packet_size": 128 * 1024, "compression": "auto"},
+}
+
+
+def get_profile(transport_profile=None, transport_compression=None):
+    """
+    Returns the settings of the "transport_profile", the name of one of PROFILES or a dict of
+    settings, possibly given as a JSON string like "tables", overriding the default profile's.
+    "transport_compression", if given, overrides the profile's compression policy.
+    """
+    if isinstance(transport_profile, str) and transport_profile.strip().startswith("{"):
+        transport_profile = json.loads(transport_profile)
+
+    if isinstance(transport_profile, dict):
+        unknown = set(transport_profile) - set(DEFAULT_PROFILE)
+        if unknown:
+            raise Exception("Unsupported transport profile settings: {}, expected some of {}"
+                            .format(", ".join(sorted(unknown)), ", ".join(DEFAULT_PROFILE)))
+        settings = transport_profile
+    else:
+        name = transport_profile or "default"
+        if name not in PROFILES:
+            raise Exception("Unsupported transport profile: {}, expected one of {}"
+                            .format(name, ", ".join(PROFILES)))
+        settings = PROFILES[name]
+
+    profile = {**DEFAULT_PROFILE, **settings}
+    if transport_compression:
+        profile["compression"] = transport_compression
+    if profile["compression"] not in COMPRESSION_POLICIES:
+        raise Exception("Unsupported transport compression: {}, expected one of {}"
+                        .format(profile["compression"], ", ".join(COMPRESSION_POLICIES)))
+    return profile
+
+
+def set_preferred_algorithms(transport, profile):
+    """
+    Puts the profile's ciphers and MACs first in the transport's offer, ahead of the rest of
+    paramiko's, so a server supporting none of them still agrees on one. Algorithms paramiko
+    does not support are left out.
+    """
+    options = transport.get_security_options()
+    # paramiko calls the MACs digests
+    for name, option in (("ciphers", "ciphers"), ("macs", "digests")):
+        supported = getattr(options, option)
+        preferred = tuple(algorithm for algorithm in profile[name] if algorithm in supported)
+        if preferred:
+            setattr(options, option, preferred + tuple(a for a in supported if a not in preferred))
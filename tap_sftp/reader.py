@@ -0,0 +1,259 @@
+import collections
+import io
+import os
+import socket
+import tempfile
+import threading
+import backoff
+import singer
+from paramiko.ssh_exception import SSHException
+
+LOGGER = singer.get_logger()
+
+# paramiko's largest read request, bigger blocks are split by 'readv' anyway
+DEFAULT_READ_BLOCK_SIZE = 32768
+# read requests kept in flight, the same as OpenSSH's sftp client ('sftp -R')
+DEFAULT_READ_AHEAD_WINDOW = 64
+# bytes a segment is downloaded ahead of the reader at most. The segments after the one being
+# read wait for it once they spooled this much, so a file downloaded in N segments takes up
+# to (N - 1) times this much space in the spool directory
+DEFAULT_SEGMENT_SPOOL_LIMIT = 64 * 1024 * 1024
+
+def is_transient(ex):
+    """ Returns whether the error is the connection or the channel failing rather than the file. """
+    # paramiko raises "Socket is closed" for requests on a channel that was closed
+    return isinstance(ex, (socket.timeout, EOFError, SSHException, ConnectionError)) or str(ex) == "Socket is closed"
+
+def handle_backoff(details):
+    read_ahead_file = details["args"][0]
+    LOGGER.warning("Reading the file failed at byte %s, waiting %s seconds to reopen it and continue...",
+                   read_ahead_file.fetch_position, round(details["wait"], 1))
+    read_ahead_file.failed = True
+
+class ReadAheadFile(io.RawIOBase):
+    """
+    Reads an SFTPFile in windows of "window" pipelined read requests of "block_size"
+    bytes, so a window costs a single round trip instead of one per block.
+
+    Only the bytes from "start" up to "end" are read if given. Without an "end", bytes
+    appended after the file was opened are still read, one block at a time.
+
+    Given "reopen", a function returning the file opened again, reads failing with the
+    connection or channel are retried on the file reopened by it from the first byte
+    not yet fetched, so a dropped connection only costs the bytes in flight.
+    """
+    def __init__(self, sftp_file, block_size=DEFAULT_READ_BLOCK_SIZE, window=DEFAULT_READ_AHEAD_WINDOW,
+                 start=0, end=None, reopen=None):
+        super().__init__()
+        self.sftp_file = sftp_file
+        self.reopen = reopen
+        self.failed = False
+        self.block_size = block_size
+        self.window = window
+        self.blocks = collections.deque()
+        # offset of the next byte to fetch and size of the file when it was first read
+        self.fetch_position = start
+        self.size = end
+        self.bounded = end is not None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self.blocks:
+            self.fill()
+            if not self.blocks:
+                return 0
+
+        block = self.blocks[0]
+        length = min(len(buffer), len(block))
+        buffer[:length] = block[:length]
+        if length == len(block):
+            self.blocks.popleft()
+        else:
+            self.blocks[0] = block[length:]
+        return length
+
+    def fill(self):
+        if self.reopen is None:
+            self.fetch()
+        else:
+            self.fetch_resuming()
+
+    @backoff.on_exception(backoff.expo,
+                          (OSError, EOFError, SSHException),
+                          giveup=lambda ex: not is_transient(ex),
+                          on_backoff=handle_backoff,
+                          max_tries=5,
+                          factor=2)
+    def fetch_resuming(self):
+        if self.failed:
+            try:
+                self.sftp_file.close()
+            except Exception: # pylint: disable=broad-except
+                pass
+            self.sftp_file = self.reopen()
+            self.failed = False
+        self.fetch()
+
+    def fetch(self):
+        if self.size is None:
+            self.size = self.sftp_file.stat().st_size
+
+        if self.fetch_position < self.size:
+            chunks = []
+            offset = self.fetch_position
+            while offset < self.size and len(chunks) < self.window:
+                length = min(self.block_size, self.size - offset)
+                chunks.append((offset, length))
+                offset += length
+
+            fetched = 0
+            for data in self.sftp_file.readv(chunks, max_concurrent_prefetch_requests=self.window):
+                if data:
+                    self.blocks.append(memoryview(data))
+                    fetched += len(data)
+                    # the blocks fetched before a failure are kept
+                    self.fetch_position += len(data)
+
+            if fetched < offset - chunks[0][0]:
+                # the file was truncated while being read, don't request past its end again
+                self.size = self.fetch_position
+                self.bounded = True
+        elif not self.bounded:
+            self.sftp_file.seek(self.fetch_position)
+            data = self.sftp_file.read(self.block_size)
+            if data:
+                self.blocks.append(memoryview(data))
+                self.fetch_position += len(data)
+
+    def iter_blocks(self):
+        """ Yields the blocks of the file as they are fetched. """
+        while True:
+            self.fill()
+            if not self.blocks:
+                return
+            while self.blocks:
+                yield self.blocks.popleft()
+
+    def close(self):
+        if not self.closed:
+            self.blocks.clear()
+            self.sftp_file.close()
+        super().close()
+
+class Segment():
+    """ A byte range of a file being downloaded into a local spool file. """
+    def __init__(self, start, end, spool_dir=None):
+        self.start = start
+        self.end = end
+        self.spool = tempfile.TemporaryFile(dir=spool_dir)
+        self.written = 0
+        self.read_position = 0
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+class SegmentedFile(io.RawIOBase):
+    """
+    Downloads "segments" byte ranges of a file from "start" concurrently, each over its
+    own channel of the connection's pool, spooling them to local temporary files that
+    are read back in order. A segment's spool file is removed once it has been read.
+
+    A segment waits for the reader once "spool_limit" of its bytes are spooled but not read,
+    holding its channel, so there have to be as many channels in the pool as segments.
+    """
+    def __init__(self, conn, filepath, size, segments, block_size=DEFAULT_READ_BLOCK_SIZE,
+                 window=DEFAULT_READ_AHEAD_WINDOW, spool_dir=None, start=0, spool_limit=DEFAULT_SEGMENT_SPOOL_LIMIT):
+        super().__init__()
+        self.conn = conn
+        self.filepath = filepath
+        self.block_size = block_size
+        self.window = window
+        self.spool_limit = spool_limit
+        self.stopped = False
+
+        segment_size = -(-(size - start) // segments)
+        self.segments = [Segment(offset, min(offset + segment_size, size), spool_dir)
+                         for offset in range(start, size, segment_size)]
+        # the last segment reads to the end of the file, including appended bytes
+        self.segments[-1].end = None
+        self.current = 0
+
+        for segment in self.segments:
+            threading.Thread(target=self.download, args=(segment,), daemon=True).start()
+
+    def download(self, segment):
+        try:
+            with self.conn.channel() as sftp:
+                raw = ReadAheadFile(sftp.open(self.filepath, 'rb'), self.block_size, self.window,
+                                    segment.start, segment.end, reopen=lambda: self.conn.reopen_file(self.filepath))
+                try:
+                    for block in raw.iter_blocks():
+                        with segment.condition:
+                            while segment.written - segment.read_position >= self.spool_limit and not self.stopped:
+                                segment.condition.wait()
+                            # checked under the condition, 'close' takes it to close the spool file
+                            if self.stopped:
+                                return
+                            # positional writes leave the spool file's offset to the reader
+                            os.pwrite(segment.spool.fileno(), block, segment.written)
+                            segment.written += len(block)
+                            segment.condition.notify_all()
+                finally:
+                    raw.close()
+        except Exception as ex: # pylint: disable=broad-except
+            segment.error = ex
+        finally:
+            with segment.condition:
+                segment.done = True
+                segment.condition.notify_all()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.current < len(self.segments):
+            segment = self.segments[self.current]
+            with segment.condition:
+                while segment.read_position >= segment.written and not segment.done:
+                    segment.condition.wait()
+
+            if segment.read_position < segment.written:
+                length = min(len(buffer), segment.written - segment.read_position)
+                data = os.pread(segment.spool.fileno(), length, segment.read_position)
+                buffer[:len(data)] = data
+                with segment.condition:
+                    segment.read_position += len(data)
+                    segment.condition.notify_all()
+                return len(data)
+
+            if segment.error is not None:
+                raise segment.error
+
+            segment.spool.close()
+            self.current += 1
+        return 0
+
+    def close(self):
+        if not self.closed:
+            self.stopped = True
+            for segment in self.segments:
+                # a download writing to the spool file holds the condition
+                with segment.condition:
+                    segment.condition.notify_all()
+                    segment.spool.close()
+        super().close()
+
+def open_read_ahead(sftp_file, block_size=DEFAULT_READ_BLOCK_SIZE, window=DEFAULT_READ_AHEAD_WINDOW, start=0,
+                    reopen=None):
+    """ Wraps an SFTPFile in a buffered file object reading ahead with pipelined requests from byte "start". """
+    return io.BufferedReader(ReadAheadFile(sftp_file, block_size, window, start, reopen=reopen),
+                             buffer_size=block_size)
+
+def open_segmented(conn, filepath, size, segments, block_size=DEFAULT_READ_BLOCK_SIZE,
+                   window=DEFAULT_READ_AHEAD_WINDOW, spool_dir=None, start=0, spool_limit=DEFAULT_SEGMENT_SPOOL_LIMIT):
+    """ Returns a buffered file object over a concurrent segmented download of the file from byte "start". """
+    return io.BufferedReader(SegmentedFile(conn, filepath, size, segments, block_size, window, spool_dir, start,
+                                           spool_limit),
+                             buffer_size=block_size)
@@ -0,0 +1,159 @@
+import io
+import select
+import shlex
+import socket
+import zlib
+from tap_sftp import reader
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# bytes received from the output of a command at once
+RECV_SIZE = 32 * 1024
+# trailing bytes of the standard error of a command kept to report its failure
+MAX_STDERR_SIZE = 4 * 1024
+# exit status of a shell that did not find the command
+COMMAND_NOT_FOUND = 127
+
+# commands compressing a file to their standard output, on the server, by compression. The
+# fastest levels are used as the server's CPU, rather than the ratio, usually limits them
+COMPRESS_COMMANDS = {
+    "gzip": "gzip -1 -c -- {}",
+    "zstd": "zstd -1 -q -c -- {}",
+}
+DEFAULT_COMPRESSION = "gzip"
+
+
+class CommandError(Exception):
+    """ Raised when a command run over an exec channel exits with a non-zero status. """
+    def __init__(self, command, status, stderr):
+        self.command = command
+        self.status = status
+        self.stderr = stderr.decode("utf-8", "replace").strip()
+        super().__init__("'{}' exited with status {}: {}".format(command, status, self.stderr))
+
+
+def iter_output(channel, command, timeout):
+    """
+    Yields the standard output of "command" running on the exec "channel" as it is received.
+    The standard error is read along with it, as the data of both shares the channel's window,
+    and reported by the CommandError raised if the command exits with a non-zero status.
+    """
+    stderr = b""
+    while True:
+        # the output is complete once the end of file is received, read it before the buffers
+        eof = channel.eof_received
+        if channel.recv_stderr_ready():
+            stderr = (stderr + channel.recv_stderr(RECV_SIZE))[-MAX_STDERR_SIZE:]
+        elif channel.recv_ready():
+            yield channel.recv(RECV_SIZE)
+        elif eof:
+            break
+        elif channel.closed:
+            raise EOFError("The channel running '{}' was closed".format(command))
+        elif not select.select([channel], [], [], timeout)[0]:
+            raise socket.timeout("Timed out waiting for the output of '{}'".format(command))
+
+    status = channel.recv_exit_status()
+    if status != 0:
+        raise CommandError(command, status, stderr)
+
+
+def get_listing_command(prefix):
+    """
+    Returns the 'find' command printing "<size> <mtime> <path relative to prefix>" for every
+    non-empty file beneath "prefix", ending each file with a NUL as paths may hold line breaks.
+    A "prefix" that is a symbolic link to a directory is followed, as SFTP's listing does.
+    """
+    return "find -H {} -type f ! -empty -printf '%s %T@ %P\\0'".format(shlex.quote(prefix))
+
+
+def iter_listing(chunks):
+    """
+    Parses the output of the listing command as its "chunks" are received.
+    -> yields (path relative to the prefix, size, mtime as an integer epoch) for every file
+    """
+    pending = b""
+    for chunk in chunks:
+        records = (pending + chunk).split(b"\0")
+        pending = records.pop()
+        for record in records:
+            size, mtime, path = record.split(b" ", 2)
+            # SFTP's version 3 attributes hold whole seconds
+            yield path.decode("utf-8"), int(size), int(float(mtime))
+
+    if pending:
+        raise Exception("Incomplete listing output: {!r}".format(pending[:100]))
+
+
+def get_compress_command(compression, filepath):
+    """ Returns the command writing the file compressed with "compression" to its standard output. """
+    return COMPRESS_COMMANDS[compression].format(shlex.quote(filepath))
+
+
+def get_decompressor(compression):
+    """ Returns a streaming decompressor of the output of the "compression" command. """
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj()
+    # a gzip header and trailer around the deflate stream
+    return zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+
+
+class DecompressingFile(io.RawIOBase):
+    """
+    Reads a file through the compressed output of a command run on the server over the exec
+    "channel", decompressing it as it is received.
+
+    "resume" is a function of the offset of the first byte not yet read and of the error,
+    returning the file opened over SFTP from that offset. The read continues from it when the
+    command fails or the connection or channel is lost, so a failure costs no bytes already read.
+    """
+    def __init__(self, channel, command, compression, timeout, resume):
+        super().__init__()
+        self.channel = channel
+        self.command = command
+        self.output = iter_output(channel, command, timeout)
+        self.decompressor = get_decompressor(compression)
+        self.resume = resume
+        self.resumed_file = None
+        self.data = memoryview(b"")
+        # offset of the next byte of the file to read
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.resumed_file is not None:
+            return self.resumed_file.readinto(buffer)
+
+        while not self.data:
+            try:
+                chunk = next(self.output, None)
+            except Exception as ex: # pylint: disable=broad-except
+                if not (isinstance(ex, CommandError) or reader.is_transient(ex)):
+                    raise
+                self.channel.close()
+                self.resumed_file = self.resume(self.position, ex)
+                return self.resumed_file.readinto(buffer)
+            if chunk is None:
+                if not self.decompressor.eof:
+                    raise Exception("The output of '{}' ended before the end of its compressed stream"
+                                    .format(self.command))
+                return 0
+            self.data = memoryview(self.decompressor.decompress(chunk))
+
+        length = min(len(buffer), len(self.data))
+        buffer[:length] = self.data[:length]
+        self.data = self.data[length:]
+        self.position += length
+        return length
+
+    def close(self):
+        if not self.closed:
+            self.channel.close()
+            if self.resumed_file is not None:
+                self.resumed_file.close()
+        super().close()
@@ -0,0 +1,168 @@
+import ast
+import operator
+
+# compiled filters by expression, a table's filter is compiled once per sync
+FILTERS = {}
+
+COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda value, values: value in values,
+    ast.NotIn: lambda value, values: value not in values,
+}
+
+
+class RowFilter():
+    """
+    A predicate on the raw string values of a CSV row, written as a Python expression:
+    column names, string, number and None literals, tuples or lists of literals, the
+    comparisons ==, !=, <, <=, >, >=, in and not in, and "and", "or" and "not", e.g.
+    "status != 'test' and region in ('EU', 'US')". Columns missing from a row are None.
+    A column compared with numbers is compared as a number, values that are not numbers
+    match neither "<" nor ">" nor "==". A column is in a set of strings and numbers if it is
+    one of its strings, or one of its numbers as a number. Columns not named like identifiers
+    are not supported.
+    """
+    def __init__(self, expression):
+        self.expression = expression
+        self.columns = set()
+        try:
+            tree = ast.parse(expression.strip(), mode="eval")
+        except SyntaxError as ex:
+            raise Exception("Invalid filter expression - {}: {}".format(expression, ex.msg)) from None
+        self.matches = self.compile(tree.body)
+
+    def unsupported(self, node):
+        return Exception("Unsupported filter expression - {}: '{}' is not supported"
+                         .format(self.expression, ast.unparse(node)))
+
+    def compile(self, node):
+        """ Returns a function of the row returning whether it matches the boolean expression "node". """
+        if isinstance(node, ast.BoolOp):
+            predicates = [self.compile(value) for value in node.values]
+            if isinstance(node.op, ast.And):
+                return lambda row: all(predicate(row) for predicate in predicates)
+            return lambda row: any(predicate(row) for predicate in predicates)
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            predicate = self.compile(node.operand)
+            return lambda row: not predicate(row)
+
+        if isinstance(node, ast.Compare):
+            # chained comparisons like "1 < amount <= 10" hold if each pair does
+            operands = [node.left] + node.comparators
+            predicates = [self.compile_comparison(operands[i], op, operands[i + 1])
+                          for i, op in enumerate(node.ops)]
+            if len(predicates) == 1:
+                return predicates[0]
+            return lambda row: all(predicate(row) for predicate in predicates)
+
+        raise self.unsupported(node)
+
+    def compile_comparison(self, left, op, right):
+        comparison = COMPARISONS.get(type(op))
+        if comparison is None:
+            raise self.unsupported(op)
+        if isinstance(op, (ast.In, ast.NotIn)) and is_mixed(right):
+            return self.compile_mixed_membership(left, op, get_literal(right))
+        numeric = is_numeric(left) or is_numeric(right)
+        get_left = self.compile_operand(left, numeric)
+        get_right = self.compile_operand(right, numeric)
+
+        def compare(row):
+            left_value, right_value = get_left(row), get_right(row)
+            if comparison in (operator.lt, operator.le, operator.gt, operator.ge) and \
+               (left_value is None or right_value is None):
+                return False
+            try:
+                return comparison(left_value, right_value)
+            except TypeError:
+                return False
+        return compare
+
+    def compile_mixed_membership(self, left, op, values):
+        """ Returns a function of the row returning whether "left" is in the set of strings and
+        numbers "values", comparing it with the numbers as a number. """
+        numbers = frozenset(value for value in values if is_number(value))
+        others = values - numbers
+        get_left = self.compile_operand(left, False)
+
+        def contains(row):
+            value = get_left(row)
+            return value in others or to_number(value) in numbers
+        if isinstance(op, ast.NotIn):
+            return lambda row: not contains(row)
+        return contains
+
+    def compile_operand(self, node, numeric):
+        """ Returns a function of the row returning the value of the column or literal "node",
+        converted to a number if it is compared with numbers. """
+        if isinstance(node, ast.Name):
+            column = node.id
+            self.columns.add(column)
+            if numeric:
+                return lambda row: to_number(row.get(column))
+            return lambda row: row.get(column)
+
+        value = get_literal(node)
+        if value is NotImplemented:
+            raise self.unsupported(node)
+        return lambda row: value
+
+
+def get_literal(node):
+    """ Returns the value of a literal or of a tuple or list of literals, or NotImplemented. """
+    if isinstance(node, ast.Constant) and (node.value is None or isinstance(node.value, (str, int, float))):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and \
+       isinstance(node.operand, ast.Constant) and isinstance(node.operand.value, (int, float)):
+        return -node.operand.value
+    if isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+        values = [get_literal(element) for element in node.elts]
+        if NotImplemented in values:
+            return NotImplemented
+        return frozenset(values)
+    return NotImplemented
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def is_numeric(node):
+    value = get_literal(node)
+    if isinstance(value, frozenset):
+        return any(is_number(element) for element in value)
+    return is_number(value)
+
+
+def is_mixed(node):
+    """ Returns whether "node" is a set of literals holding both strings and numbers. """
+    value = get_literal(node)
+    return isinstance(value, frozenset) and any(is_number(element) for element in value) and \
+        any(isinstance(element, str) for element in value)
+
+
+def to_number(value):
+    """ Returns the value of a column as a number, as the "integer" and "number" columns convert it, or None. """
+    if value is None:
+        return None
+    try:
+        return float(value.replace(",", ""))
+    except (AttributeError, ValueError):
+        return None
+
+
+def get_filter(table_spec):
+    """ Returns the compiled RowFilter of the table's "filter" expression, or None without one. """
+    expression = table_spec.get("filter")
+    if not expression or not expression.strip():
+        return None
+    row_filter = FILTERS.get(expression)
+    if row_filter is None:
+        row_filter = FILTERS[expression] = RowFilter(expression)
+    return row_filter
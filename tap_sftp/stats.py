@@ -7,10 +7,14 @@ STATS = {}
 #         'files': {
 #             '<filepath>': {
 #                 'row_count': 100,
+#                 'filtered_row_count': 20,
+#                 'skipped': False,
 #                 'last_modified': '10-03-2018T5:00:00'
 #             },
 #             'folder1/file_1.csv': {
 #                 'row_count': 50,
+#                 'filtered_row_count': 0,
+#                 'skipped': True,
 #                 'last_modified': '10-04-2018T8:00:00'
 #             }
 #         }
@@ -18,20 +22,24 @@ STATS = {}
 # }
 
 
-def add_file_data(table_spec, filepath, last_modified, row_count):
+def add_file_data(table_spec, filepath, last_modified, row_count, filtered_row_count=0, skipped=False):
     table_name = table_spec['table_name']
     global STATS
     if STATS.get(table_name):
         STATS[table_name]['files'][filepath] = {
             'last_modified': last_modified,
-            'row_count': row_count
+            'row_count': row_count,
+            'filtered_row_count': filtered_row_count,
+            'skipped': skipped
         }
     else:
         initialize_table_stats(table_spec)
 
         STATS[table_name]['files'][filepath] = {
             'last_modified': last_modified,
-            'row_count': row_count
+            'row_count': row_count,
+            'filtered_row_count': filtered_row_count,
+            'skipped': skipped
         }
 
 def initialize_table_stats(table_spec):
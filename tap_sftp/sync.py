@@ -1,18 +1,46 @@
+import hashlib
+import itertools
 import json
+import queue
 import socket
+import threading
 import backoff
 import codecs
 import singer
-from singer import metadata, utils, Transformer
+from concurrent import futures
+from singer import utils, Transformer
 from tap_sftp import client
+from tap_sftp import fingerprint
+from tap_sftp import row_filter
 from tap_sftp import stats
-from tap_sftp.helper import write_record
+from tap_sftp import transform
+from tap_sftp.helper import write_record, write_state
 from singer_encodings import csv
 
 LOGGER = singer.get_logger()
 DEFAULT_ENCODING_FORMAT = "utf-8"
+# files parsed at once by a stream
+DEFAULT_FILE_WORKERS = 1
+# records handed from a file worker to the writing thread at once
+RECORD_BATCH_SIZE = 500
+# batches a file worker parses ahead of the writing thread before waiting for it
+RECORD_QUEUE_SIZE = 20
+# files opened ahead of the one being synced
+DEFAULT_PREFETCH_FILES = 0
+# records written between checkpoints of the position in the file being synced, 0 disables them
+DEFAULT_FILE_CHECKPOINT_RECORDS = 0
+# files of these types are decompressed while read, positions in them are not byte offsets
+COMPRESSED_EXTENSIONS = ('.gz', '.zip')
+# bytes at the start of a file checked to be unchanged before only its appended rows are synced
+PREFIX_FINGERPRINT_SIZE = 64 * 1024
+# positions of files in append mode kept in the state of a table, those of the files synced
+# longest ago are dropped first, and such a file is synced again whole once appended to
+MAX_FILE_POSITIONS = 256
+# seconds after its last change during which a file in append mode may still be being written,
+# so an incomplete last line is left to the next sync instead of being synced cut off
+INCOMPLETE_LINE_GRACE_PERIOD = 300
 
-def sync_stream(config, state, stream):
+def sync_stream(config, state, stream, conn=None):
     table_name = stream.tap_stream_id
     modified_since = utils.strptime_to_utc(singer.get_bookmark(state, table_name, 'modified_since') or
                                            config['start_date'])
@@ -20,7 +48,8 @@ def sync_stream(config, state, stream):
     LOGGER.info('Syncing table "%s".', table_name)
     LOGGER.info('Getting files modified since %s.', modified_since)
 
-    conn = client.connection(config)
+    if conn is None:
+        conn = client.get_connection(config)
     table_spec = [c for c in json.loads(config["tables"]) if c["table_name"]==table_name]
     if len(table_spec) == 0:
         LOGGER.info("No table configuration found for '%s', skipping stream", table_name)
@@ -29,6 +58,8 @@ def sync_stream(config, state, stream):
         LOGGER.info("Multiple table configurations found for '%s', skipping stream", table_name)
         return 0
     table_spec = table_spec[0]
+    # an invalid filter expression fails the sync before any file is read
+    row_filter.get_filter(table_spec)
 
     files = conn.get_files(table_spec["search_prefix"],
                            table_spec["search_pattern"],
@@ -43,53 +74,464 @@ def sync_stream(config, state, stream):
     # Get the value of "encoding_format" from the configuration, defaulting to "DEFAULT_ENCODING_FORMAT"
     encoding_format = config.get("encoding_format") or DEFAULT_ENCODING_FORMAT
 
-    for f in files:
-        records_streamed += sync_file(conn, f, stream, table_spec, encoding_format)
+    # if value is 0, "0", "" or None then the position in a file is not checkpointed
+    checkpoints = FileCheckpoints(state, table_name,
+                                  int(config.get("file_checkpoint_records") or DEFAULT_FILE_CHECKPOINT_RECORDS),
+                                  append=bool(table_spec.get("append")))
+    fingerprints = fingerprint.FileFingerprints(state, table_name) if table_spec.get("skip_unchanged") else None
+
+    # if value is 0, "0", "" or None then sync the files one at a time
+    file_workers = int(config.get("file_workers") or DEFAULT_FILE_WORKERS)
+    prefetch_files = int(config.get("prefetch_files") or DEFAULT_PREFETCH_FILES)
+    if file_workers > 1:
+        synced_files = sync_files_concurrently(conn, files, stream, table_spec, encoding_format, file_workers,
+                                               checkpoints, fingerprints)
+    elif prefetch_files > 0:
+        synced_files = sync_files_prefetched(conn, files, stream, table_spec, encoding_format, prefetch_files,
+                                             checkpoints, fingerprints)
+    else:
+        synced_files = ((f, sync_file(conn, f, stream, table_spec, encoding_format,
+                                      checkpoints=checkpoints, fingerprints=fingerprints))
+                        for f in files)
+
+    # files are synced in increasing order of "last_modified", so the bookmark never passes an unsynced file
+    for f, records_synced in synced_files:
+        records_streamed += records_synced
+        checkpoints.clear()
         state = singer.write_bookmark(state, table_name, 'modified_since', f['last_modified'].isoformat())
-        singer.write_state(state)
+        write_state(state)
 
     LOGGER.info('Wrote %s records for table "%s".', records_streamed, table_name)
 
     return records_streamed
 
+class FileCheckpoints():
+    """
+    Bookmarks how far the sync got into the file being synced every "interval" records
+    as the "file_checkpoint" of the table: the file's path and last_modified, the number
+    of rows read and, for files that are not compressed, the byte offset of the next row.
+
+    A sync resuming from the checkpoint of an unchanged file reads it from the offset,
+    with the header read from the start of the file, or skips the rows already read of
+    compressed files.
+
+    For tables in "append" mode, the offset and rows of the last MAX_FILE_POSITIONS files
+    synced, with the fingerprint of their first bytes, are kept as the "file_positions" of
+    the table. A file modified since is read from its offset, as long as it did not shrink
+    and still starts with the same bytes, so only the rows appended to it are synced.
+    """
+    def __init__(self, state, table_name, interval=0, append=False):
+        self.state = state
+        self.table_name = table_name
+        self.interval = interval
+        self.resume = singer.get_bookmark(state, table_name, 'file_checkpoint')
+        self.append = append
+        self.positions = singer.get_bookmark(state, table_name, 'file_positions') or {}
+
+    def get_resume_position(self, f, conn=None):
+        """ Returns the checkpoint to resume the file from, if it is of this version of the file,
+        or else the position the file was synced up to in append mode, if only appended to since. """
+        checkpoint = self.resume
+        if checkpoint and checkpoint.get('filepath') == f['filepath'] \
+           and checkpoint.get('last_modified') == f['last_modified'].isoformat():
+            return checkpoint
+
+        position = self.positions.get(f['filepath']) if self.append else None
+        if position and conn is not None and self.is_appended(conn, f, position):
+            return position
+        return None
+
+    def is_appended(self, conn, f, position):
+        """ Returns whether the file still starts with the bytes it had when synced up to "position". """
+        size = conn.sftp.stat(f['filepath']).st_size
+        if size < position['offset']:
+            LOGGER.warning('File "%s" was truncated since it was synced, syncing it from the start.', f['filepath'])
+            return False
+        with conn.sftp.open(f['filepath'], 'rb') as file_handle:
+            prefix = file_handle.read(position['prefix_size'])
+        if hashlib.sha256(prefix).hexdigest() != position['prefix_sha256']:
+            LOGGER.warning('File "%s" was rewritten since it was synced, syncing it from the start.', f['filepath'])
+            return False
+        return True
+
+    def is_due(self, records_synced, records_written=1):
+        """ Returns whether writing the last "records_written" records completed an interval. """
+        return bool(self.interval) and \
+            records_synced // self.interval > (records_synced - records_written) // self.interval
+
+    def write(self, f, position, resume=None):
+        """ Writes a state with a checkpoint at the "rows" and "offset" of "position". In append
+        mode, the checkpoint keeps the fingerprint of the start of the file, read already or of
+        the checkpoint "resume" the file was resumed from, so it is kept once the file is synced. """
+        checkpoint = {'filepath': f['filepath'],
+                      'last_modified': f['last_modified'].isoformat(),
+                      'rows': position['rows'],
+                      'offset': position.get('offset')}
+        prefix = position.get('fingerprint') or resume
+        if self.append and prefix and 'prefix_sha256' in prefix:
+            checkpoint['prefix_size'] = prefix['prefix_size']
+            checkpoint['prefix_sha256'] = prefix['prefix_sha256']
+        singer.write_bookmark(self.state, self.table_name, 'file_checkpoint', checkpoint)
+        write_state(self.state)
+
+    def finish(self, f, counts, resume=None):
+        """ Keeps the position the file was synced up to in append mode, for files that are not compressed. """
+        if not self.append or counts.get('offset') is None:
+            return
+        # a resumed file keeps the fingerprint of the start of the file
+        prefix = counts.get('fingerprint') or resume
+        if not prefix or 'prefix_sha256' not in prefix:
+            return
+        # the most recently synced file last
+        self.positions.pop(f['filepath'], None)
+        self.positions[f['filepath']] = {'offset': counts['offset'],
+                                         'rows': counts['rows'],
+                                         'prefix_size': prefix['prefix_size'],
+                                         'prefix_sha256': prefix['prefix_sha256']}
+        for filepath in list(self.positions)[:-MAX_FILE_POSITIONS]:
+            del self.positions[filepath]
+        singer.write_bookmark(self.state, self.table_name, 'file_positions', self.positions)
+
+    def clear(self):
+        """ Removes the checkpoint once its file is synced. """
+        self.state.get('bookmarks', {}).get(self.table_name, {}).pop('file_checkpoint', None)
+        self.resume = None
+
+class PrefetchedFile():
+    """ Opens a file over a channel of the pool in the background and reads its first
+    window ahead, holding the channel until the file is released. """
+    def __init__(self, conn, f):
+        self.conn = conn
+        self.f = f
+        self.opened = futures.Future()
+        self.released = threading.Event()
+        self.taken = False
+        threading.Thread(target=self.prefetch, daemon=True).start()
+
+    def prefetch(self):
+        try:
+            with self.conn.channel():
+                file_handle = self.conn.get_file_handle(self.f)
+                # zip archives are handed out unbuffered, there is nothing to warm for them. The
+                # handle is handed over once warm, buffered files are not safe to share between threads
+                if hasattr(file_handle, 'peek'):
+                    file_handle.peek(1)
+                self.opened.set_result(file_handle)
+                self.released.wait()
+                if not self.taken:
+                    file_handle.close()
+        except Exception as ex: # pylint: disable=broad-except
+            if not self.opened.done():
+                self.opened.set_exception(ex)
+
+    def get_file_handle(self, f):
+        """ Returns the prefetched handle, raising the error opening it failed with, the first time.
+        Retries of the file open it again over the calling thread's channel. """
+        if self.taken:
+            return self.conn.get_file_handle(f)
+        self.taken = True
+        return self.opened.result()
+
+    def release(self):
+        self.released.set()
+
+def sync_files_prefetched(conn, files, stream, table_spec, encoding_format, prefetch_files, checkpoints=None,
+                          fingerprints=None):
+    """ Syncs the files one at a time while the next "prefetch_files" files are opened
+    and their first window read in the background.
+    -> yields each file with its number of records once they are all written """
+    # the file being synced and those opened ahead each hold a channel until they are synced, so with
+    # fewer channels the file synced first could wait for a channel held by the files after it
+    if prefetch_files + 1 > conn.pooled_channels:
+        LOGGER.warning('Opening %s files ahead rather than %s, as many as the channels of the pool allow.',
+                       conn.pooled_channels - 1, prefetch_files)
+        prefetch_files = conn.pooled_channels - 1
+
+    pending = []
+    files = iter(files)
+
+    def prefetch_next():
+        f = next(files, None)
+        if f is not None:
+            pending.append(PrefetchedFile(conn, f))
+
+    try:
+        for _ in range(prefetch_files + 1):
+            prefetch_next()
+
+        while pending:
+            prefetched = pending[0]
+            try:
+                records_synced = sync_file(conn, prefetched.f, stream, table_spec, encoding_format,
+                                           prefetched.get_file_handle, checkpoints, fingerprints)
+            finally:
+                pending.pop(0).release()
+            prefetch_next()
+            yield prefetched.f, records_synced
+    finally:
+        for prefetched in pending:
+            prefetched.release()
+
+def sync_files_concurrently(conn, files, stream, table_spec, encoding_format, file_workers, checkpoints=None,
+                            fingerprints=None):
+    """ Parses up to "file_workers" files at once, each over its own channel of the pool, while
+    their records are written one file at a time in the order of "files".
+    -> yields each file with its number of records once they are all written """
+    # a worker holds its channel until the records of its file are written, so with more workers
+    # than channels the first file's worker could wait for a channel held by the files after it
+    if file_workers > conn.pooled_channels:
+        LOGGER.warning('Parsing %s files at once rather than %s, as many as the channels of the pool.',
+                       conn.pooled_channels, file_workers)
+        file_workers = conn.pooled_channels
+
+    cancelled = threading.Event()
+    pending = []
+    files = iter(files)
+
+    with futures.ThreadPoolExecutor(max_workers=file_workers) as executor:
+        def submit_next():
+            f = next(files, None)
+            if f is not None:
+                records_queue = queue.Queue(RECORD_QUEUE_SIZE)
+                counts = {"filtered": 0}
+                resume = checkpoints.get_resume_position(f, conn) if checkpoints else None
+                future = executor.submit(read_file, conn, f, stream, table_spec,
+                                         encoding_format, records_queue, cancelled, counts, resume, fingerprints)
+                pending.append((f, records_queue, future, counts, resume))
+
+        try:
+            for _ in range(file_workers):
+                submit_next()
+
+            while pending:
+                f, records_queue, future, counts, resume = pending.pop(0)
+                records_synced = 0
+                for batch, position in iter(records_queue.get, None):
+                    for record in batch:
+                        write_record(stream.tap_stream_id, record, ensure_ascii=False)
+                    records_synced += len(batch)
+                    if checkpoints and checkpoints.is_due(records_synced, len(batch)):
+                        checkpoints.write(f, position, resume)
+
+                # raises the error the file failed with, if any
+                if future.result():
+                    if counts.get("skipped"):
+                        stats.add_file_data(table_spec, f['filepath'], f['last_modified'], 0, skipped=True)
+                    else:
+                        stats.add_file_data(table_spec, f['filepath'], f['last_modified'], records_synced,
+                                            counts["filtered"])
+                        if checkpoints:
+                            checkpoints.finish(f, counts, resume)
+                        if fingerprints and counts.get("fingerprint_of_content"):
+                            fingerprints.add(counts["fingerprint_of_content"])
+                submit_next()
+                yield f, records_synced
+        finally:
+            # stop the workers still parsing files whose records will not be written
+            cancelled.set()
+
+def put_batch(records_queue, batch, cancelled):
+    """ Waits for room in "records_queue" for "batch", unless the sync is cancelled. """
+    while not cancelled.is_set():
+        try:
+            records_queue.put(batch, timeout=1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def read_file(conn, f, stream, table_spec, encoding_format, records_queue, cancelled, counts, resume=None,
+              fingerprints=None):
+    """ Puts batches of the records of the file with the position in the file after them on
+    "records_queue", followed by None, and the number of rows the table's filter left out
+    in "counts".
+    -> returns whether the file could be read """
+    try:
+        # the worker's own channel serves every request made while parsing the file
+        with conn.channel():
+            return read_file_batches(conn, f, stream, table_spec, encoding_format, records_queue, cancelled,
+                                     counts, resume, fingerprints)
+    finally:
+        put_batch(records_queue, None, cancelled)
+
 # retry 5 times for timeout error
 @backoff.on_exception(backoff.expo,
                       (socket.timeout),
                       max_tries=5,
                       factor=2)
-def sync_file(conn, f, stream, table_spec, encoding_format):
+def read_file_batches(conn, f, stream, table_spec, encoding_format, records_queue, cancelled, counts,
+                      resume=None, fingerprints=None):
     LOGGER.info('Syncing file "%s".', f["filepath"])
 
+    if fingerprints:
+        counts["fingerprint_of_content"] = get_content_fingerprint(conn, f, fingerprints)
+        if fingerprints.is_synced(counts["fingerprint_of_content"]):
+            LOGGER.info('Skipping file "%s" as a file with the same content was synced.', f["filepath"])
+            counts["skipped"] = True
+            return True
+
+    offset = get_resume_offset(f, resume)
     try:
-        file_handle = conn.get_file_handle(f)
+        file_handle = conn.get_file_handle(f, offset)
     except OSError:
+        return False
+
+    batch = []
+    counts["filtered"] = 0
+    for record in get_file_records(conn, f, file_handle, stream, table_spec, encoding_format, counts, resume):
+        batch.append(record)
+        if len(batch) >= RECORD_BATCH_SIZE:
+            if not put_batch(records_queue, (batch, dict(counts)), cancelled):
+                break
+            batch = []
+    if batch:
+        put_batch(records_queue, (batch, dict(counts)), cancelled)
+    return True
+
+# retry 5 times for timeout error
+@backoff.on_exception(backoff.expo,
+                      (socket.timeout),
+                      max_tries=5,
+                      factor=2)
+def sync_file(conn, f, stream, table_spec, encoding_format, get_file_handle=None, checkpoints=None,
+              fingerprints=None):
+    LOGGER.info('Syncing file "%s".', f["filepath"])
+
+    if fingerprints:
+        fingerprint_of_content = get_content_fingerprint(conn, f, fingerprints)
+        if fingerprints.is_synced(fingerprint_of_content):
+            LOGGER.info('Skipping file "%s" as a file with the same content was synced.', f["filepath"])
+            stats.add_file_data(table_spec, f['filepath'], f['last_modified'], 0, skipped=True)
+            return 0
+
+    resume = checkpoints.get_resume_position(f, conn) if checkpoints else None
+    offset = get_resume_offset(f, resume)
+    try:
+        if offset:
+            # a prefetched handle reads from the start, the file is opened again at the offset
+            file_handle = conn.get_file_handle(f, offset)
+        else:
+            file_handle = (get_file_handle or conn.get_file_handle)(f)
+    except OSError:
+        return 0
+
+    records_synced = 0
+    counts = {"filtered": 0}
+    for record in get_file_records(conn, f, file_handle, stream, table_spec, encoding_format, counts, resume):
+        write_record(stream.tap_stream_id, record, ensure_ascii=False)
+        records_synced += 1
+        if checkpoints and checkpoints.is_due(records_synced):
+            checkpoints.write(f, counts, resume)
+
+    stats.add_file_data(table_spec, f['filepath'], f['last_modified'], records_synced, counts["filtered"])
+    if checkpoints:
+        checkpoints.finish(f, counts, resume)
+    if fingerprints and fingerprint_of_content:
+        fingerprints.add(fingerprint_of_content)
+
+    return records_synced
+
+def get_content_fingerprint(conn, f, fingerprints):
+    """ Returns the fingerprint of the content of the file, or None if it cannot be read. """
+    try:
+        return fingerprints.get_fingerprint(conn, f)
+    except OSError:
+        # opening the file to sync it reports and skips the files that cannot be read
+        return None
+
+def get_resume_offset(f, resume):
+    """ Returns the byte offset to open the file at to resume it from the checkpoint "resume". """
+    if resume is None or f['filepath'].endswith(COMPRESSED_EXTENSIONS):
         return 0
+    return resume.get('offset') or 0
+
+def may_be_growing(f):
+    """ Returns whether the file changed within the last INCOMPLETE_LINE_GRACE_PERIOD seconds. """
+    return (utils.now() - f['last_modified']).total_seconds() < INCOMPLETE_LINE_GRACE_PERIOD
+
+def count_bytes(file_handle, counts, offset, append=False, hold_incomplete=False):
+    """ Yields the lines of the file, keeping the offset of the byte after them in counts["offset"].
+    In "append" mode, a file read from the start gets the fingerprint of its first bytes. With
+    "hold_incomplete", a last line without a line break is left to a later sync, as it may still
+    be being written. """
+    counts["offset"] = offset
+    digest = hashlib.sha256() if append and offset == 0 else None
+    for line in file_handle:
+        if hold_incomplete and not line.endswith(b"\n"):
+            LOGGER.info("Leaving the incomplete last line of the file to the next sync.")
+            return
+        if digest is not None and counts["offset"] < PREFIX_FINGERPRINT_SIZE:
+            prefix = line[:PREFIX_FINGERPRINT_SIZE - counts["offset"]]
+            digest.update(prefix)
+            counts["fingerprint"] = {"prefix_size": counts["offset"] + len(prefix),
+                                     "prefix_sha256": digest.hexdigest()}
+        counts["offset"] += len(line)
+        yield line
+
+def read_header_lines(conn, f, opts, encoding_format):
+    """ Returns the lines of the file making up its header row, checking it has the key properties. """
+    header_lines = []
+    with conn.sftp.open(f["filepath"], 'rb') as header_handle:
+        def collect_lines():
+            for line in header_handle:
+                header_lines.append(line)
+                yield line
+        # the csv reader reads the lines of the header row only
+        csv.get_row_iterator(collect_lines(), options=opts, encoding_format=encoding_format).fieldnames # pylint: disable=expression-not-assigned
+    return header_lines
 
+def get_file_records(conn, f, file_handle, stream, table_spec, encoding_format, counts=None, resume=None):
+    """ Yields the transformed records of the rows of the open file matching the table's
+    filter, counting the other rows in counts["filtered"], and closes the file once read.
+    The number of rows read and the offset of the next one in files that are not compressed
+    are kept in counts["rows"] and counts["offset"]. A file resumed from the checkpoint
+    "resume" is open at its offset, or its rows already read are skipped. """
     # Add file_name to opts and flag infer_compression to support gzipped files
     opts = {'key_properties': table_spec['key_properties'],
             'delimiter': table_spec['delimiter'],
             'file_name': f['filepath']}
 
-    readers = csv.get_row_iterators(file_handle, options=opts, infer_compression=True, encoding_format=encoding_format, conn=conn)
+    offset = get_resume_offset(f, resume)
+    # rows read before the file was opened, and rows to read again without syncing them
+    rows_read = resume['rows'] if offset else 0
+    rows_skipped = resume['rows'] if resume and not offset else 0
 
-    records_synced = 0
-
-    for reader in readers:
-        with Transformer() as transformer:
-            for row in reader:
-                custom_columns = {
-                    '_sdc_source_file': f["filepath"],
-
-                    # index zero, +1 for header row
-                    '_sdc_source_lineno': records_synced + 2
-                }
-                rec = {**row, **custom_columns}
+    lines = file_handle
+    if counts is not None and not f['filepath'].endswith(COMPRESSED_EXTENSIONS):
+        append = bool(table_spec.get('append'))
+        lines = count_bytes(file_handle, counts, offset, append, append and may_be_growing(f))
+        counts["rows"] = rows_read
+    if offset:
+        LOGGER.info('Resuming file "%s" at byte %s, after %s rows.', f["filepath"], offset, rows_read)
+        lines = itertools.chain(read_header_lines(conn, f, opts, encoding_format), lines)
+    elif rows_skipped:
+        LOGGER.info('Resuming file "%s" after %s rows.', f["filepath"], rows_skipped)
 
-                to_write = transformer.transform(rec, stream.schema.to_dict(), metadata.to_map(stream.metadata))
+    readers = csv.get_row_iterators(lines, options=opts, infer_compression=True, encoding_format=encoding_format, conn=conn)
 
-                write_record(stream.tap_stream_id, to_write, ensure_ascii=False)
-                records_synced += 1
+    rows_filtered = 0
+    table_filter = row_filter.get_filter(table_spec)
 
-    stats.add_file_data(table_spec, f['filepath'], f['last_modified'], records_synced)
-
-    return records_synced
+    try:
+        for reader in readers:
+            record_transformer = transform.get_record_transformer(stream)
+            with Transformer() as transformer:
+                # the columns that are not selected are left out of the rows, unless the filter needs them
+                keep = table_filter.columns if table_filter else ()
+                for row in record_transformer.project(reader, transformer, keep):
+                    rows_read += 1
+                    if rows_read <= rows_skipped:
+                        continue
+                    if counts is not None:
+                        counts["rows"] = rows_read
+                    # the filter sees the raw values, before they are transformed
+                    if table_filter is not None and not table_filter.matches(row):
+                        rows_filtered += 1
+                        if counts is not None:
+                            counts["filtered"] = rows_filtered
+                        continue
+                    # index zero, +1 for header row
+                    yield record_transformer.transform(transformer, row, f["filepath"], rows_read + 1)
+    finally:
+        # release the remote handle and its read-ahead buffers
+        file_handle.close()
@@ -0,0 +1,306 @@
+import copy
+import re
+import pytz
+from datetime import datetime
+from singer import metadata
+from singer.transform import breadcrumb_path
+from singer.utils import strftime, strptime_to_utc
+
+# ISO 8601 dates and date-times that 'datetime.fromisoformat' parses as 'dateutil' does
+ISO_DATETIME = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}"
+                          r"(?:[T ][0-9]{2}:[0-9]{2}(?::[0-9]{2}(?:\.[0-9]{1,6})?)?(?:Z|[+-][0-9]{2}:?[0-9]{2})?)?")
+
+SDC_SOURCE_FILE_COLUMN = "_sdc_source_file"
+SDC_SOURCE_LINENO_COLUMN = "_sdc_source_lineno"
+
+# compiled transformers of the streams being synced: tap_stream_id -> (stream, RecordTransformer)
+RECORD_TRANSFORMERS = {}
+
+def get_record_transformer(stream):
+    """ Returns the RecordTransformer of the stream, compiling it on first use. """
+    cached = RECORD_TRANSFORMERS.get(stream.tap_stream_id)
+    if cached is None or cached[0] is not stream:
+        cached = (stream, RecordTransformer(stream.schema.to_dict(), metadata.to_map(stream.metadata)))
+        RECORD_TRANSFORMERS[stream.tap_stream_id] = cached
+    return cached[1]
+
+def is_flat_object_schema(schema):
+    """ Returns whether the schema is an object with properties, as discovered for CSV files. """
+    return (schema.get("type") in ("object", ["object"])
+            and bool(schema.get("properties"))
+            and "anyOf" not in schema
+            and "patternProperties" not in schema)
+
+class Mismatch(Exception):
+    """ Raised by a coercer when the value does not match its schema, the next type may still match. """
+
+class Fallback(Exception):
+    """ Raised by a coercer when the value has to go through the generic Transformer. """
+
+def coerce_null(value):
+    if value is None or value == "":
+        return None
+    raise Mismatch()
+
+def coerce_string(value):
+    if type(value) is str: # pylint: disable=unidiomatic-typecheck
+        return value
+    if value is None:
+        raise Mismatch()
+    return str(value)
+
+def coerce_integer(value):
+    try:
+        if isinstance(value, str):
+            return int(value.replace(",", ""))
+        return int(value)
+    except (TypeError, ValueError):
+        raise Mismatch() from None
+
+def coerce_number(value):
+    try:
+        if isinstance(value, str):
+            return float(value.replace(",", ""))
+        return float(value)
+    except (TypeError, ValueError):
+        raise Mismatch() from None
+
+def coerce_datetime(value):
+    if value is None or value == "":
+        raise Mismatch()
+    if isinstance(value, str) and ISO_DATETIME.fullmatch(value):
+        try:
+            if value.endswith("Z"):
+                parsed = datetime.fromisoformat(value[:-1] + "+00:00")
+            else:
+                parsed = datetime.fromisoformat(value)
+            if parsed.tzinfo is None:
+                return strftime(parsed.replace(tzinfo=pytz.UTC))
+            return strftime(parsed.astimezone(tz=pytz.UTC))
+        except ValueError:
+            pass
+    try:
+        return strftime(strptime_to_utc(value))
+    except Exception: # pylint: disable=broad-except
+        # the Transformer logs the values it fails to parse
+        raise Fallback() from None
+
+TYPE_COERCERS = {
+    "null": coerce_null,
+    "string": coerce_string,
+    "integer": coerce_integer,
+    "number": coerce_number,
+}
+
+def compile_coercer(schema):
+    """
+    Returns a function converting a value as singer's Transformer converts it for the
+    schema, raising Mismatch or Fallback when it cannot, or None for schemas it does not
+    handle: objects, "singer.decimal" numbers and types other than null, string, integer,
+    number and array.
+    """
+    if "anyOf" in schema:
+        return combine_coercers([compile_coercer(sub_schema) for sub_schema in schema["anyOf"]])
+
+    if "type" not in schema:
+        return lambda value: value
+
+    types = schema["type"]
+    if not isinstance(types, list):
+        types = [types]
+    # the Transformer tries "null" last
+    if "null" in types:
+        types = [typ for typ in types if typ != "null"] + ["null"]
+
+    coercers = []
+    for typ in types:
+        if typ == "null":
+            coercers.append(coerce_null)
+        elif schema.get("format") == "date-time":
+            coercers.append(coerce_datetime)
+        elif schema.get("format") == "singer.decimal":
+            return None
+        elif typ == "array" and "items" in schema:
+            coercers.append(compile_array_coercer(schema["items"]))
+        else:
+            coercers.append(TYPE_COERCERS.get(typ))
+    return combine_coercers(coercers)
+
+def compile_array_coercer(items_schema):
+    coerce_item = compile_coercer(items_schema)
+    if coerce_item is None:
+        return None
+
+    def coerce(value):
+        if not isinstance(value, list):
+            raise Mismatch()
+        return [coerce_item(item) for item in value]
+    return coerce
+
+def combine_coercers(coercers):
+    """ Returns a coercer returning the value of the first of "coercers" the value matches. """
+    if None in coercers:
+        return None
+    if len(coercers) == 1:
+        return coercers[0]
+
+    def coerce(value):
+        for coercer in coercers:
+            try:
+                return coercer(value)
+            except Mismatch:
+                pass
+        raise Mismatch()
+    return coerce
+
+class RecordTransformer():
+    """
+    Transforms rows into records with the same output as singer's Transformer given the
+    row with the "_sdc_source_file" and "_sdc_source_lineno" columns, the schema and the
+    metadata map. What only depends on the schema and the metadata, which columns are
+    filtered out or not in the schema and how the values of the others are converted,
+    is worked out once per column instead of once per row.
+
+    Values are converted by coercers compiled from the column's schema, values they
+    cannot convert and columns they do not handle go through the Transformer.
+    """
+    def __init__(self, schema, mdata):
+        self.schema = schema
+        # the Transformer reorders the types of the schemas it goes through
+        self.original_schema = copy.deepcopy(schema)
+        self.mdata = mdata
+        self.compiled = is_flat_object_schema(schema)
+        self.properties = schema.get("properties") or {}
+        # column name -> function(transformer, record, value) returning whether it succeeded
+        self.columns = {}
+
+    def is_filtered(self, key):
+        """ Returns whether the Transformer filters the column out by its metadata. """
+        breadcrumb = ('properties', key)
+        inclusion = metadata.get(self.mdata, breadcrumb, 'inclusion')
+        selected = metadata.get(self.mdata, breadcrumb, 'selected')
+        return inclusion != 'automatic' and (selected is False or inclusion == 'unsupported')
+
+    def plan_column(self, key):
+        breadcrumb = ('properties', key)
+        inclusion = metadata.get(self.mdata, breadcrumb, 'inclusion')
+
+        if self.is_filtered(key):
+            filtered_path = breadcrumb_path(breadcrumb)
+            def convert(transformer, record, value):
+                transformer.filtered.add(filtered_path)
+                return True
+        elif key not in self.properties:
+            def convert(transformer, record, value):
+                transformer.removed.add(key)
+                return True
+        else:
+            sub_schema = self.properties[key]
+            path = [key]
+            # selected values nested in lists or objects are filtered by their own metadata
+            filter_nested = inclusion != 'automatic' and bool(self.mdata)
+            mdata = self.mdata
+            coerce = compile_coercer(sub_schema)
+            if coerce is None:
+                def convert(transformer, record, value):
+                    if filter_nested and isinstance(value, (dict, list)):
+                        value = transformer.filter_data_by_metadata(value, mdata, breadcrumb)
+                    success, record[key] = transformer.transform_recur(value, sub_schema, path)
+                    return success
+            else:
+                def convert(transformer, record, value):
+                    if filter_nested and isinstance(value, (dict, list)):
+                        value = transformer.filter_data_by_metadata(value, mdata, breadcrumb)
+                    try:
+                        record[key] = coerce(value)
+                        return True
+                    except (Mismatch, Fallback):
+                        # the Transformer reports the error, or logs the value it could not parse
+                        success, record[key] = transformer.transform_recur(value, sub_schema, path)
+                        return success
+
+        self.columns[key] = convert
+        return convert
+
+    def project(self, reader, transformer, keep=()):
+        """ Yields the rows of the csv.DictReader "reader" as it does, without the columns the
+        Transformer would filter out, other than those in "keep", which are never turned into
+        dict entries. Their paths are added to the filtered paths of the Transformer
+        "transformer" as it would add them. """
+        fieldnames = reader.fieldnames
+        if not self.compiled or fieldnames is None:
+            yield from reader
+            return
+
+        # the value of a repeated column is the one of its last occurrence, in the position of its first
+        indexes = {}
+        for index, name in enumerate(fieldnames):
+            indexes[name] = index
+        columns = [(name, index) for name, index in indexes.items() if name in keep or not self.is_filtered(name)]
+        filtered_paths = {breadcrumb_path(('properties', name)) for name in indexes
+                          if name not in keep and self.is_filtered(name)}
+        restkey = reader.restkey
+        keep_rest = not self.is_filtered(restkey)
+        if not filtered_paths and keep_rest:
+            yield from reader
+            return
+
+        restval = reader.restval
+        width = len(fieldnames)
+        for row in reader.reader:
+            if not row:
+                continue
+            if filtered_paths:
+                transformer.filtered.update(filtered_paths)
+                filtered_paths = None
+
+            if len(row) == width:
+                yield {name: row[index] for name, index in columns}
+                continue
+
+            # short rows are padded with "restval", the values past the header go to "restkey"
+            length = len(row)
+            projected = {name: row[index] if index < length else restval for name, index in columns}
+            if length > width:
+                if keep_rest:
+                    projected[restkey] = row[width:]
+                else:
+                    transformer.filtered.add(breadcrumb_path(('properties', restkey)))
+            yield projected
+
+    def transform(self, transformer, row, source_file, source_lineno):
+        """ Transforms the row read from line "source_lineno" of "source_file" with
+        the singer Transformer "transformer", collecting its filtered and removed paths.
+        -> raises singer's SchemaMismatch if a value does not match its schema """
+        if not self.compiled:
+            record = {**row, SDC_SOURCE_FILE_COLUMN: source_file, SDC_SOURCE_LINENO_COLUMN: source_lineno}
+            return transformer.transform(record, self.schema, self.mdata)
+
+        # the source columns take the place of columns of the file with the same name
+        if SDC_SOURCE_FILE_COLUMN in row or SDC_SOURCE_LINENO_COLUMN in row:
+            row = {**row, SDC_SOURCE_FILE_COLUMN: source_file, SDC_SOURCE_LINENO_COLUMN: source_lineno}
+            source_columns = False
+        else:
+            source_columns = True
+
+        columns = self.columns
+        errors = len(transformer.errors)
+        record = {}
+        success = True
+        for key, value in row.items():
+            convert = columns.get(key) or self.plan_column(key)
+            success = convert(transformer, record, value) and success
+
+        if source_columns:
+            convert = columns.get(SDC_SOURCE_FILE_COLUMN) or self.plan_column(SDC_SOURCE_FILE_COLUMN)
+            success = convert(transformer, record, source_file) and success
+            convert = columns.get(SDC_SOURCE_LINENO_COLUMN) or self.plan_column(SDC_SOURCE_LINENO_COLUMN)
+            success = convert(transformer, record, source_lineno) and success
+
+        if not success:
+            # the record is transformed again as a whole for the Transformer to report the
+            # errors against the schema as it reports them for a schema of its own
+            del transformer.errors[errors:]
+            record = {**row, SDC_SOURCE_FILE_COLUMN: source_file, SDC_SOURCE_LINENO_COLUMN: source_lineno}
+            return transformer.transform(record, copy.deepcopy(self.original_schema), self.mdata)
+        return record
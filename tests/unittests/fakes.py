@@ -0,0 +1,242 @@
+"""
+Stand-ins for the SFTP server, channels and connections shared by the unit tests.
+"""
+import collections
+import contextlib
+import io
+import json
+import random
+import stat
+import threading
+import time
+from unittest import mock
+from datetime import datetime, timedelta
+import pytz
+from singer import metadata
+from singer.catalog import CatalogEntry
+from singer.schema import Schema
+import tap_sftp.sync as sync
+
+LAST_MODIFIED = datetime(2024, 1, 1, tzinfo=pytz.UTC)
+
+
+def get_attr(name, is_directory, size=10, mtime=100):
+    """ Returns the SFTPAttributes of a listed file or directory. """
+    attr = mock.Mock()
+    attr.filename = name
+    attr.st_mode = stat.S_IFDIR if is_directory else stat.S_IFREG
+    attr.st_size = size
+    attr.st_mtime = mtime
+    return attr
+
+
+def get_listdir_attr(tree):
+    """
+    Returns a stand-in for SFTPClient.listdir_attr serving "tree", a dict of directory path ->
+    [(name, is_directory, size, mtime)]. Size and mtime may be left out, the files are then
+    10 bytes and modified at 100 plus their index in the directory.
+    """
+    def listdir_attr(path):
+        if path not in tree:
+            raise FileNotFoundError(path)
+        return [get_attr(*entry) if len(entry) == 4 else get_attr(*entry, mtime=100 + index)
+                for index, entry in enumerate(tree[path])]
+    return listdir_attr
+
+
+def get_mocked_channel(tree=None):
+    """ Returns a stand-in for SFTPClient.from_transport opening channels, serving "tree" if given. """
+    def mocked_channel(*args, **kwargs):
+        sftp = mock.Mock()
+        if tree is not None:
+            sftp.listdir_attr.side_effect = get_listdir_attr(tree)
+        sftp.get_channel.return_value.closed = False
+        return sftp
+    return mocked_channel
+
+
+class FakeChannel():
+    """
+    Stand-in for a paramiko Channel on which a command already completed, or was cut off if
+    not "complete". Its output is received in chunks of "chunk_size" bytes.
+    """
+    def __init__(self, stdout=b"", stderr=b"", status=0, complete=True, chunk_size=1000):
+        self.stdout = [stdout[i:i + chunk_size] for i in range(0, len(stdout), chunk_size)]
+        self.stderr = [stderr] if stderr else []
+        self.status = status
+        self.eof_received = complete
+        self.closed = not complete
+        self.exec_command = mock.Mock()
+        self.settimeout = mock.Mock()
+        self.close = mock.Mock()
+
+    def recv_ready(self):
+        return bool(self.stdout)
+
+    def recv(self, size):
+        return self.stdout.pop(0)
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr)
+
+    def recv_stderr(self, size):
+        return self.stderr.pop(0)
+
+    def recv_exit_status(self):
+        return self.status
+
+
+class FakeSFTPFile():
+    """
+    In-memory stand-in for paramiko's SFTPFile counting the 'readv' round trips. Bytes
+    appended to its "data" are read as bytes appended to the remote file.
+    """
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+        self.readv_calls = []
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+    def stat(self):
+        return mock.Mock(st_size=len(self.data))
+
+    def readv(self, chunks, max_concurrent_prefetch_requests=None):
+        self.readv_calls.append(chunks)
+        for offset, length in chunks:
+            yield self.data[offset:offset + length]
+
+    def seek(self, position):
+        self.position = position
+
+    def read(self, size=-1):
+        end = len(self.data) if size < 0 else self.position + size
+        data = self.data[self.position:end]
+        self.position += len(data)
+        return data
+
+    def readline(self):
+        end = self.data.find(b"\n", self.position)
+        return self.read(-1 if end == -1 else end + 1 - self.position)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection():
+    """
+    Stand-in for SFTPConnection serving "files", a dict of path -> content, from any byte offset.
+    The files are modified at LAST_MODIFIED unless "last_modified" gives their dates by path.
+    Opening the "unreadable" ones raises PermissionError, and the "failing" ones ValueError, after
+    a random delay of up to "delay" seconds.
+    """
+    def __init__(self, files, last_modified=None, unreadable=(), failing=(), delay=0):
+        self.files = files
+        self.last_modified = last_modified or {}
+        self.unreadable = unreadable
+        self.failing = failing
+        self.delay = delay
+        self.opened = []
+        # the FakeSFTPFiles opened over the connection or its channels
+        self.opened_files = []
+        self.offsets = []
+        self.opened_in_background = []
+        self.channels_in_use = 0
+        self.pooled_channels = 8
+        self.sftp = mock.Mock()
+        self.sftp.open.side_effect = self.open
+        self.sftp.stat.side_effect = lambda filepath: mock.Mock(st_size=len(self.files[filepath]))
+
+    def open(self, filepath, mode):
+        self.opened_files.append(FakeSFTPFile(self.files[filepath]))
+        return self.opened_files[-1]
+
+    def write(self, filepath, data):
+        """ Writes the file as an upload would, modifying it an hour after the last file. """
+        self.last_modified[filepath] = max([LAST_MODIFIED, *self.last_modified.values()]) + timedelta(hours=1)
+        self.files[filepath] = data
+
+    def get_files(self, prefix, search_pattern, modified_since=None):
+        files = [{"filepath": filepath, "last_modified": self.last_modified.get(filepath, LAST_MODIFIED)}
+                 for filepath in self.files]
+        return [f for f in files if modified_since is None or f["last_modified"] > modified_since]
+
+    @contextlib.contextmanager
+    def channel(self):
+        self.channels_in_use += 1
+        sftp = mock.Mock()
+        sftp.open.side_effect = self.open
+        try:
+            yield sftp
+        finally:
+            self.channels_in_use -= 1
+
+    def get_file_handle(self, f, offset=0):
+        self.opened.append(f["filepath"])
+        self.offsets.append(offset)
+        self.opened_in_background.append(threading.current_thread() is not threading.main_thread())
+        if self.delay:
+            time.sleep(random.random() * self.delay)
+        if f["filepath"] in self.unreadable:
+            raise PermissionError("Permission denied")
+        if f["filepath"] in self.failing:
+            raise ValueError("Unexpected file content")
+        return io.BufferedReader(io.BytesIO(self.files[f["filepath"]][offset:]))
+
+
+# what a sync wrote: its records, its states as they were when written and the calls to add_file_data
+SyncOutput = collections.namedtuple("SyncOutput", ["records", "states", "stats"])
+
+
+def sync_stream(conn, state=None, config=None, output=None):
+    """
+    Syncs the "table" stream of "config", CONFIG by default, over the connection from a copy
+    of "state", collecting what it wrote instead of writing it into "output", or a new
+    SyncOutput, which is returned. Passing "output" keeps what a failing sync wrote.
+    """
+    output = output or SyncOutput([], [], [])
+    with mock.patch("tap_sftp.sync.write_record",
+                    side_effect=lambda stream, record, **kwargs: output.records.append(record)), \
+         mock.patch("tap_sftp.sync.write_state",
+                    side_effect=lambda value: output.states.append(json.loads(json.dumps(value)))), \
+         mock.patch("tap_sftp.stats.add_file_data",
+                    side_effect=lambda *args, **kwargs: output.stats.append(mock.call(*args, **kwargs))):
+        # the state is updated in place
+        sync.sync_stream(config or CONFIG, json.loads(json.dumps(state or {})), get_stream(), conn)
+    return output
+
+
+def get_stream():
+    """ Returns the catalog entry of the "table" stream, of CSV files with an id and a name. """
+    schema = {"type": "object", "properties": {"id": {"type": ["null", "integer"]},
+                                               "name": {"type": ["null", "string"]},
+                                               "_sdc_source_file": {"type": "string"},
+                                               "_sdc_source_lineno": {"type": "integer"}}}
+    mdata = metadata.get_standard_metadata(schema=schema, key_properties=["id"])
+    return CatalogEntry(tap_stream_id="table", stream="table", schema=Schema.from_dict(schema), metadata=mdata)
+
+
+def get_config(table_spec=None, **config):
+    """ Returns the config of the "table" stream syncing the CSV files of /root, with "table_spec"'s settings. """
+    table_spec = {"table_name": "table", "search_prefix": "/root", "search_pattern": "csv",
+                  "key_properties": ["id"], "delimiter": ",", **(table_spec or {})}
+    return {"start_date": "2020-01-01T00:00:00Z", "tables": json.dumps([table_spec]), **config}
+
+
+CONFIG = get_config()
+
+# connection settings of the unit tests building SFTPConnections
+CONNECTION_CONFIG = {
+    "host": "10.0.0.1",
+    "port": 22,
+    "username": "username",
+    "password": "password",
+}
@@ -0,0 +1,90 @@
+import decimal
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from io import StringIO
+from unittest import mock
+from tap_sftp import batch
+from tap_sftp import helper
+
+class TestBatchMessages(unittest.TestCase):
+    """
+        Test cases to verify records are written to batch files announced by BATCH messages
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def sync(self, batch_config, writer_queue_size=None):
+        """ Writes 25 records with a state after the 20th and returns the messages written to stdout. """
+        with mock.patch("sys.stdout", new_callable=StringIO) as mocked_stdout:
+            with mock.patch("tap_sftp.helper.WRITER", helper.MessageWriter()):
+                helper.configure_writer({"batch_config": json.dumps(batch_config),
+                                         "writer_queue_size": writer_queue_size})
+                helper.write_schema("table", {"type": "object"}, ["id"])
+                for i in range(25):
+                    helper.write_record("table", {"id": i, "name": "ü", "amount": decimal.Decimal("1.10")},
+                                        ensure_ascii=False)
+                    if i == 19:
+                        helper.write_state({"bookmarks": {"table": {"modified_since": "2024-01-01"}}})
+                helper.close_writer()
+            return [json.loads(line) for line in mocked_stdout.getvalue().splitlines()]
+
+    def read_batch(self, message):
+        path = message["manifest"][0][len("file://"):]
+        with gzip.open(path, "rt", encoding="utf-8") as batch_file:
+            return [line.rstrip("\n") for line in batch_file]
+
+    def test_records_are_written_to_batches(self):
+        """
+            Test case to verify the records are split into batches, closed before the state message
+        """
+        messages = self.sync({"encoding": {"format": "jsonl", "compression": "gzip"},
+                              "storage": {"root": "file://" + self.root, "prefix": "sync-"},
+                              "batch_size": 8})
+
+        self.assertEqual([message["type"] for message in messages],
+                         ["SCHEMA", "BATCH", "BATCH", "BATCH", "STATE", "BATCH"])
+        batches = [self.read_batch(message) for message in messages if message["type"] == "BATCH"]
+        self.assertEqual([len(records) for records in batches], [8, 8, 4, 5])
+        self.assertEqual(batches[0][1], '{"id": 1, "name": "ü", "amount": 1.10}')
+        self.assertEqual(messages[1]["encoding"], {"format": "jsonl", "compression": "gzip"})
+        self.assertTrue(os.path.basename(messages[1]["manifest"][0]).startswith("sync-table-"))
+
+    def test_batches_with_writer_thread(self):
+        """
+            Test case to verify batches are written in the same order by the writer thread
+        """
+        batch_config = {"storage": {"root": self.root}, "batch_size": 8}
+
+        messages = self.sync(batch_config, writer_queue_size=2)
+
+        self.assertEqual([message["type"] for message in messages],
+                         ["SCHEMA", "BATCH", "BATCH", "BATCH", "STATE", "BATCH"])
+
+    def test_unsupported_batch_config(self):
+        """
+            Test case to verify unsupported formats and unavailable compressions are reported
+        """
+        with self.assertRaises(Exception) as context:
+            batch.BatchMessageWriter(helper.MessageWriter(), {"encoding": {"format": "parquet"}})
+        self.assertIn("Unsupported batch format", str(context.exception))
+
+        if batch.zstandard is None:
+            with self.assertRaises(Exception) as context:
+                batch.BatchMessageWriter(helper.MessageWriter(), {"encoding": {"compression": "zstd"}})
+            self.assertIn("zstandard", str(context.exception))
+
+    def test_batch_config_is_optional(self):
+        """
+            Test case to verify records are written as RECORD messages without "batch_config"
+        """
+        self.assertIsNone(batch.get_batch_config({}))
+        self.assertIsNone(batch.get_batch_config({"batch_config": ""}))
+        self.assertEqual(batch.get_batch_config({"batch_config": '{"batch_size": 10}'}), {"batch_size": 10})
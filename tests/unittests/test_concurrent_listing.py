@@ -0,0 +1,80 @@
+import unittest
+from unittest import mock
+import tap_sftp.client as client
+import fakes
+
+# directory tree served by the mocked SFTP channels: path -> [(name, is_directory, size, mtime)]
+TREE = {
+    "/root": [("file1.csv", False, 10, 100), ("2024", True, 0, 0), ("2023", True, 0, 0)],
+    "/root/2024": [("01", True, 0, 0), ("02", True, 0, 0), ("file2.csv", False, 10, 200)],
+    "/root/2024/01": [("file3.csv", False, 10, 300), ("empty.csv", False, 0, 300)],
+    "/root/2024/02": [("file4.csv", False, 10, 400)],
+    "/root/2023": [("file5.csv", False, 10, 500)],
+}
+
+@mock.patch("paramiko.SFTPClient.from_transport", side_effect=fakes.get_mocked_channel(TREE))
+@mock.patch("tap_sftp.client.SFTPConnection.sftp")
+class TestConcurrentListing(unittest.TestCase):
+    """
+        Test cases to verify the concurrent directory walk returns the same files as the serial walk
+    """
+
+    def get_connection(self, listing_concurrency):
+        conn = client.connection({"host": "10.0.0.1",
+                                  "port": 22,
+                                  "username": "username",
+                                  "password": "",
+                                  "listing_concurrency": listing_concurrency})
+        conn.transport = mock.Mock()
+        return conn
+
+    def test_concurrent_walk_matches_serial_walk(self, mocked_sftp, mocked_from_transport):
+        """
+            Test case to verify the concurrent walk finds every non-empty file of the tree
+        """
+        mocked_sftp.listdir_attr.side_effect = fakes.get_listdir_attr(TREE)
+
+        serial_files = self.get_connection(1).get_files_by_prefix("/root")
+        concurrent_files = self.get_connection(4).get_files_by_prefix("/root")
+
+        expected_files = ["/root/2023/file5.csv", "/root/2024/01/file3.csv", "/root/2024/02/file4.csv",
+                          "/root/2024/file2.csv", "/root/file1.csv"]
+        self.assertEqual(expected_files, sorted(f["filepath"] for f in serial_files))
+        self.assertEqual(sorted(serial_files, key=lambda f: f["filepath"]),
+                         sorted(concurrent_files, key=lambda f: f["filepath"]))
+
+    def test_serial_walk_does_not_open_channels(self, mocked_sftp, mocked_from_transport):
+        """
+            Test case to verify the default walk lists every directory over the main channel
+        """
+        mocked_sftp.listdir_attr.side_effect = fakes.get_listdir_attr(TREE)
+
+        self.get_connection(None).get_files_by_prefix("/root")
+
+        self.assertEqual(mocked_from_transport.call_count, 0)
+        self.assertEqual(mocked_sftp.listdir_attr.call_count, len(TREE))
+
+    def test_concurrent_walk_channels_are_pooled(self, mocked_sftp, mocked_from_transport):
+        """
+            Test case to verify the worker channels stay in the pool until the connection is closed
+        """
+        mocked_sftp.listdir_attr.side_effect = fakes.get_listdir_attr(TREE)
+        channels = []
+        def open_channel(*args, **kwargs):
+            channels.append(fakes.get_mocked_channel(TREE)())
+            return channels[-1]
+        mocked_from_transport.side_effect = open_channel
+
+        conn = self.get_connection(4)
+        conn.get_files_by_prefix("/root")
+        conn.get_files_by_prefix("/root")
+
+        # at most one channel per worker, reused by the second walk
+        self.assertGreater(len(channels), 0)
+        self.assertLessEqual(len(channels), 4)
+        for channel in channels:
+            channel.close.assert_not_called()
+
+        conn.close()
+        for channel in channels:
+            channel.close.assert_called_once()
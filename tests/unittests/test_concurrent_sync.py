@@ -0,0 +1,175 @@
+import threading
+import time
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+import pytz
+import tap_sftp.client as client
+import tap_sftp.sync as sync
+import fakes
+from fakes import CONFIG, FakeConnection, SyncOutput, sync_stream
+
+FILES = [{"filepath": "/root/file{}.csv".format(i),
+          "last_modified": datetime(2024, 1, 1, tzinfo=pytz.UTC) + timedelta(hours=i)} for i in range(8)]
+
+def get_connection(**kwargs):
+    """ Returns a connection serving FILES, 1200 rows each, after a random delay. """
+    files = {f["filepath"]: ("id,name\n" + "".join("{},{}\n".format(i, f["filepath"]) for i in range(1200))).encode()
+             for f in FILES}
+    return FakeConnection(files, {f["filepath"]: f["last_modified"] for f in FILES}, delay=0.01, **kwargs)
+
+class TestConcurrentSync(unittest.TestCase):
+    """
+        Test cases to verify files parsed concurrently are written and bookmarked in order
+    """
+
+    def sync(self, conn, file_workers, output=None):
+        return sync_stream(conn, config={**CONFIG, "file_workers": file_workers}, output=output)
+
+    def test_records_are_written_in_file_order(self):
+        """
+            Test case to verify the concurrent sync writes the same records in the same order as the serial sync
+        """
+        serial = self.sync(get_connection(), 1)
+        self.assertEqual(len(serial.records), 8 * 1200)
+
+        concurrent = self.sync(get_connection(), 4)
+
+        self.assertEqual(concurrent.records, serial.records)
+        self.assertEqual(concurrent.states, serial.states)
+        self.assertEqual([c.args[1] for c in serial.stats + concurrent.stats], [f["filepath"] for f in FILES] * 2)
+
+    def test_bookmark_stops_before_failed_file(self):
+        """
+            Test case to verify the bookmark is not advanced past a file that failed, even if later files were parsed
+        """
+        conn = get_connection(failing=["/root/file3.csv"])
+        output = SyncOutput([], [], [])
+
+        with self.assertRaises(ValueError):
+            self.sync(conn, 4, output)
+
+        self.assertEqual([state["bookmarks"]["table"]["modified_since"] for state in output.states],
+                         [f["last_modified"].isoformat() for f in FILES[:3]])
+        self.assertEqual(len(output.records), 3 * 1200)
+        self.assertEqual(conn.channels_in_use, 0)
+
+    def test_unreadable_file_is_skipped(self):
+        """
+            Test case to verify a file without read permission is skipped without stats, like the serial sync does
+        """
+        conn = get_connection(unreadable=["/root/file2.csv"])
+
+        output = self.sync(conn, 3)
+
+        self.assertEqual(len(output.records), 7 * 1200)
+        self.assertNotIn("/root/file2.csv", [c.args[1] for c in output.stats])
+        self.assertEqual(len(output.states), 8)
+
+    @mock.patch("tap_sftp.sync.RECORD_QUEUE_SIZE", 1)
+    @mock.patch("paramiko.SFTPClient.from_transport", side_effect=fakes.get_mocked_channel())
+    @mock.patch("tap_sftp.client.SFTPConnection.sftp")
+    def test_workers_outnumbering_channels(self, mocked_sftp, mocked_from_transport):
+        """
+            Test case to verify the first file gets a channel when the workers outnumber the channels of the pool
+        """
+        fake = get_connection()
+        conn = client.connection({**fakes.CONNECTION_CONFIG, "max_sftp_channels": 3})
+        conn.transport = mock.Mock()
+        conn.get_files = fake.get_files
+        conn.get_file_handle = fake.get_file_handle
+        read_file = sync.read_file
+        def read_file_late(conn, f, *args):
+            # the first file's worker asks for a channel after the others did
+            if f["filepath"] == FILES[0]["filepath"]:
+                time.sleep(0.2)
+            return read_file(conn, f, *args)
+
+        output = SyncOutput([], [], [])
+
+        # the sync runs in a thread so a deadlock fails the test rather than hanging it
+        with mock.patch("tap_sftp.sync.read_file", side_effect=read_file_late):
+            thread = threading.Thread(target=self.sync, args=(conn, 4, output), daemon=True)
+            thread.start()
+            thread.join(30)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(output.records), 8 * 1200)
+        self.assertEqual(mocked_from_transport.call_count, 2)
+
+class TestPrefetchedSync(unittest.TestCase):
+    """
+        Test cases to verify files opened ahead in the background are synced like the serial sync does
+    """
+
+    def test_records_are_written_in_file_order(self):
+        """
+            Test case to verify every file is opened in the background and the records are written in order
+        """
+        serial = sync_stream(get_connection())
+        conn = get_connection()
+
+        output = sync_stream(conn, config={**CONFIG, "prefetch_files": 2})
+
+        self.assertEqual(len(output.records), 8 * 1200)
+        self.assertEqual(output.records, serial.records)
+        self.assertEqual(conn.opened_in_background, [True] * 8)
+        self.assertEqual(conn.channels_in_use, 0)
+
+    def test_unreadable_file_is_skipped(self):
+        """
+            Test case to verify a file that could not be opened in the background is skipped
+        """
+        conn = get_connection(unreadable=["/root/file2.csv"])
+
+        output = sync_stream(conn, config={**CONFIG, "prefetch_files": 1})
+
+        self.assertEqual(len(output.records), 7 * 1200)
+        self.assertNotIn("/root/file2.csv", [c.args[1] for c in output.stats])
+        self.assertEqual(len(output.states), 8)
+
+    def test_channels_are_released_on_error(self):
+        """
+            Test case to verify the files opened ahead release their channels when the sync fails
+        """
+        conn = get_connection(failing=["/root/file1.csv"])
+
+        with self.assertRaises(ValueError):
+            sync_stream(conn, config={**CONFIG, "prefetch_files": 2})
+
+        for _ in range(100):
+            if not conn.channels_in_use:
+                break
+            time.sleep(0.01)
+        self.assertEqual(conn.channels_in_use, 0)
+
+    @mock.patch("paramiko.SFTPClient.from_transport", side_effect=fakes.get_mocked_channel())
+    @mock.patch("tap_sftp.client.SFTPConnection.sftp")
+    def test_files_ahead_outnumbering_channels(self, mocked_sftp, mocked_from_transport):
+        """
+            Test case to verify the file synced first gets a channel when more files are opened ahead than the pool has channels
+        """
+        fake = get_connection()
+        conn = client.connection({**fakes.CONNECTION_CONFIG, "max_sftp_channels": 3})
+        conn.transport = mock.Mock()
+        conn.get_files = fake.get_files
+        conn.get_file_handle = fake.get_file_handle
+        prefetch = sync.PrefetchedFile.prefetch
+        def prefetch_late(prefetched):
+            # the first file's thread asks for a channel after the others did
+            if prefetched.f["filepath"] == FILES[0]["filepath"]:
+                time.sleep(0.2)
+            prefetch(prefetched)
+
+        output = SyncOutput([], [], [])
+
+        # the sync runs in a thread so a deadlock fails the test rather than hanging it
+        with mock.patch("tap_sftp.sync.PrefetchedFile.prefetch", prefetch_late):
+            config = {**CONFIG, "prefetch_files": 4}
+            thread = threading.Thread(target=sync_stream, args=(conn, None, config, output), daemon=True)
+            thread.start()
+            thread.join(30)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(output.records), 8 * 1200)
+        self.assertEqual(mocked_from_transport.call_count, 2)
@@ -0,0 +1,104 @@
+import threading
+import time
+import unittest
+from unittest import mock
+from paramiko.ssh_exception import AuthenticationException
+import tap_sftp.client as client
+import fakes
+
+CONFIG = fakes.CONNECTION_CONFIG
+
+class TestConnectionPool(unittest.TestCase):
+    """
+        Test cases to verify the run-wide connections and their channel pool
+    """
+
+    def tearDown(self):
+        client.close_connections()
+
+    def test_connection_is_shared_per_settings(self):
+        """
+            Test case to verify the same connection is returned for the same connection settings
+        """
+        conn = client.get_connection(CONFIG)
+
+        self.assertIs(conn, client.get_connection({**CONFIG, "tables": "[]"}))
+        self.assertIsNot(conn, client.get_connection({**CONFIG, "host": "10.0.0.2"}))
+
+    def test_close_connections(self):
+        """
+            Test case to verify every shared connection is closed and forgotten
+        """
+        conns = [client.get_connection(CONFIG), client.get_connection({**CONFIG, "host": "10.0.0.2"})]
+        for conn in conns:
+            conn.close = mock.Mock()
+
+        client.close_connections()
+
+        for conn in conns:
+            conn.close.assert_called_once()
+        self.assertIsNot(conns[0], client.get_connection(CONFIG))
+
+    @mock.patch("paramiko.SFTPClient.from_transport", side_effect=fakes.get_mocked_channel())
+    @mock.patch("tap_sftp.client.SFTPConnection.sftp")
+    def test_channels_are_bounded(self, mocked_sftp, mocked_from_transport):
+        """
+            Test case to verify no more than 'max_sftp_channels' channels are open, including the main one
+        """
+        conn = client.connection({**CONFIG, "max_sftp_channels": 3})
+        conn.transport = mock.Mock()
+        in_use = []
+        max_in_use = []
+        lock = threading.Lock()
+
+        def work():
+            with conn.channel() as sftp:
+                with lock:
+                    in_use.append(sftp)
+                    max_in_use.append(len(in_use))
+                time.sleep(0.01)
+                with lock:
+                    in_use.remove(sftp)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(mocked_from_transport.call_count, 2)
+        self.assertEqual(max(max_in_use), 2)
+
+    @mock.patch("paramiko.SFTPClient.from_transport", side_effect=fakes.get_mocked_channel())
+    @mock.patch("tap_sftp.client.SFTPConnection._SFTPConnection__try_connect")
+    def test_sftp_returns_checked_out_channel(self, mocked_try_connect, mocked_from_transport):
+        """
+            Test case to verify 'sftp' returns the channel checked out by the calling thread
+        """
+        conn = client.connection(CONFIG)
+        conn.transport = mock.Mock()
+        main_sftp = conn.sftp = mock.Mock()
+
+        with conn.channel() as sftp:
+            self.assertIs(conn.sftp, sftp)
+        self.assertIs(conn.sftp, main_sftp)
+
+    @mock.patch("paramiko.SFTPClient.from_transport", side_effect=fakes.get_mocked_channel())
+    @mock.patch("paramiko.Transport")
+    def test_rejected_key_is_not_retried_on_reconnect(self, mocked_transport, mocked_from_transport):
+        """
+            Test case to verify a private key rejected by the server is skipped by later connects
+        """
+        def connect(username, password, hostkey, pkey):
+            if pkey is not None:
+                raise AuthenticationException()
+        mocked_transport.return_value.connect.side_effect = connect
+
+        conn = client.connection(CONFIG)
+        conn.key = mock.Mock()
+        conn.sftp # pylint: disable=pointless-statement
+        self.assertEqual(mocked_transport.call_count, 2)
+
+        conn.close()
+        conn.sftp # pylint: disable=pointless-statement
+        self.assertEqual(mocked_transport.call_count, 3)
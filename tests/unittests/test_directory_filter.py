@@ -0,0 +1,105 @@
+import unittest
+from unittest import mock
+from parameterized import parameterized
+import tap_sftp.client as client
+from tap_sftp import pattern
+import fakes
+
+# directory tree served by the mocked SFTP channel: path -> [(name, is_directory)]
+TREE = {
+    "/root": [("file1.csv", False), ("2024", True), ("2023", True)],
+    "/root/2024": [("01", True), ("02", True), ("archive", True), ("file2.csv", False)],
+    "/root/2024/01": [("file3.csv", False)],
+    "/root/2024/02": [("file4.csv", False)],
+    "/root/2024/archive": [("file6.csv", False)],
+    "/root/2023": [("file5.csv", False)],
+}
+
+class TestDirectoryFilter(unittest.TestCase):
+    """
+        Test cases to verify which directories are pruned for a search pattern
+    """
+
+    @parameterized.expand([
+        ["file[0-9].csv"],
+        ["exports/2024/.*\\.csv"],
+        ["^/root/2024/file.csv|^/root/2023"],
+        ["^.*/2024/"],
+    ])
+    def test_patterns_without_pruning(self, search_pattern):
+        """
+            Test case to verify unanchored patterns and patterns whose first segment
+            may span directories do not prune anything
+        """
+        self.assertIsNone(pattern.get_directory_filter(search_pattern))
+
+    @parameterized.expand([
+        ["^/root/?2024/"],
+        ["^/root(?=/2024)/"],
+        ["^/root/(2024/01)"],
+        ["^/root/[^a]+/"],
+    ])
+    def test_analysis_stops_at_ambiguous_segment(self, search_pattern):
+        """
+            Test case to verify the segments following an optional separator, a lookaround,
+            a group spanning directories or a class matching '/' are not used for pruning
+        """
+        directory_filter = pattern.get_directory_filter(search_pattern)
+        self.assertTrue(directory_filter("/root/other"))
+        self.assertTrue(directory_filter("/root/2024/other"))
+        self.assertFalse(directory_filter("root/2024"))
+
+    @parameterized.expand([
+        ["^/root/a\\057b/c"],
+        ["^/root/a\\x2fb/c"],
+        ["^/root/a\\u002fb/c"],
+        ["^/root/a\\U0000002fb/c"],
+        ["^/root/a\\N{SOLIDUS}b/c"],
+    ])
+    def test_escaped_separator(self, search_pattern):
+        """
+            Test case to verify an octal, hex or named escape of '/' is read whole and ends the analysis
+        """
+        directory_filter = pattern.get_directory_filter(search_pattern)
+        self.assertTrue(directory_filter("/root/a"))
+        self.assertTrue(directory_filter("/root/a/b"))
+        self.assertFalse(directory_filter("/other"))
+
+    @parameterized.expand([
+        ["^/root/2024/.*\\.csv", "/root/2024/01", True],
+        ["^/root/2024/.*\\.csv", "/root/2023", False],
+        ["^/root/2024/.*\\.csv", "/root/20240", False],
+        ["^/root/20(23|24)/0[1-3]/", "/root/2023/03", True],
+        ["^/root/20(23|24)/0[1-3]/", "/root/2024/04", False],
+        ["^/root/20(?:23|24)/", "/root/2022", False],
+        ["^/root/\\d{4}/", "/root/2024", True],
+        ["^/root/\\d{4}/", "/root/archive", False],
+        ["\\A\\/root\\/2024\\/", "/root/2023", False],
+        ["^/root/2024/(\\d+)/\\1", "/root/2024/01/01", True],
+        ["^/root/2024/(\\d+)/\\1", "/root/2023", False],
+        ["^/root/\\x32024/", "/root/2024", True],
+        ["^/root/\\x32024/", "/root/2023", False],
+        ["^/root/\\u0032024/", "/root/2023", False],
+        ["^/root/\\0622024/", "/root/2023", False],
+    ])
+    def test_anchored_patterns(self, search_pattern, directory, expected):
+        """
+            Test case to verify anchored patterns only keep directories whose
+            leading path segments can match
+        """
+        directory_filter = pattern.get_directory_filter(search_pattern)
+        self.assertEqual(directory_filter(directory), expected)
+
+    @mock.patch("tap_sftp.client.SFTPConnection.sftp")
+    def test_get_files_skips_pruned_directories(self, mocked_sftp):
+        """
+            Test case to verify 'get_files' does not list the directories the pattern can't match
+        """
+        mocked_sftp.listdir_attr.side_effect = fakes.get_listdir_attr(TREE)
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22")
+
+        files = conn.get_files("/root", "^/root/2024/0[1-9]/.*\\.csv")
+
+        self.assertEqual(["/root/2024/01/file3.csv", "/root/2024/02/file4.csv"], [f["filepath"] for f in files])
+        listed_directories = sorted(c.args[0] for c in mocked_sftp.listdir_attr.call_args_list)
+        self.assertEqual(["/root", "/root/2024", "/root/2024/01", "/root/2024/02"], listed_directories)
@@ -0,0 +1,80 @@
+import unittest
+from unittest import mock
+from paramiko.ssh_exception import SSHException
+import tap_sftp.client as client
+import fakes
+
+# directory tree served by the mocked SFTP channel: path -> [(name, is_directory, size, mtime)]
+TREE = {
+    "/root": [("file1.csv", False, 10, 100), ("2024", True, 0, 0), ("other", True, 0, 0)],
+    "/root/2024": [("file 2\n.csv", False, 20, 200)],
+    "/root/other": [("file3.csv", False, 30, 300)],
+}
+
+# output of 'find' for the tree, received in chunks of 7 bytes splitting the entries
+FIND_OUTPUT = b"10 100.25 file1.csv\x0020 200.0 2024/file 2\n.csv\x0030 300.5 other/file3.csv\x00"
+
+@mock.patch("tap_sftp.client.SFTPConnection.sftp")
+class TestExecListing(unittest.TestCase):
+    """
+        Test cases to verify files are listed with a single command run over an exec channel
+    """
+
+    def get_connection(self, *channels):
+        conn = client.connection({"host": "10.0.0.1",
+                                  "port": 22,
+                                  "username": "username",
+                                  "password": "",
+                                  "listing_backend": "exec"})
+        conn.transport = mock.Mock()
+        conn.transport.open_session.side_effect = channels
+        return conn
+
+    def test_exec_listing_matches_walk(self, mocked_sftp):
+        """
+            Test case to verify the command's output gives the files of the walk, with paths holding spaces and line breaks
+        """
+        mocked_sftp.listdir_attr.side_effect = fakes.get_listdir_attr(TREE)
+        channel = fakes.FakeChannel(FIND_OUTPUT, chunk_size=7)
+        conn = self.get_connection(channel, fakes.FakeChannel(FIND_OUTPUT, chunk_size=7))
+
+        files = conn.get_files_by_prefix("/root")
+        filtered_files = conn.get_files_by_prefix("/root", lambda directory: directory != "/root/other")
+
+        self.assertEqual(mocked_sftp.listdir_attr.call_count, 0)
+        self.assertEqual(files, client.connection({"host": "10.0.0.1", "port": 22, "username": "username"})
+                         .get_files_by_prefix("/root"))
+        self.assertEqual([f["filepath"] for f in filtered_files], ["/root/file1.csv", "/root/2024/file 2\n.csv"])
+        channel.exec_command.assert_called_once_with("find -H /root -type f ! -empty -printf '%s %T@ %P\\0'")
+        channel.close.assert_called_once()
+
+    def test_refused_exec_falls_back_to_sftp(self, mocked_sftp):
+        """
+            Test case to verify the directories are walked over SFTP once the server refused to run commands
+        """
+        mocked_sftp.listdir_attr.side_effect = fakes.get_listdir_attr(TREE)
+        channel = fakes.FakeChannel()
+        channel.exec_command.side_effect = SSHException("Channel closed.")
+        conn = self.get_connection(channel)
+
+        self.assertEqual(len(conn.get_files_by_prefix("/root")), 3)
+        self.assertEqual(len(conn.get_files_by_prefix("/root")), 3)
+
+        self.assertEqual(conn.transport.open_session.call_count, 1)
+        self.assertEqual(mocked_sftp.listdir_attr.call_count, 2 * len(TREE))
+        channel.close.assert_called_once()
+
+    def test_failed_command(self, mocked_sftp):
+        """
+            Test case to verify a command failing before any file falls back to the walk and after one is reported
+        """
+        mocked_sftp.listdir_attr.side_effect = fakes.get_listdir_attr(TREE)
+        conn = self.get_connection(fakes.FakeChannel(stderr=b"find: unknown predicate '-printf'", status=1),
+                                   fakes.FakeChannel(FIND_OUTPUT, b"find: '/root/private': Permission denied", 1,
+                                                     chunk_size=7))
+
+        self.assertEqual(len(conn.get_files_by_prefix("/root")), 3)
+        with self.assertRaises(Exception) as context:
+            conn.get_files_by_prefix("/root")
+
+        self.assertIn("Permission denied", str(context.exception))
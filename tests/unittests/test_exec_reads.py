@@ -0,0 +1,95 @@
+import gzip
+import io
+import unittest
+from unittest import mock
+import tap_sftp.client as client
+from tap_sftp import remote_exec
+import fakes
+
+DATA = b"id,name\n" + b"".join(b"%d,name %d\n" % (i, i) for i in range(5000))
+
+@mock.patch("tap_sftp.client.SFTPConnection.restore_channel")
+@mock.patch("tap_sftp.client.SFTPConnection.open_over_sftp",
+            side_effect=lambda f, offset=0: io.BufferedReader(io.BytesIO(DATA[offset:])))
+@mock.patch("tap_sftp.client.SFTPConnection.sftp")
+class TestExecReads(unittest.TestCase):
+    """
+        Test cases to verify files are read through a compression command run over an exec channel
+    """
+
+    def get_connection(self, *channels, **config):
+        conn = client.connection({"host": "10.0.0.1",
+                                  "port": 22,
+                                  "username": "username",
+                                  "password": "",
+                                  "read_backend": "exec",
+                                  **config})
+        conn.transport = mock.Mock()
+        conn.transport.open_session.side_effect = channels
+        return conn
+
+    def test_output_is_decompressed(self, mocked_sftp, mocked_open_over_sftp, mocked_restore_channel):
+        """
+            Test case to verify the command's output is decompressed and compressed files and resumed reads use SFTP
+        """
+        channel = fakes.FakeChannel(gzip.compress(DATA))
+        conn = self.get_connection(channel)
+
+        self.assertEqual(conn.get_file_handle({"filepath": "/root/file's.csv"}).read(), DATA)
+        self.assertEqual(conn.get_file_handle({"filepath": "/root/file.csv"}, 100).read(), DATA[100:])
+        conn.get_file_handle({"filepath": "/root/file.csv.gz"})
+
+        channel.exec_command.assert_called_once_with("gzip -1 -c -- '/root/file'\"'\"'s.csv'")
+        self.assertEqual(mocked_open_over_sftp.call_count, 2)
+
+    @unittest.skipUnless(remote_exec.zstandard, "zstandard is not installed")
+    def test_zstd_output(self, mocked_sftp, mocked_open_over_sftp, mocked_restore_channel):
+        """
+            Test case to verify 'exec_compression' selects the command and its decoder
+        """
+        conn = self.get_connection(fakes.FakeChannel(remote_exec.zstandard.ZstdCompressor().compress(DATA)),
+                                   exec_compression="zstd")
+
+        self.assertEqual(conn.get_file_handle({"filepath": "/root/file.csv"}).read(), DATA)
+        mocked_open_over_sftp.assert_not_called()
+
+    def test_failed_command_falls_back_to_sftp(self, mocked_sftp, mocked_open_over_sftp, mocked_restore_channel):
+        """
+            Test case to verify a failing command is read over SFTP and a missing command is not run again
+        """
+        conn = self.get_connection(fakes.FakeChannel(stderr=b"gzip: /root/file.csv: Permission denied", status=1),
+                                   fakes.FakeChannel(stderr=b"sh: 1: gzip: not found", status=127))
+
+        self.assertEqual(conn.get_file_handle({"filepath": "/root/file.csv"}).read(), DATA)
+        self.assertEqual(conn.read_backend, "exec")
+        self.assertEqual(conn.get_file_handle({"filepath": "/root/file.csv"}).read(), DATA)
+        self.assertEqual(conn.read_backend, "sftp")
+        self.assertEqual(conn.get_file_handle({"filepath": "/root/file.csv"}).read(), DATA)
+
+        self.assertEqual(conn.transport.open_session.call_count, 2)
+        mocked_restore_channel.assert_not_called()
+
+    def test_lost_channel_continues_over_sftp(self, mocked_sftp, mocked_open_over_sftp, mocked_restore_channel):
+        """
+            Test case to verify a channel closed mid-read continues over SFTP from the first byte not yet read
+        """
+        compressed = gzip.compress(DATA)
+        conn = self.get_connection(fakes.FakeChannel(compressed[:len(compressed) // 2], complete=False))
+
+        self.assertEqual(conn.get_file_handle({"filepath": "/root/file.csv"}).read(), DATA)
+
+        offset = mocked_open_over_sftp.call_args.args[1]
+        self.assertGreater(offset, 0)
+        mocked_restore_channel.assert_called_once()
+
+    def test_unsupported_config(self, mocked_sftp, mocked_open_over_sftp, mocked_restore_channel):
+        """
+            Test case to verify unknown read backends and compressions are reported
+        """
+        with self.assertRaises(Exception) as context:
+            self.get_connection(read_backend="scp")
+        self.assertIn("Unsupported read backend", str(context.exception))
+
+        with self.assertRaises(Exception) as context:
+            self.get_connection(exec_compression="bzip2")
+        self.assertIn("Unsupported exec compression", str(context.exception))
@@ -0,0 +1,189 @@
+import gzip
+import unittest
+from unittest import mock
+from datetime import timedelta
+from fakes import LAST_MODIFIED, FakeConnection, get_config, sync_stream
+# rows with quoted line breaks span several lines
+DATA = ("id,name\n" + "".join('{},"line\nbreak {}"\n'.format(i, i) for i in range(1200))).encode()
+
+def get_connection(filepath="/root/file.csv", data=DATA):
+    """ Returns a connection serving a single file. """
+    return FakeConnection({filepath: data})
+
+CONFIG = get_config(file_checkpoint_records=500)
+
+class TestFileCheckpoints(unittest.TestCase):
+    """
+        Test cases to verify the position in a file is checkpointed and a file is resumed from it
+    """
+
+    def sync(self, conn, state, config=CONFIG):
+        """ Returns the records and the states written while syncing the stream. """
+        output = sync_stream(conn, state, config)
+        return output.records, output.states
+
+    def test_checkpoints_have_byte_offsets(self):
+        """
+            Test case to verify checkpoints point after the last record written and are removed once the file is synced
+        """
+        _, states = self.sync(get_connection(), {})
+
+        checkpoints = [state["bookmarks"]["table"].get("file_checkpoint") for state in states]
+        self.assertEqual([checkpoint["rows"] for checkpoint in checkpoints[:2]], [500, 1000])
+        self.assertEqual(checkpoints[0]["offset"], DATA.index(b"\n500,") + 1)
+        self.assertEqual(checkpoints[0]["filepath"], "/root/file.csv")
+        self.assertIsNone(checkpoints[2])
+
+    def test_resume_from_offset(self):
+        """
+            Test case to verify a resumed file is read from the checkpoint's offset with the same line numbers
+        """
+        records, states = self.sync(get_connection(), {})
+        conn = get_connection()
+
+        resumed_records, resumed_states = self.sync(conn, states[0])
+
+        self.assertEqual(conn.offsets, [states[0]["bookmarks"]["table"]["file_checkpoint"]["offset"]])
+        self.assertEqual(resumed_records, records[500:])
+        self.assertEqual(resumed_records[0]["_sdc_source_lineno"], 502)
+        self.assertEqual(resumed_states[0]["bookmarks"]["table"]["file_checkpoint"]["rows"], 1000)
+
+    def test_resume_concurrently(self):
+        """
+            Test case to verify the concurrent sync checkpoints the same positions and resumes from them
+        """
+        config = {**CONFIG, "file_workers": 2}
+        records, states = self.sync(get_connection(), {})
+        _, concurrent_states = self.sync(get_connection(), {}, config)
+
+        resumed_records, _ = self.sync(get_connection(), states[1], config)
+
+        self.assertEqual(concurrent_states, states)
+        self.assertEqual(resumed_records, records[1000:])
+
+    def test_resume_compressed_file(self):
+        """
+            Test case to verify compressed files are read from the start, skipping the rows already synced
+        """
+        records, states = self.sync(get_connection("/root/file.csv.gz", gzip.compress(DATA)), {})
+        conn = get_connection("/root/file.csv.gz", gzip.compress(DATA))
+
+        resumed_records, _ = self.sync(conn, states[0])
+
+        self.assertIsNone(states[0]["bookmarks"]["table"]["file_checkpoint"]["offset"])
+        self.assertEqual(conn.offsets, [0])
+        self.assertEqual(resumed_records, records[500:])
+
+    def test_changed_file_is_not_resumed(self):
+        """
+            Test case to verify the checkpoint of another version of the file is ignored
+        """
+        records, states = self.sync(get_connection(), {})
+        state = states[0]
+        state["bookmarks"]["table"]["file_checkpoint"]["last_modified"] = "2023-12-31T00:00:00+00:00"
+
+        resumed_records, _ = self.sync(get_connection(), state)
+
+        self.assertEqual(resumed_records, records)
+
+APPEND_CONFIG = get_config({"append": True})
+
+def get_rows(start, end):
+    return "".join("{},name {}\n".format(i, i) for i in range(start, end)).encode()
+
+class TestAppendMode(unittest.TestCase):
+    """
+        Test cases to verify only the rows appended to files of tables in append mode are synced again
+    """
+
+    def sync(self, conn, state, config=APPEND_CONFIG, all_states=False):
+        """ Returns the line numbers of the records and the last state, or all the states, written. """
+        output = sync_stream(conn, state, config)
+        return [record["_sdc_source_lineno"] for record in output.records], \
+            output.states if all_states else output.states[-1]
+
+    @mock.patch("singer.utils.now", return_value=LAST_MODIFIED + timedelta(seconds=10))
+    def test_appended_rows_are_synced(self, mocked_now):
+        """
+            Test case to verify a grown file is read from the offset synced up to, leaving the incomplete last line of a file just written
+        """
+        data = b"id,name\n" + get_rows(0, 100) + b"100,na"
+        conn = get_connection(data=data)
+        linenos, state = self.sync(conn, {})
+        position = state["bookmarks"]["table"]["file_positions"]["/root/file.csv"]
+        self.assertEqual(linenos, list(range(2, 102)))
+        self.assertEqual((position["offset"], position["rows"]), (len(data) - len(b"100,na"), 100))
+
+        data = b"id,name\n" + get_rows(0, 150)
+        conn.write("/root/file.csv", data)
+        mocked_now.return_value = conn.last_modified["/root/file.csv"] + timedelta(seconds=10)
+        conn.offsets = []
+        linenos, state = self.sync(conn, state)
+
+        self.assertEqual(conn.offsets, [position["offset"]])
+        self.assertEqual(linenos, list(range(102, 152)))
+        self.assertEqual(state["bookmarks"]["table"]["file_positions"]["/root/file.csv"],
+                         {**position, "offset": len(data), "rows": 150})
+
+    def test_incomplete_line_of_finished_file(self):
+        """
+            Test case to verify the last line of a file not written to for a while is synced without a line break
+        """
+        data = b"id,name\n1,a\n2,b"
+        conn = get_connection(data=data)
+        linenos, state = self.sync(conn, {})
+
+        self.assertEqual(linenos, [2, 3])
+        position = state["bookmarks"]["table"]["file_positions"]["/root/file.csv"]
+        self.assertEqual((position["offset"], position["rows"]), (len(data), 2))
+
+        linenos, _ = self.sync(conn, state, all_states=True)
+        self.assertEqual(linenos, [])
+
+    @mock.patch("tap_sftp.sync.MAX_FILE_POSITIONS", 2)
+    def test_positions_are_capped(self):
+        """
+            Test case to verify only the positions of the most recently synced files are kept
+        """
+        conn = FakeConnection({"/root/{}.csv".format(name): b"id,name\n" + get_rows(0, 10) for name in "abc"})
+        _, state = self.sync(conn, {})
+        self.assertEqual(list(state["bookmarks"]["table"]["file_positions"]), ["/root/b.csv", "/root/c.csv"])
+
+        conn.write("/root/b.csv", b"id,name\n" + get_rows(0, 20))
+        _, state = self.sync(conn, state)
+        self.assertEqual(list(state["bookmarks"]["table"]["file_positions"]), ["/root/c.csv", "/root/b.csv"])
+
+    def test_rewritten_file_is_synced_again(self):
+        """
+            Test case to verify files that were truncated or whose first bytes changed are read from the start
+        """
+        conn = get_connection(data=b"id,name\n" + get_rows(0, 100))
+        _, state = self.sync(conn, {})
+
+        conn.write("/root/file.csv", b"id,name\n" + get_rows(0, 50))
+        linenos, _ = self.sync(conn, state)
+        self.assertEqual(linenos, list(range(2, 52)))
+
+        conn.write("/root/file.csv", b"id,name\n" + get_rows(1, 150))
+        linenos, _ = self.sync(conn, state)
+        self.assertEqual(linenos, list(range(2, 151)))
+
+    def test_position_of_resumed_file(self):
+        """
+            Test case to verify a file resumed from a checkpoint keeps its position, so only the rows appended later are synced
+        """
+        config = {**APPEND_CONFIG, "file_checkpoint_records": 40}
+        data = b"id,name\n" + get_rows(0, 100)
+        conn = get_connection(data=data)
+        _, states = self.sync(conn, {}, config, all_states=True)
+
+        for checkpoint in (states[0], states[1]):
+            linenos, state = self.sync(conn, checkpoint, config)
+            rows = checkpoint["bookmarks"]["table"]["file_checkpoint"]["rows"]
+            self.assertEqual(linenos, list(range(rows + 2, 102)))
+            position = state["bookmarks"]["table"]["file_positions"]["/root/file.csv"]
+            self.assertEqual((position["offset"], position["rows"]), (len(data), 100))
+
+        conn.write("/root/file.csv", data + get_rows(100, 120))
+        linenos, _ = self.sync(conn, state, config)
+        self.assertEqual(linenos, list(range(102, 122)))
@@ -0,0 +1,97 @@
+import unittest
+from unittest import mock
+from tap_sftp import fingerprint
+from fakes import FakeConnection, get_config, sync_stream
+
+TABLE_SPEC = {"table_name": "table", "search_prefix": "/root", "search_pattern": "csv",
+              "key_properties": ["id"], "delimiter": ",", "skip_unchanged": True}
+
+def get_fingerprints(conn, *filepaths):
+    return [fingerprint.get_fingerprint(conn.sftp, filepath) for filepath in filepaths]
+
+class TestFingerprintSkip(unittest.TestCase):
+    """
+        Test cases to verify files with the content of a file already synced are skipped
+    """
+
+    def sync(self, conn, state, **config):
+        """ Returns the files synced, the last state written and the calls to add_file_data. """
+        conn.opened.clear()
+        output = sync_stream(conn, state, get_config(TABLE_SPEC, **config))
+        return sorted(conn.opened), output.states[-1], output.stats
+
+    def test_reuploaded_file_is_skipped(self):
+        """
+            Test case to verify a re-uploaded copy is skipped, under another name too, and a changed file is synced
+        """
+        conn = FakeConnection({"/root/a.csv": b"id\n1\n2\n"})
+        _, state, _ = self.sync(conn, {})
+        self.assertEqual(state["bookmarks"]["table"]["file_fingerprints"], get_fingerprints(conn, "/root/a.csv"))
+
+        conn.write("/root/a.csv", b"id\n1\n2\n")
+        conn.write("/root/b.csv", b"id\n1\n2\n")
+        conn.write("/root/c.csv", b"id\n1\n3\n")
+        opened, state, stats = self.sync(conn, state)
+
+        self.assertEqual(opened, ["/root/c.csv"])
+        self.assertEqual(state["bookmarks"]["table"]["file_fingerprints"],
+                         get_fingerprints(conn, "/root/a.csv", "/root/c.csv"))
+        self.assertIn(mock.call(TABLE_SPEC, "/root/b.csv", conn.last_modified["/root/b.csv"], 0, skipped=True), stats)
+
+    def test_concurrent_sync_skips_files(self):
+        """
+            Test case to verify the concurrent sync fingerprints the files in its workers and skips the same files
+        """
+        conn = FakeConnection({"/root/a.csv": b"id\n1\n"})
+        _, state, _ = self.sync(conn, {})
+
+        conn.write("/root/a.csv", b"id\n1\n")
+        conn.write("/root/b.csv", b"id\n2\n")
+        opened, concurrent_state, _ = self.sync(conn, state, file_workers=2)
+
+        self.assertEqual(opened, ["/root/b.csv"])
+        self.assertEqual(concurrent_state["bookmarks"]["table"]["file_fingerprints"],
+                         get_fingerprints(conn, "/root/a.csv", "/root/b.csv"))
+
+    @mock.patch("tap_sftp.fingerprint.MAX_FINGERPRINTS", 2)
+    def test_oldest_fingerprints_are_dropped(self):
+        """
+            Test case to verify the state keeps the fingerprints of the files synced last
+        """
+        files = {"/root/{}.csv".format(i): "id\n{}\n".format(i).encode() for i in range(3)}
+
+        conn = FakeConnection(files)
+
+        _, state, _ = self.sync(conn, {})
+
+        self.assertEqual(state["bookmarks"]["table"]["file_fingerprints"],
+                         get_fingerprints(conn, "/root/1.csv", "/root/2.csv"))
+
+class TestFingerprint(unittest.TestCase):
+    """
+        Test cases to verify the ranges the fingerprint of a file is computed from
+    """
+
+    def test_sample_ranges(self):
+        """
+            Test case to verify small files are read whole and larger ones sampled up to their last byte
+        """
+        self.assertEqual(fingerprint.get_sample_ranges(0), [])
+        self.assertEqual(fingerprint.get_sample_ranges(1000), [(0, 1000)])
+
+        ranges = fingerprint.get_sample_ranges(100 * 1024 * 1024)
+
+        self.assertEqual(len(ranges), fingerprint.SAMPLES)
+        self.assertEqual(ranges[0], (0, fingerprint.SAMPLE_SIZE))
+        self.assertEqual(sum(ranges[-1]), 100 * 1024 * 1024)
+
+    def test_fingerprints_are_compact(self):
+        """
+            Test case to verify files of the same size but different content have different short fingerprints
+        """
+        sftp = FakeConnection({"/root/a.csv": b"id\n1\n", "/root/b.csv": b"id\n2\n"}).sftp
+
+        fingerprints = [fingerprint.get_fingerprint(sftp, filepath) for filepath in ("/root/a.csv", "/root/b.csv")]
+
+        self.assertNotEqual(fingerprints[0], fingerprints[1])
+        self.assertEqual([len(value) for value in fingerprints], [fingerprint.FINGERPRINT_SIZE] * 2)
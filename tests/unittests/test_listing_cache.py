@@ -0,0 +1,144 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import tap_sftp.client as client
+import fakes
+
+# directory tree served by the mocked SFTP channel: path -> [(name, is_directory)]
+TREE = {
+    "/root": [("file1.csv", False), ("2024", True)],
+    "/root/2024": [("01", True), ("file2.csv", False)],
+    "/root/2024/01": [("file3.csv", False)],
+}
+
+class TestListingCache(unittest.TestCase):
+    """
+        Test cases to verify directories are only re-listed when their mtime changed
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.temp_dir.name, "listing_cache.json")
+        self.directory_mtimes = {path: 1000 for path in TREE}
+        self.file_mtimes = {}
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def listdir_attr(self, path):
+        return [fakes.get_attr(name, is_directory, mtime=self.directory_mtimes[path + "/" + name] if is_directory
+                               else self.file_mtimes.get(path + "/" + name, 500))
+                for name, is_directory in TREE[path]]
+
+    def stat(self, path):
+        return fakes.get_attr(path.split("/")[-1], True, mtime=self.directory_mtimes[path])
+
+    def get_files(self, mocked_sftp, **config):
+        return [f["filepath"] for f in self.get_file_dicts(mocked_sftp, **config)]
+
+    def get_file_dicts(self, mocked_sftp, **config):
+        mocked_sftp.reset_mock()
+        mocked_sftp.listdir_attr.side_effect = self.listdir_attr
+        mocked_sftp.stat.side_effect = self.stat
+        conn = client.connection({"host": "10.0.0.1",
+                                  "port": 22,
+                                  "username": "username",
+                                  "password": "",
+                                  "listing_cache_path": self.cache_path,
+                                  **config})
+        return conn.get_files("/root", ".*")
+
+    @mock.patch("tap_sftp.client.SFTPConnection.sftp")
+    def test_unchanged_tree_is_not_relisted(self, mocked_sftp):
+        """
+            Test case to verify every directory is served from the cache once listed twice at the same mtime
+        """
+        first_files = self.get_files(mocked_sftp)
+        self.assertEqual(mocked_sftp.listdir_attr.call_count, 3)
+        # the subdirectories' mtimes come from their parent's listing
+        self.assertEqual(mocked_sftp.stat.call_count, 1)
+
+        self.get_files(mocked_sftp)
+        self.assertEqual(mocked_sftp.listdir_attr.call_count, 3)
+
+        third_files = self.get_files(mocked_sftp)
+        self.assertEqual(mocked_sftp.listdir_attr.call_count, 0)
+        self.assertEqual(first_files, third_files)
+
+    @mock.patch("tap_sftp.client.SFTPConnection.sftp")
+    def test_change_at_the_same_mtime_is_listed(self, mocked_sftp):
+        """
+            Test case to verify a file added within the second of the first listing is found by the listing confirming it
+        """
+        self.get_files(mocked_sftp)
+
+        TREE["/root/2024/01"].append(("file4.csv", False))
+        try:
+            self.get_files(mocked_sftp)
+            files = self.get_files(mocked_sftp)
+        finally:
+            TREE["/root/2024/01"].pop()
+
+        self.assertEqual(mocked_sftp.listdir_attr.call_count, 0)
+        self.assertIn("/root/2024/01/file4.csv", files)
+
+    @mock.patch("tap_sftp.client.SFTPConnection.sftp")
+    def test_changed_directory_is_relisted(self, mocked_sftp):
+        """
+            Test case to verify only the directory whose mtime changed is listed again
+        """
+        self.get_files(mocked_sftp)
+        self.get_files(mocked_sftp)
+
+        TREE["/root/2024/01"].append(("file4.csv", False))
+        self.directory_mtimes["/root/2024/01"] = 2000
+        try:
+            files = self.get_files(mocked_sftp)
+        finally:
+            TREE["/root/2024/01"].pop()
+
+        listed_directories = [c.args[0] for c in mocked_sftp.listdir_attr.call_args_list]
+        self.assertEqual(listed_directories, ["/root/2024/01"])
+        self.assertIn("/root/2024/01/file4.csv", files)
+
+    @mock.patch("tap_sftp.client.SFTPConnection.sftp")
+    def test_overwrite_in_place_is_not_seen(self, mocked_sftp):
+        """
+            Test case to verify a file rewritten in place keeps its cached mtime until its directory is listed again
+        """
+        self.get_files(mocked_sftp)
+        self.get_files(mocked_sftp)
+
+        # the file's mtime changes, its directory's does not
+        self.file_mtimes["/root/2024/01/file3.csv"] = 900
+        get_mtime = lambda files: {f["filepath"]: f["last_modified"].timestamp() for f in files}["/root/2024/01/file3.csv"]
+
+        self.assertEqual(get_mtime(self.get_file_dicts(mocked_sftp)), 500)
+        with mock.patch("time.time", return_value=10**10):
+            self.assertEqual(get_mtime(self.get_file_dicts(mocked_sftp)), 900)
+
+    @mock.patch("tap_sftp.client.SFTPConnection.sftp")
+    def test_expired_listings_are_relisted(self, mocked_sftp):
+        """
+            Test case to verify listings older than 'listing_cache_max_age' are not used
+        """
+        self.get_files(mocked_sftp)
+        self.get_files(mocked_sftp)
+
+        with mock.patch("time.time", return_value=10**10):
+            self.get_files(mocked_sftp, listing_cache_max_age=3600)
+
+        self.assertEqual(mocked_sftp.listdir_attr.call_count, 3)
+
+    @mock.patch("tap_sftp.client.SFTPConnection.sftp")
+    def test_cache_of_another_server_is_ignored(self, mocked_sftp):
+        """
+            Test case to verify the cache is not shared between servers
+        """
+        self.get_files(mocked_sftp)
+        self.get_files(mocked_sftp)
+
+        self.get_files(mocked_sftp, host="10.0.0.2")
+
+        self.assertEqual(mocked_sftp.listdir_attr.call_count, 3)
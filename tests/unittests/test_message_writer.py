@@ -0,0 +1,189 @@
+import decimal
+import time
+import unittest
+from io import StringIO
+from unittest import mock
+from singer import RecordMessage
+from tap_sftp import helper
+
+RECORDS = [
+    {"id": 1, "name": "café ☃", "amount": decimal.Decimal("10.10"), "ratio": 0.1, "big": 1e16},
+    {"id": None, "name": "", "_sdc_extra": ["a", "ü"], "_sdc_source_lineno": 3},
+    {"quote": "\"\\\n\t", "nan": float("nan"), "nested": {"b": [1, 2.5, None]}},
+]
+
+class TestMessageWriter(unittest.TestCase):
+    """
+        Test cases to verify the buffered writer writes the same messages in the same order
+    """
+
+    def test_output_is_unchanged(self):
+        """
+            Test case to verify the buffered records are byte for byte the messages written one at a time
+        """
+        expected = "".join(helper.format_message(RecordMessage(stream="table", record=record), ensure_ascii=ensure_ascii) + "\n"
+                           for ensure_ascii in (True, False) for record in RECORDS)
+
+        with mock.patch("sys.stdout", new_callable=StringIO) as mocked_stdout:
+            writer = helper.MessageWriter()
+            with mock.patch("tap_sftp.helper.WRITER", writer):
+                for ensure_ascii in (True, False):
+                    for record in RECORDS:
+                        helper.write_record("table", record, ensure_ascii=ensure_ascii)
+                self.assertEqual(mocked_stdout.getvalue(), "")
+                writer.flush()
+
+            self.assertEqual(mocked_stdout.getvalue(), expected)
+
+    def test_flush_by_size(self):
+        """
+            Test case to verify the buffer is written out once it holds "buffer_size" characters
+        """
+        with mock.patch("sys.stdout", new_callable=StringIO) as mocked_stdout:
+            writer = helper.MessageWriter(buffer_size=100)
+            writer.write({"type": "RECORD", "stream": "table", "record": {"id": 1}})
+            self.assertEqual(mocked_stdout.getvalue(), "")
+
+            writer.write({"type": "RECORD", "stream": "table", "record": {"id": "x" * 100}})
+            self.assertEqual(mocked_stdout.getvalue().count("\n"), 2)
+
+    @mock.patch("time.monotonic")
+    def test_flush_by_age(self, mocked_monotonic):
+        """
+            Test case to verify the buffer is written out once its oldest message is "buffer_age" seconds old
+        """
+        with mock.patch("sys.stdout", new_callable=StringIO) as mocked_stdout:
+            writer = helper.MessageWriter(buffer_age=1)
+            mocked_monotonic.return_value = 10
+            writer.write({"id": 1})
+            mocked_monotonic.return_value = 10.5
+            writer.write({"id": 2})
+            self.assertEqual(mocked_stdout.getvalue(), "")
+
+            mocked_monotonic.return_value = 11
+            writer.write({"id": 3})
+            self.assertEqual(mocked_stdout.getvalue(), '{"id": 1}\n{"id": 2}\n{"id": 3}\n')
+
+    def test_flush_by_age_between_writes(self):
+        """
+            Test case to verify messages are written out once "buffer_age" seconds old, without waiting for the next message
+        """
+        with mock.patch("sys.stdout", new_callable=StringIO) as mocked_stdout:
+            writer = helper.MessageWriter(buffer_age=0.05)
+            writer.write({"id": 1})
+
+            for _ in range(100):
+                if mocked_stdout.getvalue():
+                    break
+                time.sleep(0.05)
+            self.assertEqual(mocked_stdout.getvalue(), '{"id": 1}\n')
+
+            writer.close()
+            writer.flusher.join(5)
+            self.assertFalse(writer.flusher.is_alive())
+
+    def test_state_is_written_after_records(self):
+        """
+            Test case to verify the records buffered before a state message are written before it
+        """
+        with mock.patch("sys.stdout", new_callable=StringIO) as mocked_stdout:
+            with mock.patch("tap_sftp.helper.WRITER", helper.MessageWriter()):
+                helper.write_record("table", {"id": 1})
+                helper.write_state({"bookmarks": {"table": {"modified_since": "2024-01-01"}}})
+                helper.write_record("table", {"id": 2})
+
+            self.assertEqual(mocked_stdout.getvalue().splitlines(), [
+                '{"type": "RECORD", "stream": "table", "record": {"id": 1}}',
+                '{"type": "STATE", "value": {"bookmarks": {"table": {"modified_since": "2024-01-01"}}}}'])
+
+    def test_serializer_is_pluggable(self):
+        """
+            Test case to verify messages are serialized by the writer's serializer
+        """
+        with mock.patch("sys.stdout", new_callable=StringIO) as mocked_stdout:
+            writer = helper.MessageWriter(serializer=lambda message, ensure_ascii: str(sorted(message)))
+            writer.write({"b": 1, "a": 2})
+            writer.flush()
+
+        self.assertEqual(mocked_stdout.getvalue(), "['a', 'b']\n")
+
+class TestThreadedMessageWriter(unittest.TestCase):
+    """
+        Test cases to verify the writer thread writes what the buffered writer writes, in order
+    """
+
+    def write_messages(self, writer):
+        state = {"bookmarks": {}}
+        with mock.patch("sys.stdout", new_callable=StringIO) as mocked_stdout:
+            with mock.patch("tap_sftp.helper.WRITER", writer):
+                for i in range(1000):
+                    helper.write_record("table", {"id": i, "name": "ü"}, ensure_ascii=False)
+                    if i % 300 == 0:
+                        state["bookmarks"]["table"] = i
+                        helper.write_state(state)
+                writer.close()
+            return mocked_stdout.getvalue()
+
+    def test_same_output_as_buffered_writer(self):
+        """
+            Test case to verify the records and states come out in the order they were written
+        """
+        expected = self.write_messages(helper.MessageWriter())
+
+        with mock.patch("tap_sftp.helper.LOGGER.info") as mocked_logger:
+            output = self.write_messages(helper.ThreadedMessageWriter(2, helper.MessageWriter()))
+
+        self.assertEqual(output, expected)
+        self.assertIn('{"type": "STATE", "value": {"bookmarks": {"table": 300}}}', output.splitlines())
+        # the waits on either side are reported
+        self.assertIn("bottleneck", mocked_logger.call_args.args[0])
+
+    def test_hand_over_by_age(self):
+        """
+            Test case to verify messages are written out once "buffer_age" seconds old, without waiting for the next message
+        """
+        with mock.patch("sys.stdout", new_callable=StringIO) as mocked_stdout:
+            writer = helper.ThreadedMessageWriter(2, helper.MessageWriter(buffer_age=0.05), buffer_age=0.05)
+            writer.write({"id": 1})
+
+            for _ in range(100):
+                if mocked_stdout.getvalue():
+                    break
+                time.sleep(0.05)
+            self.assertEqual(mocked_stdout.getvalue(), '{"id": 1}\n')
+
+            with mock.patch("tap_sftp.helper.LOGGER.info"):
+                writer.close()
+            writer.flusher.join(5)
+            self.assertFalse(writer.flusher.is_alive())
+
+    def test_output_error_is_raised(self):
+        """
+            Test case to verify an error writing to stdout is raised to the sync
+        """
+        with mock.patch("sys.stdout") as mocked_stdout:
+            mocked_stdout.write.side_effect = BrokenPipeError()
+            writer = helper.ThreadedMessageWriter(2, helper.MessageWriter(buffer_size=1))
+
+            with self.assertRaises(BrokenPipeError):
+                for i in range(10000):
+                    writer.write({"id": i})
+                writer.flush()
+
+            with self.assertRaises(BrokenPipeError):
+                writer.close()
+            self.assertFalse(writer.thread.is_alive())
+
+    def test_configure_writer(self):
+        """
+            Test case to verify the writer thread is only used when 'writer_queue_size' is set
+        """
+        with mock.patch("tap_sftp.helper.WRITER", helper.MessageWriter()):
+            helper.configure_writer({})
+            self.assertIsInstance(helper.WRITER, helper.MessageWriter)
+
+            helper.configure_writer({"writer_queue_size": 8})
+            self.assertIsInstance(helper.WRITER, helper.ThreadedMessageWriter)
+
+            helper.close_writer()
+            self.assertIsInstance(helper.WRITER, helper.MessageWriter)
@@ -0,0 +1,162 @@
+import glob
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from io import StringIO
+from unittest import mock
+from tap_sftp import helper
+from tap_sftp import parquet
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "id": {"type": ["null", "integer", "string"]},
+        "amount": {"type": ["null", "number", "string"]},
+        "name": {"type": ["null", "string"]},
+        "updated_at": {"anyOf": [{"type": ["null", "string"], "format": "date-time"},
+                                 {"type": ["null", "string"]}]},
+        "_sdc_source_file": {"type": "string"},
+        "_sdc_source_lineno": {"type": "integer"},
+        "_sdc_extra": {"type": "array", "items": {"type": "string"}},
+    }
+}
+
+@unittest.skipUnless(parquet.pyarrow, "pyarrow is not installed")
+class TestParquetOutput(unittest.TestCase):
+    """
+        Test cases to verify records are written to Parquet files typed from the stream's schema
+    """
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def sync(self, records, row_group_size=None, file_size=None, writer_queue_size=None):
+        """ Writes the records with a state after the 3rd and returns the messages written to stdout. """
+        with mock.patch("sys.stdout", new_callable=StringIO) as mocked_stdout:
+            with mock.patch("tap_sftp.helper.WRITER", helper.MessageWriter()):
+                helper.configure_writer({"output_format": "parquet",
+                                         "parquet_dir": self.directory,
+                                         "parquet_row_group_size": row_group_size,
+                                         "parquet_file_size": file_size,
+                                         "writer_queue_size": writer_queue_size})
+                helper.write_schema("table", SCHEMA, ["id"])
+                for i, record in enumerate(records):
+                    helper.write_record("table", record, ensure_ascii=False)
+                    if i == 2:
+                        helper.write_state({"bookmarks": {"table": {"modified_since": "2024-01-01"}}})
+                        # the state held is not changed by the sync changing it
+                        helper.write_state({"bookmarks": {"table": {"modified_since": "2024-01-02"}}})
+                helper.close_writer()
+            return [json.loads(line) for line in mocked_stdout.getvalue().splitlines()]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def get_paths(self):
+        return glob.glob(os.path.join(self.directory, "table-*.parquet"))
+
+    def read_files(self):
+        return sorted((parquet.pyarrow.parquet.ParquetFile(path) for path in self.get_paths()),
+                      key=lambda parquet_file: parquet_file.read().column("_sdc_source_lineno")[0].as_py())
+
+    def record(self, lineno, **values):
+        return {"id": lineno, "amount": 1.5, "name": "ü", "updated_at": "2024-01-02T00:00:00.000000Z",
+                "_sdc_source_file": "/root/file.csv", "_sdc_source_lineno": lineno, **values}
+
+    def test_records_are_written_to_parquet(self):
+        """
+            Test case to verify the records are typed from the schema and the state is written once their file is closed
+        """
+        records = [self.record(lineno) for lineno in range(2, 7)]
+        records[4]["_sdc_extra"] = ["a", "b"]
+
+        messages = self.sync(records)
+
+        self.assertEqual([message["type"] for message in messages], ["SCHEMA", "STATE"])
+        self.assertEqual(messages[1]["value"]["bookmarks"]["table"]["modified_since"], "2024-01-02")
+        table = self.read_files()[0].read()
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(table.column_names, list(SCHEMA["properties"]))
+        # columns with a "string" fallback take their other type
+        self.assertEqual(str(table.schema.field("id").type), "int64")
+        self.assertEqual(str(table.schema.field("amount").type), "double")
+        self.assertEqual(str(table.schema.field("name").type), "string")
+        self.assertEqual(str(table.schema.field("_sdc_source_lineno").type), "int64")
+        self.assertEqual(table.column("_sdc_extra").to_pylist(), [None, None, None, None, ["a", "b"]])
+        self.assertEqual(table.to_pylist()[0], {**records[0], "_sdc_extra": None})
+
+    def test_row_groups_and_files(self):
+        """
+            Test case to verify row groups of 'parquet_row_group_size' records are written to files of 'parquet_file_size'
+            records, with the writer thread
+        """
+        messages = self.sync([self.record(lineno) for lineno in range(2, 12)], row_group_size=2, file_size=4,
+                             writer_queue_size=2)
+
+        self.assertEqual([message["type"] for message in messages], ["SCHEMA", "STATE"])
+        parquet_files = self.read_files()
+        self.assertEqual([parquet_file.metadata.num_rows for parquet_file in parquet_files], [4, 4, 2])
+        self.assertEqual([parquet_file.metadata.num_row_groups for parquet_file in parquet_files], [2, 2, 1])
+
+    def test_state_is_held_until_file_is_closed(self):
+        """
+            Test case to verify a state is written once the records before it are in a closed file
+        """
+        rows_written = []
+        def write_state(value):
+            rows_written.append(sum(parquet_file.metadata.num_rows for parquet_file in self.read_files()))
+
+        with mock.patch("singer.write_state", side_effect=write_state) as mocked_write_state:
+            self.sync([self.record(lineno) for lineno in range(2, 12)], row_group_size=2, file_size=4)
+
+        # written as the first file is closed, with the records of the state after the 3rd record
+        self.assertEqual(rows_written, [4])
+        mocked_write_state.assert_called_once_with({"bookmarks": {"table": {"modified_since": "2024-01-02"}}})
+
+    def test_string_fallback_values(self):
+        """
+            Test case to verify the values that are not of the type of their column are written to a string column next to it
+        """
+        records = [self.record(2), self.record(3), self.record(4, id="abc", amount="n/a"), self.record(5)]
+
+        self.sync(records, row_group_size=2)
+
+        parquet_files = self.read_files()
+        self.assertEqual([parquet_file.metadata.num_rows for parquet_file in parquet_files], [2, 2])
+        self.assertNotIn("id__string", parquet_files[0].schema_arrow.names)
+        table = parquet_files[1].read()
+        self.assertEqual(str(table.schema.field("id").type), "int64")
+        self.assertEqual(table.column_names[-2:], ["id__string", "amount__string"])
+        self.assertEqual(table.column("id").to_pylist(), [None, 5])
+        self.assertEqual(table.column("id__string").to_pylist(), ["abc", None])
+        self.assertEqual(table.column("amount__string").to_pylist(), ["n/a", None])
+
+class TestParquetConfig(unittest.TestCase):
+    """
+        Test cases to verify the Parquet output format is configured as documented
+    """
+
+    def test_unsupported_config(self):
+        """
+            Test case to verify unknown formats and the combination with 'batch_config' are reported
+        """
+        with mock.patch("tap_sftp.helper.WRITER", helper.MessageWriter()):
+            with self.assertRaises(Exception) as context:
+                helper.configure_writer({"output_format": "avro"})
+            self.assertIn("Unsupported output format", str(context.exception))
+
+            with mock.patch("tap_sftp.parquet.ParquetMessageWriter"):
+                with self.assertRaises(Exception) as context:
+                    helper.configure_writer({"output_format": "parquet", "batch_config": '{"batch_size": 10}'})
+                self.assertIn("batch_config", str(context.exception))
+
+    @mock.patch("tap_sftp.parquet.pyarrow", None)
+    def test_pyarrow_is_required(self):
+        """
+            Test case to verify a missing 'pyarrow' package is reported with the extra to install
+        """
+        with self.assertRaises(Exception) as context:
+            parquet.ParquetMessageWriter(helper.MessageWriter())
+        self.assertIn("tap-sftp[parquet]", str(context.exception))
@@ -0,0 +1,273 @@
+import gzip
+import io
+import socket
+import time
+import unittest
+from unittest import mock
+import tap_sftp.client as client
+from tap_sftp import reader
+from fakes import FakeConnection, FakeSFTPFile
+
+class TestReadAhead(unittest.TestCase):
+    """
+        Test cases to verify the read-ahead file returns the remote bytes unchanged
+    """
+
+    def test_read_whole_file(self):
+        """
+            Test case to verify the content is read in windows of pipelined blocks
+        """
+        data = bytes(range(256)) * 1000
+        sftp_file = FakeSFTPFile(data)
+
+        file_handle = reader.open_read_ahead(sftp_file, block_size=1000, window=10)
+
+        self.assertEqual(file_handle.read(), data)
+        # 256 blocks of 1000 bytes, 10 blocks per round trip
+        self.assertEqual(len(sftp_file.readv_calls), 26)
+        self.assertTrue(all(len(chunks) <= 10 for chunks in sftp_file.readv_calls))
+
+    def test_iterate_lines(self):
+        """
+            Test case to verify the file can be iterated line by line like a regular file
+        """
+        lines = [("id,name,{}\n".format(i)).encode() for i in range(1000)]
+        file_handle = reader.open_read_ahead(FakeSFTPFile(b"".join(lines)), block_size=100, window=4)
+
+        self.assertEqual(list(file_handle), lines)
+
+    def test_read_gzip(self):
+        """
+            Test case to verify compressed files are decompressed from the read-ahead file
+        """
+        data = b"a,b\n" + b"1,2\n" * 10000
+        file_handle = reader.open_read_ahead(FakeSFTPFile(gzip.compress(data)), block_size=512, window=8)
+
+        self.assertEqual(gzip.GzipFile(fileobj=file_handle).read(), data)
+
+    def test_appended_bytes_are_read(self):
+        """
+            Test case to verify bytes appended after the file size was read are not lost
+        """
+        sftp_file = FakeSFTPFile(b"x" * 2500)
+        file_handle = reader.open_read_ahead(sftp_file, block_size=1000, window=2)
+
+        first = file_handle.read(10)
+        sftp_file.data += b"y" * 1500
+
+        self.assertEqual(first + file_handle.read(), b"x" * 2500 + b"y" * 1500)
+
+    def test_close_closes_remote_file(self):
+        """
+            Test case to verify closing the buffered file closes the remote handle
+        """
+        sftp_file = FakeSFTPFile(b"data")
+        file_handle = reader.open_read_ahead(sftp_file)
+
+        file_handle.close()
+
+        self.assertTrue(sftp_file.closed)
+
+    @mock.patch("tap_sftp.client.SFTPConnection.sftp")
+    def test_get_file_handle(self, mocked_sftp):
+        """
+            Test case to verify only non-zip files are wrapped for read-ahead
+        """
+        mocked_sftp.open.return_value = FakeSFTPFile(b"a,b\n1,2\n")
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22")
+
+        self.assertIsInstance(conn.get_file_handle({"filepath": "/root/file.csv"}), io.BufferedReader)
+        self.assertIsInstance(conn.get_file_handle({"filepath": "/root/file.zip"}), FakeSFTPFile)
+
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22", read_ahead_window=1)
+        self.assertIsInstance(conn.get_file_handle({"filepath": "/root/file.csv"}), FakeSFTPFile)
+
+def get_connection(data):
+    """ Returns a connection whose channels open FakeSFTPFiles over the same data. """
+    return FakeConnection({"/root/file.csv": data})
+
+class TestSegmentedDownload(unittest.TestCase):
+    """
+        Test cases to verify the segmented download reassembles the file in order
+    """
+
+    def test_segments_are_reassembled_in_order(self):
+        """
+            Test case to verify each segment fetches its own range and the bytes come back in order
+        """
+        data = bytes(range(256)) * 1000
+        conn = get_connection(data)
+
+        file_handle = reader.open_segmented(conn, "/root/file.csv", len(data), 4, block_size=1000, window=8)
+
+        self.assertEqual(file_handle.read(), data)
+        self.assertEqual(len(conn.opened_files), 4)
+        first_offsets = sorted(sftp_file.readv_calls[0][0][0] for sftp_file in conn.opened_files)
+        self.assertEqual(first_offsets, [0, 64000, 128000, 192000])
+        self.assertTrue(all(sftp_file.closed for sftp_file in conn.opened_files))
+
+    def test_iterate_lines_across_segments(self):
+        """
+            Test case to verify lines split over segment boundaries are read whole
+        """
+        lines = [("id,name,{}\n".format(i)).encode() for i in range(1000)]
+        data = b"".join(lines)
+
+        file_handle = reader.open_segmented(get_connection(data), "/root/file.csv", len(data), 3, block_size=100)
+
+        self.assertEqual(list(file_handle), lines)
+
+    def test_segment_error_is_raised(self):
+        """
+            Test case to verify a failed segment raises its error once the reader reaches it
+        """
+        data = b"x" * 3000
+        conn = get_connection(data)
+
+        with mock.patch.object(FakeSFTPFile, "readv", side_effect=OSError("Connection lost")):
+            file_handle = reader.open_segmented(conn, "/root/file.csv", len(data), 3, block_size=500)
+            with self.assertRaises(OSError):
+                file_handle.read()
+
+    def wait_for(self, condition):
+        for _ in range(200):
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail("Timed out waiting for the segments")
+
+    def test_segments_wait_for_the_reader(self):
+        """
+            Test case to verify a segment spools at most 'spool_limit' bytes ahead of the reader
+        """
+        data = bytes(range(256)) * 40
+        segmented_file = reader.SegmentedFile(get_connection(data), "/root/file.csv", len(data), 2,
+                                              block_size=100, window=1, spool_limit=1000)
+        second = segmented_file.segments[1]
+
+        self.wait_for(lambda: second.written == 1000)
+        time.sleep(0.05)
+        self.assertEqual(second.written, 1000)
+
+        self.assertEqual(io.BufferedReader(segmented_file, buffer_size=100).read(), data)
+
+    def test_close_stops_downloads(self):
+        """
+            Test case to verify closing the file stops the downloads before their spool files are closed
+        """
+        data = b"x" * 100000
+        segmented_file = reader.SegmentedFile(get_connection(data), "/root/file.csv", len(data), 4,
+                                              block_size=100, window=1, spool_limit=1000)
+        segmented_file.read(10)
+
+        segmented_file.close()
+
+        self.wait_for(lambda: all(segment.done for segment in segmented_file.segments))
+        self.assertEqual([segment.error for segment in segmented_file.segments], [None] * 4)
+        self.assertTrue(all(segment.written <= 1000 for segment in segmented_file.segments[1:]))
+
+    @mock.patch("tap_sftp.client.SFTPConnection.sftp")
+    def test_get_file_handle_segments_large_files(self, mocked_sftp):
+        """
+            Test case to verify only files of at least 'segment_min_size' bytes are downloaded in segments
+        """
+        mocked_sftp.open.side_effect = lambda filepath, mode: FakeSFTPFile(b"x" * 2000)
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22", download_segments=2, segment_min_size=1000)
+
+        with mock.patch("tap_sftp.reader.open_segmented") as mocked_open_segmented:
+            conn.get_file_handle({"filepath": "/root/file.csv"})
+            mocked_open_segmented.assert_called_once_with(conn, "/root/file.csv", 2000, 2, 32768, 64, None, 0,
+                                                          reader.DEFAULT_SEGMENT_SPOOL_LIMIT)
+
+            conn.segment_min_size = 5000
+            conn.get_file_handle({"filepath": "/root/file.csv"})
+            self.assertEqual(mocked_open_segmented.call_count, 1)
+
+class FailingSFTPFile(FakeSFTPFile):
+    """ FakeSFTPFile whose read requests time out once "fail_after" blocks were returned. """
+    def __init__(self, data, fail_after, error=socket.timeout):
+        super().__init__(data)
+        self.fail_after = fail_after
+        self.error = error
+
+    def readv(self, chunks, max_concurrent_prefetch_requests=None):
+        for data in super().readv(chunks, max_concurrent_prefetch_requests):
+            if self.fail_after == 0:
+                raise self.error()
+            self.fail_after -= 1
+            yield data
+
+@mock.patch("time.sleep")
+class TestTransientFailures(unittest.TestCase):
+    """
+        Test cases to verify reads failing with the connection continue on the reopened file
+    """
+
+    def test_read_continues_after_timeout(self, mocked_sleep):
+        """
+            Test case to verify the reopened file is read from the first byte not fetched yet
+        """
+        data = bytes(range(256)) * 100
+        reopened = []
+        def reopen():
+            reopened.append(FailingSFTPFile(data, fail_after=7))
+            return reopened[-1]
+        sftp_file = FailingSFTPFile(data, fail_after=5)
+
+        file_handle = io.BufferedReader(reader.ReadAheadFile(sftp_file, block_size=1000, window=4, reopen=reopen))
+
+        self.assertEqual(file_handle.read(), data)
+        self.assertEqual(len(reopened), 3)
+        self.assertTrue(sftp_file.closed)
+        # 5 blocks were fetched before the first failure, 7 more before each of the next
+        self.assertEqual(reopened[0].readv_calls[0][0], (5000, 1000))
+        self.assertEqual(reopened[1].readv_calls[0][0], (12000, 1000))
+
+    def test_file_errors_are_not_retried(self, mocked_sleep):
+        """
+            Test case to verify errors of the file itself and reads without "reopen" are raised right away
+        """
+        reopen = mock.Mock()
+        file_handle = reader.ReadAheadFile(FailingSFTPFile(b"x" * 5000, 1, PermissionError), block_size=1000,
+                                           reopen=reopen)
+        with self.assertRaises(PermissionError):
+            file_handle.read()
+        self.assertEqual(reopen.call_count, 0)
+
+        file_handle = reader.ReadAheadFile(FailingSFTPFile(b"x" * 5000, 1), block_size=1000)
+        with self.assertRaises(socket.timeout):
+            file_handle.read()
+
+    def test_retries_are_limited(self, mocked_sleep):
+        """
+            Test case to verify a file that keeps failing is reopened 4 times before the error is raised
+        """
+        reopen = mock.Mock(side_effect=lambda: FailingSFTPFile(b"x" * 5000, 0))
+        file_handle = reader.ReadAheadFile(FailingSFTPFile(b"x" * 5000, 0), block_size=1000, reopen=reopen)
+
+        with self.assertRaises(socket.timeout):
+            file_handle.read()
+        self.assertEqual(reopen.call_count, 4)
+
+    @mock.patch("tap_sftp.client.SFTPConnection._SFTPConnection__try_connect")
+    @mock.patch("paramiko.SFTPClient.from_transport")
+    def test_lost_pool_channel_is_replaced(self, mocked_from_transport, mocked_try_connect, mocked_sleep):
+        """
+            Test case to verify a closed channel of the pool is replaced by a new one reopening the file
+        """
+        lost, replacement = mock.Mock(), mock.Mock()
+        lost.get_channel.return_value.closed = False
+        replacement.get_channel.return_value.closed = False
+        mocked_from_transport.side_effect = [lost, replacement]
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22")
+        conn.sftp = mock.Mock()
+        conn.transport = mock.Mock()
+
+        with conn.channel():
+            lost.get_channel.return_value.closed = True
+            conn.reopen_file("/root/file.csv")
+            self.assertIs(conn.sftp, replacement)
+        with conn.channel() as sftp:
+            self.assertIs(sftp, replacement)
+
+        replacement.open.assert_called_once_with("/root/file.csv", "rb")
@@ -0,0 +1,171 @@
+import csv
+import io
+import random
+import unittest
+from singer import metadata, Transformer
+from singer.transform import SchemaMismatch, string_to_datetime
+from tap_sftp import transform
+
+def get_schema():
+    # schema as discovered by 'singer_encodings.json_schema' for CSV files
+    return {"type": "object", "properties": {
+        "id": {"type": ["null", "integer", "string"]},
+        "amount": {"type": ["null", "number", "string"]},
+        "name": {"type": ["null", "string"]},
+        "created_at": {"anyOf": [{"type": ["null", "string"], "format": "date-time"},
+                                 {"type": ["null", "string"]}]},
+        "unselected": {"type": ["null", "string"]},
+        "quantity": {"type": ["null", "integer"]},
+        "_sdc_source_file": {"type": "string"},
+        "_sdc_source_lineno": {"type": "integer"},
+        "_sdc_extra": {"type": "array", "items": {"type": "string"}}}}
+
+def get_metadata(schema):
+    mdata = metadata.to_map(metadata.get_standard_metadata(schema=schema, key_properties=["id"]))
+    mdata = metadata.write(mdata, (), "selected", True)
+    return metadata.write(mdata, ("properties", "unselected"), "selected", False)
+
+VALUES = ["", "1", "1,000", "-12", "1.5", "1e3", "abc", "2024-01-02", "2024-01-02T03:04:05Z",
+          "2024-01-02 03:04:05.123+05:30", "2024-02-30", "not a date", None]
+
+def get_rows(count):
+    random.seed(1)
+    for _ in range(count):
+        row = {key: random.choice(VALUES) for key in ["id", "amount", "name", "created_at", "unselected", "quantity", "unknown"]}
+        if random.random() < 0.2:
+            row["_sdc_extra"] = ["extra", "values"]
+        yield row
+
+class TestRecordTransformer(unittest.TestCase):
+    """
+        Test cases to verify the compiled record transformer returns what singer's Transformer returns
+    """
+
+    def transform_both(self, row, schema=None):
+        schema = schema or get_schema()
+        mdata = get_metadata(schema)
+        expected_transformer, transformer = Transformer(), Transformer()
+        record_transformer = transform.RecordTransformer(get_schema() if schema.get("properties") else schema, mdata)
+
+        try:
+            expected = expected_transformer.transform({**row, "_sdc_source_file": "/root/file.csv",
+                                                       "_sdc_source_lineno": 2}, schema, mdata)
+        except SchemaMismatch as ex:
+            expected = str(ex)
+        try:
+            record = record_transformer.transform(transformer, row, "/root/file.csv", 2)
+        except SchemaMismatch as ex:
+            record = str(ex)
+
+        self.assertEqual(list(record) if isinstance(record, dict) else None,
+                         list(expected) if isinstance(expected, dict) else None)
+        self.assertEqual(transformer.filtered, expected_transformer.filtered)
+        self.assertEqual(transformer.removed, expected_transformer.removed)
+        return record, expected
+
+    def test_same_records_as_transformer(self):
+        """
+            Test case to verify the records, their key order and the filtered and removed paths are the same
+        """
+        failures = 0
+        for row in get_rows(2000):
+            record, expected = self.transform_both(dict(row))
+            self.assertEqual(record, expected)
+            failures += isinstance(expected, str)
+        # some rows have values not matching the schema of the "quantity" column
+        self.assertGreater(failures, 0)
+        self.assertLess(failures, 2000)
+
+    def test_source_columns_in_file(self):
+        """
+            Test case to verify columns of the file named like the source columns are replaced in place
+        """
+        record, expected = self.transform_both({"_sdc_source_lineno": "7", "id": "1", "name": "a"})
+
+        self.assertEqual(record, expected)
+        self.assertEqual(list(record), ["_sdc_source_lineno", "id", "name", "_sdc_source_file"])
+
+    def test_schema_without_properties(self):
+        """
+            Test case to verify records of streams without discovered columns are passed through the Transformer
+        """
+        record_transformer = transform.RecordTransformer({}, {})
+
+        self.assertFalse(record_transformer.compiled)
+        self.assertEqual(record_transformer.transform(Transformer(), {"id": "1"}, "/root/file.csv", 2),
+                         {"id": "1", "_sdc_source_file": "/root/file.csv", "_sdc_source_lineno": 2})
+
+    def test_projected_rows(self):
+        """
+            Test case to verify rows without the unselected columns give the same records and filtered paths
+        """
+        data = ("id,unselected,name,unselected,amount\n"
+                "1,a,x,b,1.5\n"
+                "\n"
+                "2,c\n"
+                "3,d,y,e,2.5,extra,values\n")
+        schema = get_schema()
+        mdata = get_metadata(schema)
+        record_transformer = transform.RecordTransformer(schema, mdata)
+        expected_transformer, transformer = Transformer(), Transformer()
+
+        expected = [expected_transformer.transform({**row, "_sdc_source_file": "/root/file.csv",
+                                                    "_sdc_source_lineno": 2}, schema, mdata)
+                    for row in csv.DictReader(io.StringIO(data), restkey="_sdc_extra")]
+        rows = list(record_transformer.project(csv.DictReader(io.StringIO(data), restkey="_sdc_extra"), transformer))
+        records = [record_transformer.transform(transformer, row, "/root/file.csv", 2) for row in rows]
+
+        self.assertEqual(rows[0], {"id": "1", "name": "x", "amount": "1.5"})
+        self.assertEqual(rows[1], {"id": "2", "name": None, "amount": None})
+        self.assertEqual(records, expected)
+        self.assertEqual([list(record) for record in records], [list(record) for record in expected])
+        self.assertEqual(transformer.filtered, expected_transformer.filtered)
+        self.assertEqual(transformer.removed, expected_transformer.removed)
+
+class TestCoercers(unittest.TestCase):
+    """
+        Test cases to verify the coercers compiled from column schemas
+    """
+
+    def test_datetime_coercer_matches_dateutil(self):
+        """
+            Test case to verify ISO 8601 values parsed without dateutil give the Transformer's value
+        """
+        values = ["2024-01-02", "2024-01-02T03:04", "2024-01-02T03:04:05", "2024-01-02 03:04:05.1",
+                  "2024-01-02T03:04:05.123456Z", "2024-01-02T03:04:05+05:30", "2024-01-02T03:04:05-0800",
+                  "1999-12-31T23:59:59.999999-00:00", "0999-01-01T00:00:00Z", "2024-01-02Z",
+                  "2024-01-02+05:00", "2024-12-31T23:30:00-01:00", "01/02/2024 03:04", "2024-01-02T03:04:05.1234567Z"]
+        for value in values:
+            expected = string_to_datetime(value)
+            if expected is None:
+                self.assertRaises(transform.Fallback, transform.coerce_datetime, value)
+            else:
+                self.assertEqual(transform.coerce_datetime(value), expected, value)
+
+    def test_datetime_coercer_falls_back(self):
+        """
+            Test case to verify values dateutil cannot parse are left to the Transformer, which logs them
+        """
+        with self.assertRaises(transform.Fallback):
+            transform.coerce_datetime("2024-02-30")
+        with self.assertRaises(transform.Mismatch):
+            transform.coerce_datetime("")
+
+    def test_unsupported_schemas(self):
+        """
+            Test case to verify no coercer is compiled for objects and decimals
+        """
+        self.assertIsNone(transform.compile_coercer({"type": ["null", "object"], "properties": {}}))
+        self.assertIsNone(transform.compile_coercer({"type": ["null", "number"], "format": "singer.decimal"}))
+        self.assertIsNone(transform.compile_coercer({"anyOf": [{"type": "boolean"}, {"type": "string"}]}))
+
+    def test_types_are_tried_in_transformer_order(self):
+        """
+            Test case to verify "null" is tried after the other types, as the Transformer does
+        """
+        coerce = transform.compile_coercer({"type": ["null", "integer", "string"]})
+
+        self.assertEqual(coerce("1,000"), 1000)
+        self.assertEqual(coerce(""), "")
+        self.assertIsNone(coerce(None))
+        self.assertIsNone(transform.compile_coercer({"type": ["null", "integer"]})(""))
@@ -0,0 +1,93 @@
+import io
+import unittest
+from unittest import mock
+from singer import metadata
+from singer.catalog import CatalogEntry
+from singer.schema import Schema
+import tap_sftp.sync as sync
+from tap_sftp import row_filter
+
+class TestRowFilter(unittest.TestCase):
+    """
+        Test cases to verify filter expressions are evaluated on the raw values of the rows
+    """
+
+    def matching(self, expression, rows):
+        return [row["id"] for row in rows if row_filter.RowFilter(expression).matches(row)]
+
+    def test_comparisons(self):
+        """
+            Test case to verify string, number, membership and boolean comparisons
+        """
+        rows = [{"id": "1", "status": "test", "region": "EU", "amount": "1,500"},
+                {"id": "2", "status": "live", "region": "US", "amount": "20"},
+                {"id": "3", "status": "live", "region": "APAC", "amount": "n/a"},
+                {"id": "4", "status": "", "region": "EU"}]
+
+        self.assertEqual(self.matching("status != 'test'", rows), ["2", "3", "4"])
+        self.assertEqual(self.matching("region in ('EU', 'US') and not status == 'test'", rows), ["2", "4"])
+        self.assertEqual(self.matching("amount > 100 or region not in ['EU', 'US']", rows), ["1", "3"])
+        self.assertEqual(self.matching("10 <= amount < 1000", rows), ["2"])
+        self.assertEqual(self.matching("amount == None", rows), ["4"])
+        self.assertEqual(self.matching("amount >= -1", rows), ["1", "2"])
+
+    def test_mixed_membership(self):
+        """
+            Test case to verify a set of strings and numbers matches the strings as they are and the numbers as numbers
+        """
+        rows = [{"id": "1", "region": "EU"}, {"id": "2", "region": "1.0"}, {"id": "3", "region": "US"},
+                {"id": "4"}]
+
+        self.assertEqual(self.matching("region in ('EU', 1)", rows), ["1", "2"])
+        self.assertEqual(self.matching("region not in ['EU', 1]", rows), ["3", "4"])
+        self.assertEqual(self.matching("region in ('EU', 1, None)", rows), ["1", "2", "4"])
+
+    def test_invalid_expressions(self):
+        """
+            Test case to verify expressions that do not parse or use anything but comparisons are reported
+        """
+        for expression in ["status ==", "__import__('os').system('ls')", "amount + 1 > 2",
+                           "status.lower() == 'test'", "status is None"]:
+            with self.assertRaises(Exception) as context:
+                row_filter.RowFilter(expression)
+            self.assertIn("filter expression", str(context.exception))
+
+    def test_filter_is_optional(self):
+        """
+            Test case to verify tables without a "filter" are not filtered and filters are compiled once
+        """
+        self.assertIsNone(row_filter.get_filter({"table_name": "table"}))
+        self.assertIsNone(row_filter.get_filter({"filter": " "}))
+        self.assertIs(row_filter.get_filter({"filter": "id != '1'"}), row_filter.get_filter({"filter": "id != '1'"}))
+
+class TestFilteredSync(unittest.TestCase):
+    """
+        Test cases to verify the rows left out by the table's filter are counted and never transformed
+    """
+
+    @mock.patch("tap_sftp.sync.write_record")
+    @mock.patch("tap_sftp.stats.add_file_data")
+    def test_filtered_rows_are_counted(self, mocked_stats, mocked_write_record):
+        """
+            Test case to verify the filter may use unselected columns and the line numbers still count filtered rows
+        """
+        schema = {"type": "object", "properties": {"id": {"type": ["null", "integer", "string"]},
+                                                   "status": {"type": ["null", "string"]},
+                                                   "_sdc_source_file": {"type": "string"},
+                                                   "_sdc_source_lineno": {"type": "integer"}}}
+        mdata = metadata.to_map(metadata.get_standard_metadata(schema=schema, key_properties=["id"]))
+        mdata = metadata.write(mdata, ("properties", "status"), "selected", False)
+        stream = CatalogEntry(tap_stream_id="table", stream="table", schema=Schema.from_dict(schema),
+                              metadata=metadata.to_list(mdata))
+        table_spec = {"table_name": "table", "search_prefix": "/root", "search_pattern": "csv",
+                      "key_properties": ["id"], "delimiter": ",", "filter": "status != 'test'"}
+        conn = mock.Mock()
+        conn.get_file_handle.return_value = io.BytesIO(b"id,status\n1,test\n2,live\n3,test\n4,live\n")
+        f = {"filepath": "/root/file.csv", "last_modified": "2024-01-01"}
+
+        self.assertEqual(sync.sync_file(conn, f, stream, table_spec, "utf-8"), 2)
+
+        self.assertEqual([c.args[1] for c in mocked_write_record.call_args_list],
+                         [{"id": 2, "_sdc_source_file": "/root/file.csv", "_sdc_source_lineno": 3},
+                          {"id": 4, "_sdc_source_file": "/root/file.csv", "_sdc_source_lineno": 5}])
+        mocked_stats.assert_called_once_with(table_spec, "/root/file.csv", "2024-01-01", 2, 2)
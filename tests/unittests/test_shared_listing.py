@@ -0,0 +1,67 @@
+import unittest
+from unittest import mock
+import tap_sftp.client as client
+from tap_sftp import pattern
+import fakes
+
+# directory tree served by the mocked SFTP channel: path -> [(name, is_directory)]
+TREE = {
+    "/root": [("orders_1.csv", False), ("users_1.csv", False), ("archive", True)],
+    "/root/archive": [("orders_0.csv", False), ("events_0.json", False)],
+    "/other": [("orders_2.csv", False)],
+}
+
+TABLE_SPECS = [
+    {"table_name": "orders", "search_prefix": "/root", "search_pattern": "orders_.*\\.csv"},
+    {"table_name": "users", "search_prefix": "/root", "search_pattern": "users_.*\\.csv"},
+    {"table_name": "events", "search_prefix": "/root", "search_pattern": "\\.json$"},
+    {"table_name": "other_orders", "search_prefix": "/other", "search_pattern": "orders_.*\\.csv"},
+]
+
+@mock.patch("tap_sftp.client.SFTPConnection.sftp")
+class TestSharedListing(unittest.TestCase):
+    """
+        Test cases to verify tables sharing a search prefix are served by a single walk
+    """
+
+    def get_files_per_table(self, conn):
+        return {table_spec["table_name"]: [f["filepath"] for f in conn.get_files(table_spec["search_prefix"],
+                                                                                table_spec["search_pattern"])]
+                for table_spec in TABLE_SPECS}
+
+    def test_shared_prefix_is_walked_once(self, mocked_sftp):
+        """
+            Test case to verify every directory of the shared prefix is listed once for all tables
+        """
+        mocked_sftp.listdir_attr.side_effect = fakes.get_listdir_attr(TREE)
+        expected_files = self.get_files_per_table(client.SFTPConnection("10.0.0.1", "username", port="22"))
+        mocked_sftp.listdir_attr.reset_mock()
+
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22")
+        conn.plan_listings(TABLE_SPECS)
+        self.assertEqual(sorted(c.args[0] for c in mocked_sftp.listdir_attr.call_args_list),
+                         ["/root", "/root/archive"])
+
+        files = self.get_files_per_table(conn)
+        # only the prefix searched by a single table is walked when its files are requested
+        self.assertEqual(sorted(c.args[0] for c in mocked_sftp.listdir_attr.call_args_list),
+                         ["/other", "/root", "/root/archive"])
+        self.assertEqual(files, expected_files)
+        self.assertEqual(files["orders"], ["/root/archive/orders_0.csv", "/root/orders_1.csv"])
+
+    def test_combined_matcher(self, mocked_sftp):
+        """
+            Test case to verify the combined matcher matches wherever any pattern matches
+        """
+        combined_matcher = pattern.get_combined_matcher(["orders_.*\\.csv", "\\.json$"])
+
+        self.assertTrue(combined_matcher.search("/root/orders_1.csv"))
+        self.assertTrue(combined_matcher.search("/root/events.json"))
+        self.assertFalse(combined_matcher.search("/root/users_1.csv"))
+
+    def test_patterns_with_back_references_are_not_combined(self, mocked_sftp):
+        """
+            Test case to verify back references, whose group numbers would shift, disable the combined matcher
+        """
+        self.assertIsNone(pattern.get_combined_matcher(["(a)\\1", "b"]))
+        self.assertIsNone(pattern.get_combined_matcher(["(?i)a", "b"]))
@@ -7,37 +7,19 @@ import time
 import pytz
 import singer
 
-@mock.patch("tap_sftp.client.SFTPConnection.get_files_by_prefix")
+@mock.patch("tap_sftp.client.SFTPConnection.iter_files_by_prefix")
 class TestSortedFiles(unittest.TestCase):
 
     def test_sorted_files(self, mocked_all_files):
         conn = client.SFTPConnection("10.0.0.1", "username", port="22")
 
         files_list = [
-            {
-                "filepath": "/root/file1.csv",
-                "last_modified": datetime.utcfromtimestamp(time.time() - 10).replace(tzinfo=pytz.UTC)
-            },
-            {
-                "filepath": "/root/file2.csv",
-                "last_modified": datetime.utcfromtimestamp(time.time() - 4).replace(tzinfo=pytz.UTC)
-            },
-            {
-                "filepath": "/root/file3.csv",
-                "last_modified": datetime.utcfromtimestamp(time.time() - 8).replace(tzinfo=pytz.UTC)
-            },
-            {
-                "filepath": "/root/file4.csv",
-                "last_modified": datetime.utcfromtimestamp(time.time()).replace(tzinfo=pytz.UTC)
-            },
-            {
-                "filepath": "/root/file.txt",
-                "last_modified": datetime.utcfromtimestamp(time.time() - 2).replace(tzinfo=pytz.UTC)
-            },
-            {
-                "filepath": "/root/file5.json",
-                "last_modified": datetime.utcfromtimestamp(time.time() - 3).replace(tzinfo=pytz.UTC)
-            }]
+            client.FileEntry("/root/file1.csv", 10, int(time.time()) - 10),
+            client.FileEntry("/root/file2.csv", 10, int(time.time()) - 4),
+            client.FileEntry("/root/file3.csv", 10, int(time.time()) - 8),
+            client.FileEntry("/root/file4.csv", 10, int(time.time())),
+            client.FileEntry("/root/file.txt", 10, int(time.time()) - 2),
+            client.FileEntry("/root/file5.json", 10, int(time.time()) - 3)]
 
         mocked_all_files.return_value = files_list
 
@@ -53,22 +35,10 @@ class TestSortedFiles(unittest.TestCase):
         conn = client.SFTPConnection("10.0.0.1", "username", port="22")
 
         files_list = [
-            {
-                "filepath": "/root/file1.csv",
-                "last_modified": datetime.utcfromtimestamp(time.time() - 3).replace(tzinfo=pytz.UTC)
-            },
-            {
-                "filepath": "/root/file2.csv",
-                "last_modified": datetime.utcfromtimestamp(time.time()).replace(tzinfo=pytz.UTC)
-            },
-            {
-                "filepath": "/root/file.txt",
-                "last_modified": datetime.utcfromtimestamp(time.time() - 2).replace(tzinfo=pytz.UTC)
-            },
-            {
-                "filepath": "/root/file3.json",
-                "last_modified": datetime.utcfromtimestamp(time.time() - 5).replace(tzinfo=pytz.UTC)
-            }]
+            client.FileEntry("/root/file1.csv", 10, int(time.time()) - 3),
+            client.FileEntry("/root/file2.csv", 10, int(time.time())),
+            client.FileEntry("/root/file.txt", 10, int(time.time()) - 2),
+            client.FileEntry("/root/file3.json", 10, int(time.time()) - 5)]
 
         mocked_all_files.return_value = files_list
 
@@ -0,0 +1,58 @@
+import unittest
+from unittest import mock
+from datetime import datetime
+import pytz
+import tap_sftp.client as client
+import fakes
+
+# directory tree served by the mocked SFTP channel: path -> [(name, is_directory, size, mtime)]
+TREE = {
+    "/root": [("file1.csv", False, 10, 100), ("sub", True, 0, 0), ("file2.txt", False, 10, 200)],
+    "/root/sub": [("file3.csv", False, 10, 300), ("file4.csv", False, 10, 400)],
+}
+
+@mock.patch("tap_sftp.client.SFTPConnection.sftp")
+class TestStreamingListing(unittest.TestCase):
+    """
+        Test cases to verify files are streamed out of the walk with the filters applied inline
+    """
+
+    def test_entries_are_yielded_before_the_walk_ends(self, mocked_sftp):
+        """
+            Test case to verify the files of a directory are yielded before its subdirectories are listed
+        """
+        mocked_sftp.listdir_attr.side_effect = fakes.get_listdir_attr(TREE)
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22")
+
+        files = conn.iter_files("/root", ".*\\.csv")
+
+        self.assertEqual(next(files), client.FileEntry("/root/file1.csv", 10, 100))
+        self.assertEqual(mocked_sftp.listdir_attr.call_count, 1)
+
+    def test_filters_are_applied_inline(self, mocked_sftp):
+        """
+            Test case to verify the pattern and 'modified_since' filters and the counts
+        """
+        mocked_sftp.listdir_attr.side_effect = fakes.get_listdir_attr(TREE)
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22")
+        counts = {}
+
+        modified_since = datetime.utcfromtimestamp(300).replace(tzinfo=pytz.UTC)
+        files = list(conn.iter_files("/root", ".*\\.csv", modified_since, counts))
+
+        self.assertEqual(files, [client.FileEntry("/root/sub/file4.csv", 10, 400)])
+        self.assertEqual(counts, {"listed": 4, "matching": 3})
+
+    def test_get_files_returns_file_dicts(self, mocked_sftp):
+        """
+            Test case to verify 'get_files' keeps returning sorted file dicts
+        """
+        mocked_sftp.listdir_attr.side_effect = fakes.get_listdir_attr(TREE)
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22")
+
+        files = conn.get_files("/root", ".*\\.csv")
+
+        self.assertEqual(files, [
+            {"filepath": "/root/file1.csv", "last_modified": datetime(1970, 1, 1, 0, 1, 40, tzinfo=pytz.UTC)},
+            {"filepath": "/root/sub/file3.csv", "last_modified": datetime(1970, 1, 1, 0, 5, tzinfo=pytz.UTC)},
+            {"filepath": "/root/sub/file4.csv", "last_modified": datetime(1970, 1, 1, 0, 6, 40, tzinfo=pytz.UTC)}])
@@ -0,0 +1,120 @@
+import gc
+import socket
+import unittest
+from unittest import mock
+import paramiko
+import tap_sftp.client as client
+from tap_sftp import measure_profiles
+from tap_sftp import profiles
+import fakes
+
+CONFIG = fakes.CONNECTION_CONFIG
+
+class TestTransportProfiles(unittest.TestCase):
+    """
+        Test cases to verify the transport profiles and their settings
+    """
+
+    def test_get_profile(self):
+        """
+            Test case to verify profiles are found by name or given as settings, and unknown ones are reported
+        """
+        self.assertEqual(profiles.get_profile(), profiles.DEFAULT_PROFILE)
+        self.assertEqual(profiles.get_profile("wan")["window_size"], 32 * 1024 * 1024)
+        self.assertEqual(profiles.get_profile("wan", "never")["compression"], "never")
+        self.assertEqual(profiles.get_profile('{"ciphers": ["aes256-ctr"]}'),
+                         {**profiles.DEFAULT_PROFILE, "ciphers": ["aes256-ctr"]})
+
+        for transport_profile, transport_compression, message in [("fastest", None, "Unsupported transport profile"),
+                                                                  ({"cipher": "aes256-ctr"}, None, "cipher"),
+                                                                  ("lan", "zstd", "Unsupported transport compression")]:
+            with self.assertRaises(Exception) as context:
+                profiles.get_profile(transport_profile, transport_compression)
+            self.assertIn(message, str(context.exception))
+
+    def test_preferred_algorithms(self):
+        """
+            Test case to verify the profile's algorithms paramiko supports are offered first, followed by the rest
+        """
+        transport = paramiko.Transport(socket.socket())
+        ciphers = transport.get_security_options().ciphers
+        profile = {**profiles.DEFAULT_PROFILE, "ciphers": ("chacha20-poly1305@openssh.com", "aes256-ctr"),
+                   "macs": ("hmac-sha2-512-etm@openssh.com",)}
+
+        profiles.set_preferred_algorithms(transport, profile)
+
+        options = transport.get_security_options()
+        self.assertEqual(options.ciphers, ("aes256-ctr",) + tuple(c for c in ciphers if c != "aes256-ctr"))
+        self.assertEqual(options.digests[0], "hmac-sha2-512-etm@openssh.com")
+        transport.close()
+
+    @mock.patch("paramiko.SFTPClient.from_transport")
+    @mock.patch("paramiko.Transport")
+    def test_transport_settings(self, mocked_transport, mocked_from_transport):
+        """
+            Test case to verify the window, packet size and compression of the profile are set on the transport
+        """
+        conn = client.connection({**CONFIG, "transport_profile": "lan"})
+
+        conn.sftp # pylint: disable=pointless-statement
+
+        mocked_transport.assert_called_once_with(("10.0.0.1", 22),
+                                                 default_window_size=profiles.DEFAULT_PROFILE["window_size"],
+                                                 default_max_packet_size=profiles.DEFAULT_PROFILE["max_packet_size"])
+        mocked_transport.return_value.use_compression.assert_called_once_with(False)
+        self.assertIsNone(conn.uncompressed_connection)
+
+    @mock.patch("paramiko.SFTPClient.from_transport", side_effect=fakes.get_mocked_channel())
+    @mock.patch("tap_sftp.client.SFTPConnection.sftp")
+    def test_compressed_files_use_uncompressed_connection(self, mocked_sftp, mocked_from_transport):
+        """
+            Test case to verify compressed files are read over the uncompressed connection, on a channel held with the reader's own
+        """
+        conn = client.connection({**CONFIG, "transport_profile": "balanced"})
+        conn.transport = mock.Mock()
+        uncompressed = conn.uncompressed_connection
+        uncompressed.transport = mock.Mock()
+        self.assertEqual(uncompressed.profile["compression"], "never")
+
+        with mock.patch.object(uncompressed, "get_file_handle") as mocked_get_file_handle:
+            conn.get_file_handle({"filepath": "/root/file.csv"})
+            conn.get_file_handle({"filepath": "/root/file.csv.GZ"})
+            self.assertEqual(mocked_from_transport.call_count, 0)
+
+            with conn.channel():
+                conn.get_file_handle({"filepath": "/root/file.zip"}, 10)
+                conn.get_file_handle({"filepath": "/root/file.gz"})
+                # a channel of the pool and one of the uncompressed connection's pool
+                self.assertEqual(mocked_from_transport.call_count, 2)
+                self.assertEqual(uncompressed._SFTPConnection__idle_channels, [])
+                self.assertTrue(uncompressed.holds_channel())
+            self.assertFalse(uncompressed.holds_channel())
+
+        self.assertEqual([c.args for c in mocked_get_file_handle.call_args_list],
+                         [({"filepath": "/root/file.csv.GZ"}, 0), ({"filepath": "/root/file.zip"}, 10),
+                          ({"filepath": "/root/file.gz"}, 0)])
+        self.assertEqual(len(uncompressed._SFTPConnection__idle_channels), 1)
+
+    def test_invalid_config_is_closed_cleanly(self):
+        """
+            Test case to verify a connection rejecting its settings is closed without errors when collected
+        """
+        with mock.patch("sys.unraisablehook") as mocked_unraisablehook:
+            for config in ({"read_backend": "scp"}, {"transport_profile": "fastest"}, {"port": "ssh"}):
+                with self.assertRaises(Exception):
+                    client.connection({**CONFIG, **config})
+            gc.collect()
+
+        mocked_unraisablehook.assert_not_called()
+
+    @mock.patch("tap_sftp.client.connection")
+    def test_measure_leaves_out_overriding_settings(self, mocked_connection):
+        """
+            Test case to verify the profiles are measured without the settings overriding them
+        """
+        config = {**CONFIG, "transport_compression": "never", "read_backend": "exec", "exec_compression": "zstd",
+                  "read_ahead_window": 16}
+
+        measure_profiles.measure(config, "wan", [], runs=1)
+
+        mocked_connection.assert_called_once_with({**CONFIG, "read_ahead_window": 16, "transport_profile": "wan"})